@@ -0,0 +1,65 @@
+from django.http import JsonResponse
+from rest_framework.views import APIView
+from rest_framework.response import Response
+from rest_framework import status
+import logging
+
+from . import engine as tree_engine
+from .aggregation import (
+    AGGREGATE_FIELDS,
+    DEFAULT_POINTS,
+    parse_bucket,
+    parse_points,
+    run_aggregate,
+)
+from .queries import InvalidQuery, ReadingFilters
+
+logger = logging.getLogger(__name__)
+
+
+class TreeDataAggregate(APIView):
+    """
+    Chart-sized views of tree sensor data.
+
+    ``mode=stats`` (default) returns min/max/mean/count per time bucket, with
+    the bucket width given as ``bucket`` (e.g. 15m, 1h, 1d) or derived from
+    the target ``points``. ``mode=lttb`` returns at most ``points`` raw
+    readings per field chosen by largest-triangle-three-buckets.
+    ``start``/``end``/``fields`` work as on /treeData/.
+    """
+
+    MODES = ("stats", "lttb")
+
+    def get(self, request):
+        params = request.query_params
+
+        # 1. Input Sanitation
+        mode = params.get('mode', 'stats')
+        if mode not in self.MODES:
+            return Response(
+                {"error": f"'mode' must be one of: {', '.join(self.MODES)}"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        try:
+            filters = ReadingFilters.from_params(params, allowed_fields=AGGREGATE_FIELDS)
+            fields = filters.fields or AGGREGATE_FIELDS
+            points = parse_points(params.get('points', DEFAULT_POINTS))
+            width = parse_bucket(params['bucket']) if params.get('bucket') else None
+        except InvalidQuery as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        # 2. Execution and Error Handling
+        try:
+            with tree_engine.connect() as conn:
+                body = run_aggregate(conn, mode, filters, fields, points, width)
+        except InvalidQuery as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        except Exception as e:
+            logger.error(f"Aggregation query failed: {e}")
+            return Response(
+                {"error": "Failed to retrieve data from database."},
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            )
+
+        # 3. Response Formatting
+        return JsonResponse(body, status=status.HTTP_200_OK)
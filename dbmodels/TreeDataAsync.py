@@ -0,0 +1,143 @@
+from asgiref.sync import sync_to_async
+from django.http import JsonResponse, StreamingHttpResponse
+from django.views import View
+from rest_framework import status
+import logging
+
+from . import async_engine
+from . import cache as tree_cache
+from .authentication import get_token
+from .aggregation import AGGREGATE_FIELDS, DEFAULT_POINTS, parse_bucket, parse_points, run_aggregate
+from .queries import InvalidQuery, ReadingFilters, build_page_query, decode_cursor, parse_limit
+from .streaming import aiter_batches, ajson_page
+
+logger = logging.getLogger(__name__)
+
+
+async def authenticate(request):
+    """
+    The user behind ``request`` as CachedTokenAuthentication and DRF's
+    SessionAuthentication would find it (in that order), or None.
+    """
+    header = request.headers.get("Authorization", "").split()
+    if header and header[0].lower() == "token":
+        if len(header) != 2:
+            return None
+        token = await sync_to_async(get_token)(header[1])
+        if token is None or not token.user.is_active:
+            return None
+        return token.user
+    return await sync_to_async(lambda: request.user if request.user.is_authenticated else None)()
+
+
+def error(message, status_code):
+    return JsonResponse({"error": message}, status=status_code)
+
+
+class AsyncReadView(View):
+    """
+    Base for the async read views: authenticated GET only, JSON errors.
+
+    These are plain Django async views rather than DRF APIViews (DRF has no
+    async views), so authentication is done by authenticate() above.
+    """
+    http_method_names = ["get", "head", "options"]
+
+    async def dispatch(self, request, *args, **kwargs):
+        if await authenticate(request) is None:
+            return error(
+                "Authentication credentials were not provided.",
+                status.HTTP_401_UNAUTHORIZED,
+            )
+        return await super().dispatch(request, *args, **kwargs)
+
+
+class TreeDataAsync(AsyncReadView):
+    """
+    /treeData/ as JSON on the asyncio engine (async_engine.py): same
+    parameters, pagination, cache and response body, but while the query
+    runs the worker's event loop keeps serving other requests. Exports stay
+    on the sync endpoint.
+    """
+
+    DEFAULT_LIMIT = 500
+
+    async def get(self, request):
+        try:
+            dialect_name = async_engine.get_engine().dialect.name
+        except Exception as e:
+            logger.error(f"Async database engine is not configured: {e}")
+            return error("Database service is unavailable", status.HTTP_503_SERVICE_UNAVAILABLE)
+
+        # 1. Input Sanitation, exactly as on /treeData/
+        limit = parse_limit(request.GET.get('limit'), self.DEFAULT_LIMIT)
+        after = None
+        try:
+            if request.GET.get('cursor'):
+                after = decode_cursor(request.GET['cursor'])
+            filters = ReadingFilters.from_params(request.GET)
+        except InvalidQuery as e:
+            return error(str(e), status.HTTP_400_BAD_REQUEST)
+
+        # Shares cache entries with /treeData/ (same normalized query)
+        key = await tree_cache.acache_key(tree_cache.normalized_query("json", limit, after, filters))
+        headers = {"Cache-Control": "private, no-cache", "Content-Type": "application/json"}
+        unchanged = tree_cache.not_modified(request, key, headers["Cache-Control"])
+        if unchanged is not None:
+            return unchanged
+        cached = await tree_cache.get_cache().aget(key)
+        if cached is not None:
+            return tree_cache.cached_response(cached)
+
+        # 2. Execution and Error Handling
+        sql, params = build_page_query(dialect_name, limit, after, filters)
+        batches = aiter_batches(sql, params)
+        try:
+            columns = await batches.__anext__()
+        except Exception as e:
+            logger.error(f"Database query failed: {e}")
+            return error("Failed to retrieve data from database.", status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+        # 3. Response Formatting
+        response = StreamingHttpResponse(
+            tree_cache.acaching_stream(ajson_page(columns, batches, limit, dialect_name), key, headers),
+            status=status.HTTP_200_OK,
+            headers=headers,
+        )
+        response["ETag"] = tree_cache.etag_for(key)
+        response["X-Cache"] = "MISS"
+        return response
+
+
+class TreeDataAggregateAsync(AsyncReadView):
+    """/treeData/aggregate/ on the asyncio engine; same parameters and body."""
+
+    async def get(self, request):
+        params = request.GET
+
+        # 1. Input Sanitation
+        mode = params.get('mode', 'stats')
+        if mode not in ("stats", "lttb"):
+            return error("'mode' must be one of: stats, lttb", status.HTTP_400_BAD_REQUEST)
+        try:
+            filters = ReadingFilters.from_params(params, allowed_fields=AGGREGATE_FIELDS)
+            fields = filters.fields or AGGREGATE_FIELDS
+            points = parse_points(params.get('points', DEFAULT_POINTS))
+            width = parse_bucket(params['bucket']) if params.get('bucket') else None
+        except InvalidQuery as e:
+            return error(str(e), status.HTTP_400_BAD_REQUEST)
+
+        # 2. Execution and Error Handling: the aggregation code is written
+        # against a sync connection, which run_sync() provides without
+        # blocking the event loop
+        try:
+            async with async_engine.connect() as conn:
+                body = await conn.run_sync(run_aggregate, mode, filters, fields, points, width)
+        except InvalidQuery as e:
+            return error(str(e), status.HTTP_400_BAD_REQUEST)
+        except Exception as e:
+            logger.error(f"Aggregation query failed: {e}")
+            return error("Failed to retrieve data from database.", status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+        # 3. Response Formatting
+        return JsonResponse(body, status=status.HTTP_200_OK)
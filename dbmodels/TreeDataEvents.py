@@ -0,0 +1,130 @@
+from datetime import timedelta
+import asyncio
+import logging
+
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.http import StreamingHttpResponse
+from rest_framework import status
+from sqlalchemy import text
+
+from . import async_engine
+from . import events
+from .TreeDataAsync import AsyncReadView, error
+from .queries import InvalidQuery, ReadingFilters, build_page_query, parse_fields, parse_timestamp_param
+from .streaming import dumps, json_rows
+
+logger = logging.getLogger(__name__)
+
+
+def message(name, data):
+    """One server-sent event; ``data`` is a line of JSON bytes."""
+    return b"event: " + name.encode() + b"\ndata: " + data + b"\n\n"
+
+
+class TreeDataEvents(AsyncReadView):
+    """
+    Server-sent events, one per committed upload (see events.py): the
+    file's hash, logger, tree, row counts and time range. With ``fields``
+    each event also has that file's readings of those fields as ``results``,
+    up to TREE_DATA_EVENTS_MAX_ROWS (``truncated`` tells if there are more).
+    ``source`` and ``tree`` pick whose uploads to hear about.
+    """
+
+    # No HEAD: a body that is never read would keep its subscription
+    http_method_names = ["get", "options"]
+
+    # Milliseconds EventSource waits before reconnecting
+    RETRY_MS = 3000
+
+    async def get(self, request):
+        # A stream holds its connection for minutes, which only the asyncio
+        # server (urbantree.asgi) can afford
+        if not isinstance(request, ASGIRequest):
+            return error("Event streams are only served over ASGI", status.HTTP_501_NOT_IMPLEMENTED)
+
+        # 1. Input Sanitation
+        try:
+            fields = parse_fields(request.GET['fields']) if request.GET.get('fields') else None
+        except InvalidQuery as e:
+            return error(str(e), status.HTTP_400_BAD_REQUEST)
+        wanted = {}
+        for name in ("source", "tree"):
+            value = request.GET.get(name, "").strip()
+            if len(value) > 64:
+                return error(f"'{name}' must be at most 64 characters", status.HTTP_400_BAD_REQUEST)
+            if value:
+                wanted[name] = value
+
+        # 2. Subscribe before answering, so no upload committed from now on is missed
+        try:
+            dialect_name = async_engine.get_engine().dialect.name
+            broadcaster = events.get_broadcaster()
+            subscription = await broadcaster.subscribe()
+        except Exception as e:
+            logger.error(f"Could not subscribe to upload events: {e}")
+            return error("Event stream is unavailable", status.HTTP_503_SERVICE_UNAVAILABLE)
+
+        # 3. Response Formatting
+        return StreamingHttpResponse(
+            self.stream(broadcaster, subscription, wanted, fields, dialect_name),
+            status=status.HTTP_200_OK,
+            content_type="text/event-stream",
+            # Proxies must pass events on as they come
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        )
+
+    async def stream(self, broadcaster, subscription, wanted, fields, dialect_name):
+        loop = asyncio.get_running_loop()
+        keepalive = getattr(settings, "TREE_DATA_EVENTS_KEEPALIVE", 15)
+        # Django 4.2 does not notice a client going away mid-stream, so
+        # streams end on their own and EventSource reconnects
+        closes_at = loop.time() + getattr(settings, "TREE_DATA_EVENTS_MAX_SECONDS", 300)
+        try:
+            yield f"retry: {self.RETRY_MS}\n\n".encode()
+            while True:
+                remaining = closes_at - loop.time()
+                if remaining <= 0:
+                    break
+                event = await subscription.get(min(keepalive, remaining))
+                if subscription.missed:
+                    # Fell behind: the client should refetch what it shows
+                    yield message("missed", dumps({"events": subscription.missed}))
+                    subscription.missed = 0
+                if event is None:
+                    if subscription.closed:
+                        break
+                    yield b": keepalive\n\n"
+                    continue
+                if any(event.get(name) != value for name, value in wanted.items()):
+                    continue
+                if fields is None:
+                    yield message("upload", dumps(event))
+                else:
+                    yield message("upload", await self.with_readings(event, fields, dialect_name))
+        finally:
+            await broadcaster.unsubscribe(subscription)
+
+    async def with_readings(self, event, fields, dialect_name):
+        """``event`` as JSON bytes, with the uploaded readings of ``fields``."""
+        limit = getattr(settings, "TREE_DATA_EVENTS_MAX_ROWS", 1000)
+        # The event's range is to the second; a logger's readings are unique
+        # per tree and timestamp, so the range, the logger and the tree pick
+        # out the file's rows
+        filters = ReadingFilters(
+            start=parse_timestamp_param("first_timestamp", event["first_timestamp"]),
+            end=parse_timestamp_param("last_timestamp", event["last_timestamp"]) + timedelta(seconds=1),
+            fields=fields,
+            tree=event["tree"],
+            source=event["source"],
+        )
+        sql, params = build_page_query(dialect_name, limit, filters=filters)
+        try:
+            async with async_engine.connect() as conn:
+                result = await conn.execute(text(sql), params)
+                columns, rows = list(result.keys()), result.fetchall()
+        except Exception as e:
+            logger.error(f"Database query failed: {e}")
+            return dumps({**event, "error": "Failed to retrieve data from database."})
+        body = dumps({**event, "truncated": len(rows) > limit})
+        return body[:-1] + b',"results":' + json_rows(columns, rows[:limit], dialect_name) + b"}"
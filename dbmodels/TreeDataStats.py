@@ -0,0 +1,70 @@
+from django.http import JsonResponse
+from rest_framework.views import APIView
+from rest_framework.response import Response
+from rest_framework import status
+import logging
+import re
+
+from . import engine as tree_engine
+from .aggregation import AGGREGATE_FIELDS
+from .queries import InvalidQuery, parse_fields
+from .stats import load_stats
+
+logger = logging.getLogger(__name__)
+
+
+class TreeDataStats(APIView):
+    """
+    Count, min, max, mean, standard deviation and first/last timestamp of
+    every channel, over all readings or, with ``upload=<sha256>``, over one
+    uploaded file. Read from tree_data_stats (see stats.py), so the cost
+    does not grow with the data. ``fields`` picks channels.
+    """
+
+    # Maintained for whole uploads only; ranges go through /treeData/aggregate/
+    UNSUPPORTED = ("start", "end", "tree", "quality")
+
+    def get(self, request):
+        params = request.query_params
+
+        # 1. Input Sanitation
+        unsupported = [name for name in self.UNSUPPORTED if params.get(name)]
+        if unsupported:
+            return Response(
+                {"error": f"'{unsupported[0]}' is not supported here; use /treeData/aggregate/"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        upload = params.get('upload', '').strip().lower()
+        if upload and not re.fullmatch(r"[0-9a-f]{64}", upload):
+            return Response(
+                {"error": "'upload' must be a SHA-256 hex digest"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        try:
+            fields = parse_fields(params['fields'], AGGREGATE_FIELDS) if params.get('fields') else None
+        except InvalidQuery as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        # 2. Execution and Error Handling
+        try:
+            with tree_engine.connect() as conn:
+                stats = load_stats(conn, upload)
+        except Exception as e:
+            logger.error(f"Stats query failed: {e}")
+            return Response(
+                {"error": "Failed to retrieve data from database."},
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            )
+        if upload and not stats.count.any():
+            return Response({"error": "No statistics for that upload"}, status=status.HTTP_404_NOT_FOUND)
+
+        # 3. Response Formatting
+        channels = stats.as_dict(fields)
+        firsts = [summary["first"] for summary in channels.values() if summary["first"]]
+        lasts = [summary["last"] for summary in channels.values() if summary["last"]]
+        return JsonResponse({
+            "upload": upload or None,
+            "first_timestamp": min(firsts) if firsts else None,
+            "last_timestamp": max(lasts) if lasts else None,
+            "channels": channels,
+        }, status=status.HTTP_200_OK)
@@ -0,0 +1,113 @@
+import time
+
+from django.conf import settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.views import APIView
+from rest_framework.parsers import MultiPartParser
+from rest_framework.response import Response
+
+from . import cache as tree_cache
+from .batch import BatchError, close_files, collect_files, load_batch, parse_manifest, queue_batch
+
+
+class UploadCSVBatch(APIView):
+    """
+    Takes a whole field campaign in one request: any number of logger CSVs
+    and/or zip archives of them, sent as multipart ``files`` fields. Each
+    file is queued for the background loader like a single upload (or, with
+    TREE_DATA_ASYNC_UPLOADS off, loaded in turn; see batch.py) and the
+    response lists each file's job, rows or error. An optional ``manifest``
+    field names each file's logger and tree.
+    """
+    parser_classes = [MultiPartParser]
+
+    def post(self, request):
+        uploaded_files = request.FILES.getlist("files") + request.FILES.getlist("file")
+        if not uploaded_files:
+            return Response(
+                {"error": "No files provided"}, status=status.HTTP_400_BAD_REQUEST
+            )
+
+        # A batch holds many loggers: one source for all of it would merge
+        # their readings, so loggers are named per file in the manifest
+        if request.data.get("source", request.query_params.get("source")):
+            return Response(
+                {"error": "Name each file's logger in 'manifest' instead of one 'source' for the batch"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        # Optional tree for files the manifest does not place (see UploadCSVFile)
+        tree = request.data.get("tree", request.query_params.get("tree", "")).strip()
+        if len(tree) > 64:
+            return Response(
+                {"error": "tree must be at most 64 characters"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        # 1. Expand archives into staged files; per-file problems are
+        # reported in the results
+        try:
+            files = collect_files(uploaded_files)
+        except BatchError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            return self.process(request, files, tree)
+        finally:
+            close_files(files)
+
+    def process(self, request, files, tree):
+        if not files:
+            return Response(
+                {"error": "No CSV files found in the upload"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        try:
+            labels = parse_manifest(request.data.get("manifest", ""), [name for name, _, _ in files])
+        except BatchError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        # 2. Queue each new file for `manage.py process_upload_jobs`, or
+        # load them one transaction per file (synchronous mode)
+        queued = getattr(settings, "TREE_DATA_ASYNC_UPLOADS", True)
+        started = time.perf_counter()
+        try:
+            if queued:
+                results = queue_batch(files, labels, request.user, tree=tree)
+            else:
+                results = load_batch(files, labels, tree=tree)
+        except Exception as e:
+            return Response(
+                {"error": f"Database write failed: {e}"},
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            )
+        elapsed = time.perf_counter() - started
+
+        totals = {"files": len(results)}
+        for state in ("queued", "loaded", "duplicate", "failed"):
+            totals[state] = sum(1 for r in results if r["status"] == state)
+        for key in ("rows", "rows_new", "rows_skipped", "rows_rejected"):
+            totals[key] = sum(r.get(key, 0) for r in results)
+
+        if queued:
+            for result in results:
+                if result["status"] == "queued":
+                    result["status_url"] = reverse("dbmodels:upload_job_status", args=[result["job_id"]])
+            return Response(
+                {"message": f"Queued {totals['queued']} of {len(results)} files", "files": results, "totals": totals},
+                status=status.HTTP_202_ACCEPTED,
+            )
+
+        # 3. New data is committed: cached /treeData/ responses are now stale
+        if totals["rows_new"]:
+            tree_cache.bump_generation()
+
+        return Response(
+            {
+                "message": f"Processed {len(results)} files",
+                "files": results,
+                "totals": totals,
+                "seconds": round(elapsed, 3),
+                "rows_per_second": round(totals["rows"] / elapsed) if elapsed > 0 else totals["rows"],
+            },
+            status=status.HTTP_200_OK,
+        )
@@ -0,0 +1,27 @@
+from rest_framework import status
+from rest_framework.views import APIView
+from rest_framework.response import Response
+
+from .models import UploadJob
+from .serializers import UploadJobSerializer
+from .views import IsAdminUser
+
+
+class UploadJobStatus(APIView):
+    """
+    Reports how a queued CSV upload is getting on: its state (queued,
+    running, succeeded, failed), rows parsed and loaded, throughput and the
+    error message if it failed. Users see their own jobs; admins see all.
+    """
+
+    def get(self, request, job_id):
+        jobs = UploadJob.objects.select_related('user').filter(id=job_id)
+        if not IsAdminUser().has_permission(request, self):
+            # Someone else's job is reported as missing, not as forbidden
+            jobs = jobs.filter(user=request.user)
+        job = jobs.first()
+        if job is None:
+            return Response(
+                {"error": "Upload job not found"}, status=status.HTTP_404_NOT_FOUND
+            )
+        return Response(UploadJobSerializer(job).data, status=status.HTTP_200_OK)
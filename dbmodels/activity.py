@@ -0,0 +1,91 @@
+"""
+Write-behind buffer for the login/logout timestamps on UserProfile.
+
+LoginView and LogoutView only record the time here. Updates are coalesced
+per profile (the latest time per field wins) and written with bulk_update()
+once ACTIVITY_FLUSH_SIZE profiles are pending or ACTIVITY_FLUSH_INTERVAL
+seconds have passed. Either check runs on request_finished, i.e. after the
+response has gone out, so no login waits on the write. Whatever is left
+is flushed when the worker exits.
+"""
+import atexit
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.core.signals import request_finished
+
+from .models import UserProfile
+
+logger = logging.getLogger(__name__)
+
+FIELDS = ("last_login_time", "last_logout_time")
+DEFAULT_FLUSH_INTERVAL = 5.0
+DEFAULT_FLUSH_SIZE = 100
+
+
+class ActivityBuffer:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pending = {}
+        self._last_flush = time.monotonic()
+
+    def record(self, profile_id, field, when):
+        """Note that ``field`` of profile ``profile_id`` is now ``when``."""
+        if field not in FIELDS:
+            raise ValueError(f"Unknown activity field: {field}")
+        with self._lock:
+            updates = self._pending.setdefault(profile_id, {})
+            if updates.get(field) is None or updates[field] < when:
+                updates[field] = when
+
+    def __len__(self):
+        return len(self._pending)
+
+    def flush_due(self):
+        interval = getattr(settings, "ACTIVITY_FLUSH_INTERVAL", DEFAULT_FLUSH_INTERVAL)
+        size = getattr(settings, "ACTIVITY_FLUSH_SIZE", DEFAULT_FLUSH_SIZE)
+        return bool(self._pending) and (
+            len(self._pending) >= size or time.monotonic() - self._last_flush >= interval
+        )
+
+    def flush(self):
+        """Write every pending update; returns the number of profiles written."""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            self._last_flush = time.monotonic()
+        if not pending:
+            return 0
+        # One bulk_update per combination of fields, so a profile that only
+        # logged in does not get its logout time overwritten
+        groups = {}
+        for profile_id, updates in pending.items():
+            groups.setdefault(tuple(sorted(updates)), []).append(
+                UserProfile(id=profile_id, **updates)
+            )
+        try:
+            for fields, profiles in groups.items():
+                UserProfile.objects.bulk_update(profiles, fields=list(fields))
+        except Exception:
+            logger.exception("Failed to write %d activity timestamps", len(pending))
+            # Put them back; newer times recorded meanwhile still win
+            for profile_id, updates in pending.items():
+                for field, when in updates.items():
+                    self.record(profile_id, field, when)
+            return 0
+        return len(pending)
+
+
+buffer = ActivityBuffer()
+
+
+def flush_if_due(**kwargs):
+    if buffer.flush_due():
+        buffer.flush()
+
+
+def install():
+    """Hook the buffer up to request_finished and interpreter exit."""
+    request_finished.connect(flush_if_due, dispatch_uid="dbmodels.activity.flush_if_due")
+    atexit.register(buffer.flush)
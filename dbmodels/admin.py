@@ -1,8 +1,15 @@
 from django.contrib import admin
-from .models import UserProfile
+from .models import UploadJob, UserProfile
 
 @admin.register(UserProfile)
 class UserProfileAdmin(admin.ModelAdmin):
     list_display = ['user', 'role', 'last_login_time', 'last_logout_time']
     list_filter = ['role']
     search_fields = ['user__username', 'user__email']
+
+
+@admin.register(UploadJob)
+class UploadJobAdmin(admin.ModelAdmin):
+    list_display = ['id', 'filename', 'user', 'status', 'created_at', 'rows_loaded', 'rows_per_second']
+    list_filter = ['status']
+    search_fields = ['filename', 'user__username']
@@ -0,0 +1,218 @@
+"""
+Time-bucket aggregation and LTTB downsampling for chart queries.
+
+Bucket statistics are computed by the database (GROUP BY over epoch-aligned
+buckets), from the hourly/daily rollups whenever the bucket width and range
+line up with them; largest-triangle-three-buckets runs in NumPy over the raw
+points of one channel. Either way the response size is bounded by the number of points
+the client can draw, not by the number of readings in the range.
+"""
+import re
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import text
+
+from .bulkload import TREE_DATA_TABLE, quote
+from .ingest import FLOAT_COLUMNS
+from .queries import InvalidQuery, bucket_sql, epoch_sql, parse_db_timestamp
+from .rollups import DAY, HOUR, rollup_for, rollup_stats_rows
+
+DEFAULT_POINTS = 1000
+MAX_POINTS = 10000
+
+BUCKET_UNITS = {"s": 1, "m": 60, "h": 3600, "d": 86400}
+
+# Channels that can be aggregated (Timestamp_Raw is text)
+AGGREGATE_FIELDS = FLOAT_COLUMNS
+
+
+def parse_bucket(value):
+    """Parse a bucket width such as "900", "15m", "1h" or "1d" into seconds."""
+    match = re.fullmatch(r"\s*(\d+)\s*([smhd]?)\s*", value or "")
+    if not match or int(match.group(1)) < 1:
+        raise InvalidQuery("'bucket' must look like 900, 15m, 1h or 1d")
+    return int(match.group(1)) * BUCKET_UNITS[match.group(2) or "s"]
+
+
+def parse_points(value):
+    try:
+        points = int(value)
+    except (TypeError, ValueError):
+        raise InvalidQuery("'points' must be an integer")
+    if not 3 <= points <= MAX_POINTS:
+        raise InvalidQuery(f"'points' must be between 3 and {MAX_POINTS}")
+    return points
+
+
+def bucket_width(start, end, points):
+    """
+    Smallest whole-second width that fits [start, end) into ``points`` buckets.
+
+    Widths over an hour (or a day) are rounded up to whole hours (days) so
+    that long ranges can be served from the rollups.
+    """
+    span = (end - start).total_seconds()
+    width = max(1, int(np.ceil(span / points)))
+    for unit in (DAY, HOUR):
+        if width > unit:
+            return int(np.ceil(width / unit)) * unit
+    return width
+
+
+def data_range(conn, filters):
+    """(first, last) Timestamp matching the filters, or (None, None)."""
+    params = {}
+    clauses = filters.where(conn.dialect.name, params)
+    where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+    row = conn.execute(
+        text(f'SELECT MIN("Timestamp"), MAX("Timestamp") FROM {quote(TREE_DATA_TABLE)} {where}'),
+        params,
+    ).one()
+    if row[0] is None:
+        return None, None
+    return parse_db_timestamp(row[0]), parse_db_timestamp(row[1])
+
+
+def epoch_to_iso(seconds):
+    """Vectorized Unix seconds -> ISO 8601 UTC strings."""
+    stamps = pd.to_datetime(np.asarray(seconds, dtype="float64"), unit="s", utc=True)
+    return list(stamps.strftime("%Y-%m-%dT%H:%M:%SZ"))
+
+
+def bucket_stats(conn, filters, fields, width):
+    """
+    Per-bucket count/min/max/mean of each field, computed with GROUP BY.
+
+    Returns a columnar dict: bucket start times plus one series per field.
+    """
+    rollup = rollup_for(width, filters)
+    if rollup is not None:
+        rows = rollup_stats_rows(conn, rollup, filters, fields, width)
+        return stats_from_rows(rows, fields, width)
+
+    dialect = conn.dialect.name
+    params = {"width": width}
+    clauses = filters.where(dialect, params)
+    where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+    aggregates = []
+    for field in fields:
+        column = quote(field)
+        aggregates += [
+            f"COUNT({column})",
+            f"MIN({column})",
+            f"MAX({column})",
+            f"AVG({column})",
+        ]
+    sql = (
+        f"SELECT {bucket_sql(dialect)} AS bucket, {', '.join(aggregates)} "
+        f"FROM {quote(TREE_DATA_TABLE)} {where} GROUP BY bucket ORDER BY bucket"
+    )
+    rows = conn.execute(text(sql), params).fetchall()
+    return stats_from_rows(rows, fields, width)
+
+
+def stats_from_rows(rows, fields, width):
+    """Shape (bucket, count, min, max, mean, ...) rows into the columnar payload."""
+    values = np.array([[float(v) if v is not None else np.nan for v in row] for row in rows])
+    if not len(rows):
+        values = np.empty((0, 1 + 4 * len(fields)))
+    series = {}
+    for i, field in enumerate(fields):
+        block = values[:, 1 + 4 * i:5 + 4 * i]
+        series[field] = {
+            "count": block[:, 0].astype(int).tolist(),
+            "min": _nan_to_none(block[:, 1]),
+            "max": _nan_to_none(block[:, 2]),
+            "mean": _nan_to_none(block[:, 3]),
+        }
+    return {"timestamps": epoch_to_iso(values[:, 0] * width), "series": series}
+
+
+def _nan_to_none(array):
+    return [None if np.isnan(v) else v for v in array.tolist()]
+
+
+def fetch_series(conn, filters, field):
+    """(epoch seconds, values) of one channel's non-NULL readings, in time order."""
+    dialect = conn.dialect.name
+    params = {}
+    clauses = filters.where(dialect, params) + [f"{quote(field)} IS NOT NULL"]
+    sql = (
+        f"SELECT {epoch_sql(dialect)}, {quote(field)} FROM {quote(TREE_DATA_TABLE)} "
+        f"WHERE {' AND '.join(clauses)} ORDER BY \"Timestamp\", id"
+    )
+    rows = conn.execute(text(sql), params).fetchall()
+    if not rows:
+        return np.empty(0), np.empty(0)
+    data = np.array(rows, dtype="float64")
+    return data[:, 0], data[:, 1]
+
+
+def lttb(x, y, threshold):
+    """
+    Largest-triangle-three-buckets downsampling to ``threshold`` points.
+
+    Keeps the first and last points; for every bucket in between, picks the
+    point forming the largest triangle with the previously kept point and
+    the mean of the next bucket.
+    """
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return x, y
+    every = (n - 2) / (threshold - 2)
+    # Bucket i spans [edges[i], edges[i + 1]); the final "bucket" is the last point
+    edges = np.floor(np.arange(threshold - 1) * every).astype(np.int64) + 1
+    edges[-1] = n - 1
+    edges = np.append(edges, n)
+    keep = np.empty(threshold, dtype=np.int64)
+    keep[0], keep[-1] = 0, n - 1
+    a = 0
+    for i in range(threshold - 2):
+        lo, hi, next_hi = edges[i], edges[i + 1], edges[i + 2]
+        avg_x = x[hi:next_hi].mean()
+        avg_y = y[hi:next_hi].mean()
+        area = np.abs(
+            (x[a] - avg_x) * (y[lo:hi] - y[a]) - (x[a] - x[lo:hi]) * (avg_y - y[a])
+        )
+        a = lo + int(np.argmax(area))
+        keep[i + 1] = a
+    return x[keep], y[keep]
+
+
+def downsample(conn, filters, fields, points):
+    """LTTB-downsample each field to at most ``points`` points."""
+    series = {}
+    for field in fields:
+        x, y = fetch_series(conn, filters, field)
+        x, y = lttb(x, y, points)
+        series[field] = {"timestamps": epoch_to_iso(x), "values": y.tolist()}
+    return {"series": series}
+
+
+def run_aggregate(conn, mode, filters, fields, points, width=None):
+    """
+    Answer an /aggregate/ query on ``conn``: the response body as a dict.
+    Raises InvalidQuery if an explicit ``width`` gives too many buckets.
+    """
+    # Open-ended ranges default to the span of the matching data
+    start, end = filters.start, filters.end
+    if start is None or end is None:
+        first, last = data_range(conn, filters)
+        start = start or first
+        end = end or last
+    if mode == "lttb":
+        payload = downsample(conn, filters, fields, points)
+    else:
+        if width is None:
+            width = bucket_width(start, end, points) if start and end else 1
+        elif start and end and (end - start).total_seconds() / width > MAX_POINTS:
+            raise InvalidQuery(f"Bucket too small: more than {MAX_POINTS} buckets in range")
+        payload = bucket_stats(conn, filters, fields, width)
+    return {
+        "mode": mode,
+        "start": start,
+        "end": end,
+        "bucket_seconds": width if mode == "stats" else None,
+        **payload,
+    }
@@ -3,3 +3,7 @@ from django.apps import AppConfig
 class DbmodelsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'dbmodels'
+
+    def ready(self):
+        from . import activity
+        activity.install()
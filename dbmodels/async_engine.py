@@ -0,0 +1,90 @@
+"""
+asyncio SQLAlchemy engine for the async read views (TreeDataAsync.py).
+
+Same database and pool settings as engine.py, reached through an asyncio
+driver: asyncpg for PostgreSQL, aiosqlite for SQLite. Async pools belong to
+the event loop that opened their connections, so there is one engine per
+running loop; under uvicorn that is one per worker process.
+"""
+import asyncio
+import logging
+import weakref
+
+from django.db import connections
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from .engine import get_database_url, get_engine_settings
+
+logger = logging.getLogger(__name__)
+
+ASYNC_DRIVERS = {
+    "postgresql": "postgresql+asyncpg",
+    "sqlite": "sqlite+aiosqlite",
+}
+
+_engines = weakref.WeakKeyDictionary()
+
+
+def get_async_database_url():
+    """The tree data URL from engine.py, switched to the asyncio driver."""
+    url = make_url(get_database_url())
+    backend = url.get_backend_name()
+    if backend not in ASYNC_DRIVERS:
+        raise ValueError(f"No async driver for tree data on {backend}")
+    return url.set(drivername=ASYNC_DRIVERS[backend])
+
+
+def _connect_args(url):
+    if url.get_backend_name() == "sqlite":
+        return {"check_same_thread": False}
+    args = {"server_settings": {"timezone": "UTC"}}
+    # asyncpg takes sslmode's values as its ssl argument
+    sslmode = url.query.get("sslmode")
+    if sslmode is None and not get_engine_settings()["URL"]:
+        sslmode = (connections["default"].settings_dict.get("OPTIONS") or {}).get("sslmode")
+    if sslmode:
+        args["ssl"] = sslmode
+    return args
+
+
+def _build_engine():
+    config = get_engine_settings()
+    url = get_async_database_url()
+    kwargs = {}
+    if url.get_backend_name() != "sqlite":
+        kwargs.update(
+            pool_size=config["POOL_SIZE"],
+            max_overflow=config["MAX_OVERFLOW"],
+            pool_timeout=config["POOL_TIMEOUT"],
+            pool_pre_ping=config["POOL_PRE_PING"],
+            pool_recycle=config["POOL_RECYCLE"],
+        )
+    engine = create_async_engine(
+        url.difference_update_query(["sslmode"]),
+        connect_args=_connect_args(url),
+        **kwargs,
+    )
+    logger.info("Created async tree data engine (%s)", url.drivername)
+    return engine
+
+
+def get_engine():
+    """Return the async engine for the running event loop."""
+    loop = asyncio.get_running_loop()
+    engine = _engines.get(loop)
+    if engine is None:
+        engine = _engines[loop] = _build_engine()
+    return engine
+
+
+def connect():
+    """``async with connect() as conn:`` checks out a pooled async connection."""
+    return get_engine().connect()
+
+
+async def dispose_engine():
+    """Close the running loop's engine and its pooled connections."""
+    engine = _engines.pop(asyncio.get_running_loop(), None)
+    if engine is not None:
+        await engine.dispose()
@@ -0,0 +1,158 @@
+"""
+Token authentication with the token -> user lookup cached.
+
+DRF's TokenAuthentication joins Token and User on every request, and the
+admin checks then load the user's profile. Here the token is looked up once
+and the few fields authentication needs (user id, username, flags, role) are
+kept in the "auth" cache (bounded, with a TTL, see settings.CACHES), so
+authenticated requests in the steady state run no auth queries. Password
+hashes and the rest of the user never enter the cache; other fields load on
+first use.
+
+Entries are keyed on a generation stored in auth_token_generation, as
+cache.py keys /treeData/ responses. Views that revoke a token or change a
+user call invalidate_token()/invalidate_user(), which bump it, so every
+worker stops using its entries within AUTH_CACHE_GENERATION_TTL seconds
+(its own at once), whatever cache backend holds them.
+"""
+import hashlib
+import threading
+import time
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.db import connection
+from rest_framework import exceptions
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+
+from .models import UserProfile
+
+GENERATION_TABLE = "auth_token_generation"
+DEFAULT_GENERATION_TTL = 1.0
+USER_FIELDS = ("id", "username", "is_active", "is_staff", "is_superuser")
+
+# The generation this process last read or wrote, and when
+_lock = threading.Lock()
+_generation = {"value": None, "read_at": 0.0}
+
+_SELECT_GENERATION = f"SELECT value FROM {GENERATION_TABLE} WHERE id = 1"
+# Seeded from the clock, like cache.py's, so an emptied table never brings
+# back keys written under older values
+_BUMP_GENERATION = (
+    f"INSERT INTO {GENERATION_TABLE} (id, value) VALUES (1, %s) "
+    f"ON CONFLICT (id) DO UPDATE SET value = {GENERATION_TABLE}.value + 1 "
+    "RETURNING value"
+)
+
+
+def get_cache():
+    return caches[getattr(settings, "AUTH_CACHE_ALIAS", "auth")]
+
+
+def _remember(value):
+    with _lock:
+        _generation.update(value=value or 0, read_at=time.monotonic())
+    return value or 0
+
+
+def generation():
+    """The current token generation, reread at most every AUTH_CACHE_GENERATION_TTL seconds."""
+    ttl = getattr(settings, "AUTH_CACHE_GENERATION_TTL", DEFAULT_GENERATION_TTL)
+    with _lock:
+        if _generation["value"] is not None and time.monotonic() - _generation["read_at"] < ttl:
+            return _generation["value"]
+    with connection.cursor() as cursor:
+        cursor.execute(_SELECT_GENERATION)
+        row = cursor.fetchone()
+    return _remember(row[0] if row else None)
+
+
+def bump_generation():
+    """Stop every process from using the token lookups it has cached."""
+    with connection.cursor() as cursor:
+        cursor.execute(_BUMP_GENERATION, [time.time_ns()])
+        value = cursor.fetchone()[0]
+    return _remember(value)
+
+
+def _key(token_key):
+    # Raw tokens are credentials; keep them out of (possibly shared) cache keys
+    digest = hashlib.sha256(token_key.encode()).hexdigest()
+    return f"auth:token:{generation()}:{digest}"
+
+
+def _lookup(key):
+    """What get_token() caches for ``key``: a dict of plain values, or None."""
+    token = (
+        Token.objects.select_related("user", "user__userprofile")
+        .filter(key=key)
+        .first()
+    )
+    if token is None:
+        return None
+    entry = {name: getattr(token.user, name) for name in USER_FIELDS}
+    profile = getattr(token.user, "userprofile", None)
+    entry["profile"] = (profile.id, profile.role) if profile is not None else None
+    return entry
+
+
+def _instance(model, values):
+    """A ``model`` row with only ``values`` (a dict) loaded, the rest deferred."""
+    # from_db() takes the values in the model's field order
+    names = [f.attname for f in model._meta.concrete_fields if f.attname in values]
+    return model.from_db(connection.alias, names, [values[name] for name in names])
+
+
+def _build(key, entry):
+    """A Token and User (with its profile) rebuilt from a cached entry."""
+    user = _instance(User, {name: entry[name] for name in USER_FIELDS})
+    profile_field = User._meta.get_field("userprofile")
+    if entry["profile"] is None:
+        # Known to have none, so hasattr(user, "userprofile") asks no query
+        profile_field.set_cached_value(user, None)
+    else:
+        profile_id, role = entry["profile"]
+        profile = _instance(UserProfile, {"id": profile_id, "user_id": user.id, "role": role})
+        profile.user = user
+        profile_field.set_cached_value(user, profile)
+    token = _instance(Token, {"key": key, "user_id": user.id})
+    token.user = user
+    User._meta.get_field("auth_token").set_cached_value(user, token)
+    return token
+
+
+def get_token(key):
+    """The Token for ``key`` with its user and profile attached, or None."""
+    cache = get_cache()
+    cache_key = _key(key)
+    entry = cache.get(cache_key)
+    if entry is None:
+        entry = _lookup(key)
+        if entry is None:
+            return None
+        cache.set(cache_key, entry)
+    return _build(key, entry)
+
+
+def invalidate_token(key):
+    """Forget every cached lookup; call once ``key`` has been deleted."""
+    bump_generation()
+
+
+def invalidate_user(user):
+    """Forget cached lookups after a change to ``user`` or its profile has been saved."""
+    bump_generation()
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """TokenAuthentication backed by get_token()."""
+
+    def authenticate_credentials(self, key):
+        token = get_token(key)
+        if token is None:
+            raise exceptions.AuthenticationFailed("Invalid token.")
+        if not token.user.is_active:
+            raise exceptions.AuthenticationFailed("User inactive or deleted.")
+        return (token.user, token)
@@ -0,0 +1,208 @@
+"""
+Batch ingestion of many logger CSVs (or zip archives of them) in one call.
+
+Each CSV, and each CSV member of an archive, is staged to a temporary file of
+its own (members are inflated block by block, never whole into memory) and
+recognised by hash if it was already uploaded or appears twice. By default
+every new file is then queued as an UploadJob for `manage.py
+process_upload_jobs`, like a single upload (queue_batch()). With
+TREE_DATA_ASYNC_UPLOADS off they are loaded one after another, each with
+load_csv() in its own transaction, so one bad file does not undo the others
+(load_batch()).
+
+A batch may hold files from many loggers, so each file has its own source
+and tree, from the batch's manifest (parse_manifest()). A file it does not
+name gets a source of its own (see loader.file_source).
+"""
+import json
+import os
+import shutil
+import zipfile
+
+from django.conf import settings
+from django.core.files.uploadedfile import TemporaryUploadedFile
+
+from . import engine as tree_engine
+from .events import publish_upload
+from .jobs import enqueue
+from .loader import describe_error, fingerprint, load_csv, previous_upload
+
+DEFAULT_MAX_BYTES = 1024 * 1024 * 1024
+
+
+class BatchError(ValueError):
+    """The batch as a whole cannot be processed (bad archive, too large...)."""
+
+
+def parse_manifest(raw, names):
+    """
+    Map each file name (as listed in the results) to its ``source`` and
+    ``tree`` from ``raw``, a JSON object such as
+    ``{"campaign.zip/oak17/may.csv": {"source": "oak-17", "tree": "oak"}}``.
+    """
+    try:
+        manifest = json.loads(raw) if raw else {}
+    except ValueError:
+        raise BatchError("manifest is not valid JSON")
+    if not isinstance(manifest, dict):
+        raise BatchError("manifest must map file names to {\"source\", \"tree\"} objects")
+    unknown = sorted(set(manifest) - set(names))
+    if unknown:
+        raise BatchError(f"manifest names files not in the batch: {', '.join(unknown)}")
+    labels = {}
+    for name, entry in manifest.items():
+        if not isinstance(entry, dict) or set(entry) - {"source", "tree"}:
+            raise BatchError(f"manifest entry for {name} may only have 'source' and 'tree'")
+        for key, value in entry.items():
+            if not isinstance(value, str) or len(value.strip()) > 64:
+                raise BatchError(f"manifest {key} for {name} must be a string of at most 64 characters")
+        labels[name] = {key: value.strip() for key, value in entry.items()}
+    return labels
+
+
+def collect_files(uploaded_files):
+    """
+    Expand uploads into a list of (name, file or None, error) entries: CSVs
+    as they are, zip archives as their CSV members, each staged to a
+    temporary file. Anything else is listed with an error so it shows up in
+    the results. Pass the list to close_files() when done.
+    """
+    max_bytes = getattr(settings, "TREE_DATA_BATCH_MAX_BYTES", DEFAULT_MAX_BYTES)
+    files = []
+    total = 0
+    try:
+        for uploaded in uploaded_files:
+            name = uploaded.name
+            if name.lower().endswith(".zip"):
+                try:
+                    archive = zipfile.ZipFile(uploaded)
+                except zipfile.BadZipFile:
+                    raise BatchError(f"{name} is not a valid zip archive")
+                with archive:
+                    members = [
+                        m for m in archive.infolist()
+                        if not m.is_dir()
+                        and m.filename.lower().endswith(".csv")
+                        and not os.path.basename(m.filename).startswith(".")
+                        and not m.filename.startswith("__MACOSX/")
+                    ]
+                    # Checked against the sizes the archive declares, before inflating
+                    total += sum(m.file_size for m in members)
+                    if total > max_bytes:
+                        raise BatchError(f"Batch is larger than {max_bytes} bytes uncompressed")
+                    for member in members:
+                        files.append((f"{name}/{member.filename}", _stage(archive, member), None))
+            elif name.lower().endswith(".csv"):
+                total += uploaded.size
+                if total > max_bytes:
+                    raise BatchError(f"Batch is larger than {max_bytes} bytes uncompressed")
+                files.append((name, uploaded, None))
+            else:
+                files.append((name, None, "File is not CSV type"))
+    except Exception:
+        close_files(files)
+        raise
+    return files
+
+
+def _stage(archive, member):
+    """Inflate one archive member into a temporary file, a block at a time."""
+    staged = TemporaryUploadedFile(
+        os.path.basename(member.filename), "text/csv", member.file_size, None
+    )
+    try:
+        with archive.open(member) as source:
+            shutil.copyfileobj(source, staged, 1 << 20)
+    except zipfile.BadZipFile as e:
+        staged.close()
+        raise BatchError(f"{member.filename}: {e}")
+    staged.seek(0)
+    return staged
+
+
+def close_files(files):
+    """Remove the temporary files of collect_files()."""
+    for _, csv_file, _ in files:
+        if isinstance(csv_file, TemporaryUploadedFile):
+            csv_file.close()
+
+
+def _new_files(files, results):
+    """
+    Fill ``results`` for files that failed to collect or were uploaded
+    before, and return (index, name, file) for the ones left to load.
+    """
+    pending = []
+    seen = {}
+    with tree_engine.connect() as conn:
+        for index, (name, csv_file, error) in enumerate(files):
+            if error is not None:
+                results[index] = {"file": name, "status": "failed", "error": error}
+                continue
+            sha256, _ = fingerprint(csv_file)
+            if sha256 in seen:
+                results[index] = {"file": name, "status": "duplicate", "duplicate_of": seen[sha256]}
+                continue
+            seen[sha256] = name
+            duplicate = previous_upload(conn, sha256)
+            if duplicate is not None:
+                results[index] = {"file": name, "status": "duplicate", **_counts(duplicate)}
+                continue
+            pending.append((index, name, csv_file))
+    return pending
+
+
+def queue_batch(files, labels=None, user=None, tree=""):
+    """
+    Queue every new file of ``files`` (see collect_files()) as an UploadJob,
+    with the source and tree ``labels`` gives it (see parse_manifest();
+    ``tree`` is the default). Returns one result dict per file, in order.
+    """
+    labels = labels or {}
+    results = [None] * len(files)
+    for index, name, csv_file in _new_files(files, results):
+        job = enqueue(
+            csv_file, user,
+            source=labels.get(name, {}).get("source", ""),
+            tree=labels.get(name, {}).get("tree", tree),
+            filename=name,
+        )
+        results[index] = {"file": name, "status": "queued", "job_id": job.id}
+    return results
+
+
+def load_batch(files, labels=None, tree=""):
+    """
+    Load every new file of ``files`` (see collect_files()) in turn, each in
+    its own transaction; see queue_batch() for ``labels`` and ``tree``.
+    Returns one result dict per file, in order.
+    """
+    labels = labels or {}
+    results = [None] * len(files)
+    for index, name, csv_file in _new_files(files, results):
+        source = labels.get(name, {}).get("source", "")
+        file_tree = labels.get(name, {}).get("tree", tree)
+        result = {"file": name}
+        try:
+            summary = load_csv(csv_file, source=source, tree=file_tree, filename=name)
+        except Exception as e:
+            result.update(status="failed", error=describe_error(e))
+        else:
+            if summary["duplicate"]:
+                # Loaded by someone else since _new_files() looked
+                result.update(status="duplicate", **_counts(summary))
+            else:
+                result.update(
+                    status="loaded", source=summary["source"], tree=file_tree,
+                    seconds=summary["seconds"], **_counts(summary),
+                )
+                publish_upload(summary, summary["source"], file_tree)
+        results[index] = result
+    return results
+
+
+def _counts(summary):
+    return {
+        key: summary[key]
+        for key in ("rows", "rows_new", "rows_skipped", "rows_rejected", "chunks")
+    }
@@ -0,0 +1,167 @@
+"""
+Benchmarks for the ingest and read paths (see `manage.py benchmark`).
+
+Synthetic logger files (loggerdata.py) are uploaded through /upload-csv/
+and then read back through /treeData/ and /treeData/aggregate/ with the
+Django test client, i.e. the full view stack without a network. Every
+scenario reports p50/p99 latency, rows per second and the process's peak
+RSS so far; results are plain dicts, ready for a JSON baseline.
+"""
+import platform
+import random
+import resource
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test import Client, override_settings
+
+from . import cache as tree_cache
+from . import engine as tree_engine
+from .loggerdata import generate_logger_csv
+
+START = datetime(2024, 5, 1)
+INTERVAL_MINUTES = 10
+PAGE_LIMIT = 500
+
+
+def peak_rss_mb():
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def summarize(latencies, rows):
+    """Scenario result for per-request ``latencies`` (seconds) moving ``rows``."""
+    total = sum(latencies)
+    return {
+        "requests": len(latencies),
+        "rows": rows,
+        "p50_ms": round(float(np.percentile(latencies, 50)) * 1000, 2),
+        "p99_ms": round(float(np.percentile(latencies, 99)) * 1000, 2),
+        "rows_per_second": round(rows / total) if total > 0 else None,
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+
+def _timed_get(client, path, params):
+    started = time.perf_counter()
+    response = client.get(path, params)
+    body = b"".join(response.streaming_content) if response.streaming else response.content
+    elapsed = time.perf_counter() - started
+    if response.status_code != 200:
+        raise RuntimeError(f"GET {path} {params} returned {response.status_code}: {body[:200]!r}")
+    return elapsed, body
+
+
+def bench_upload(client, files, rows, gap_rate, missing_rate, seed):
+    latencies = []
+    for i in range(files):
+        data = generate_logger_csv(
+            rows, start=START, interval_minutes=INTERVAL_MINUTES,
+            gap_rate=gap_rate, missing_rate=missing_rate, seed=seed + i,
+        )
+        started = time.perf_counter()
+        # Each file is its own logger, so every row is new
+        response = client.post(
+            f"/api/upload-csv/?source=bench-{i}",
+            data=data,
+            content_type="text/csv",
+            HTTP_CONTENT_DISPOSITION=f'attachment; filename="bench-{i}.csv"',
+        )
+        latencies.append(time.perf_counter() - started)
+        if response.status_code not in (200, 201):
+            raise RuntimeError(f"Upload returned {response.status_code}: {response.content[:200]!r}")
+    return summarize(latencies, files * rows)
+
+
+def bench_pages(client, requests, rows, rng, cached=False):
+    """Pages of PAGE_LIMIT rows from random points in the data."""
+    span = timedelta(minutes=INTERVAL_MINUTES * max(rows - PAGE_LIMIT, 1))
+    fixed = {"limit": PAGE_LIMIT, "start": START.replace(tzinfo=timezone.utc).isoformat()}
+    if cached:
+        # Prime the entry every timed request will hit
+        _timed_get(client, "/api/treeData/", fixed)
+    latencies = []
+    for _ in range(requests):
+        if cached:
+            params = fixed
+        else:
+            tree_cache.bump_generation()
+            start = START + timedelta(seconds=rng.uniform(0, span.total_seconds()))
+            params = {"limit": PAGE_LIMIT, "start": start.replace(tzinfo=timezone.utc).isoformat()}
+        elapsed, _ = _timed_get(client, "/api/treeData/", params)
+        latencies.append(elapsed)
+    return summarize(latencies, requests * PAGE_LIMIT)
+
+
+def bench_aggregate(client, requests, rows, files):
+    latencies = []
+    for _ in range(requests):
+        elapsed, _ = _timed_get(client, "/api/treeData/aggregate/", {"bucket": "1h"})
+        latencies.append(elapsed)
+    return summarize(latencies, requests * rows * files)
+
+
+def run_benchmarks(rows=50000, files=2, requests=50, gap_rate=0.01, missing_rate=0.005, seed=0):
+    """
+    Run every scenario against the current database and return the results.
+    The tree data tables should start out empty.
+    """
+    rng = random.Random(seed)
+    tree_engine.reset_engine()
+    tree_cache.get_cache().clear()
+    user, _ = User.objects.get_or_create(username="benchmark")
+    client = Client()
+    client.force_login(user)
+
+    results = {}
+    with override_settings(TREE_DATA_ASYNC_UPLOADS=False):
+        results["upload"] = bench_upload(client, files, rows, gap_rate, missing_rate, seed)
+    results["treeData_page"] = bench_pages(client, requests, rows, rng)
+    results["treeData_page_cached"] = bench_pages(client, requests, rows, rng, cached=True)
+    results["treeData_aggregate"] = bench_aggregate(client, requests, rows, files)
+    return {
+        "meta": {
+            "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "database": connection.vendor,
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "rows_per_file": rows,
+            "files": files,
+            "requests": requests,
+            "gap_rate": gap_rate,
+            "missing_rate": missing_rate,
+            "seed": seed,
+        },
+        "results": results,
+    }
+
+
+def compare(current, baseline, tolerance):
+    """
+    Lines describing each scenario against ``baseline``, and the names of
+    those whose p50 latency got more than ``tolerance`` (a fraction) worse.
+    """
+    lines = []
+    regressions = []
+    for key in ("database", "rows_per_file", "files", "requests"):
+        if baseline.get("meta", {}).get(key) != current["meta"][key]:
+            lines.append(f"warning: baseline has a different {key} ({baseline.get('meta', {}).get(key)})")
+    for name, result in current["results"].items():
+        before = baseline.get("results", {}).get(name)
+        if not before:
+            lines.append(f"{name}: no baseline")
+            continue
+        change = result["p50_ms"] / before["p50_ms"] - 1 if before["p50_ms"] else 0.0
+        lines.append(
+            f"{name}: p50 {before['p50_ms']} -> {result['p50_ms']} ms ({change:+.0%}), "
+            f"p99 {before['p99_ms']} -> {result['p99_ms']} ms, "
+            f"rows/s {before['rows_per_second']} -> {result['rows_per_second']}"
+        )
+        if change > tolerance:
+            regressions.append(name)
+    return lines, regressions
@@ -0,0 +1,160 @@
+"""
+Bulk-load backends for writing sensor readings into tree_data.
+
+Writers run on a connection borrowed from the shared engine (engine.py) and
+never commit themselves, so a whole upload can be loaded inside one
+transaction. PostgreSQL gets COPY FROM STDIN streamed from an in-memory
+buffer into a staging table; other databases (SQLite in development and
+tests) fall back to a batched executemany.
+
+Readings are unique on (source, tree, Timestamp): rows already in the table
+are skipped with ON CONFLICT DO NOTHING, so overlapping exports load only
+what is new.
+"""
+import io
+
+from django.conf import settings
+
+from .ingest import TREE_DATA_COLUMNS
+
+TREE_DATA_TABLE = "tree_data"
+
+# Unique key of tree_data; re-uploaded readings are skipped on it
+TREE_DATA_KEY = ["source", "tree", "Timestamp"]
+
+
+def quote(name):
+    return '"' + name.replace('"', '""') + '"'
+
+
+class BulkWriter:
+    """
+    Base class: append DataFrames with TREE_DATA_COLUMNS and "quality" to a
+    table, tagging every row with ``source`` and ``tree`` and skipping rows
+    whose key already exists. With ``source`` None each frame brings its
+    own "source" column.
+    """
+
+    name = None
+
+    def __init__(self, conn, table=TREE_DATA_TABLE, columns=TREE_DATA_COLUMNS,
+                 source="", tree="", key=TREE_DATA_KEY):
+        self.conn = conn
+        self.table = table
+        self.source = source
+        self.tree = tree
+        self.columns = list(columns) + ["quality", "source", "tree"]
+        self.column_list = ", ".join(quote(c) for c in self.columns)
+        self.on_conflict = (
+            f" ON CONFLICT ({', '.join(quote(c) for c in key)}) DO NOTHING" if key else ""
+        )
+
+    def tagged(self, frame):
+        """``frame`` with the "source" and "tree" columns filled in."""
+        if self.source is None:
+            return frame.assign(tree=self.tree)
+        return frame.assign(source=self.source, tree=self.tree)
+
+    def write(self, frame):
+        """Append one DataFrame and return the number of new rows written."""
+        raise NotImplementedError
+
+
+class CopyWriter(BulkWriter):
+    """
+    PostgreSQL COPY FROM STDIN into a temporary staging table, fed from an
+    in-memory CSV buffer, then merged with INSERT ... SELECT ... ON CONFLICT.
+    """
+
+    name = "copy"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.stage = None
+
+    def write(self, frame):
+        if frame.empty:
+            return 0
+        buffer = io.StringIO()
+        self.tagged(frame).to_csv(
+            buffer, columns=self.columns, header=False, index=False, na_rep="\\N"
+        )
+        buffer.seek(0)
+        cursor = self.conn.connection.cursor()
+        try:
+            if self.stage is None:
+                # Dropped with the upload's transaction
+                self.stage = quote(self.table + "_stage")
+                cursor.execute(
+                    f"CREATE TEMP TABLE {self.stage} ON COMMIT DROP AS "
+                    f"SELECT {self.column_list} FROM {quote(self.table)} WITH NO DATA"
+                )
+            cursor.copy_expert(
+                f"COPY {self.stage} ({self.column_list}) "
+                "FROM STDIN WITH (FORMAT csv, NULL '\\N')",
+                buffer,
+            )
+            cursor.execute(
+                f"INSERT INTO {quote(self.table)} ({self.column_list}) "
+                f"SELECT {self.column_list} FROM {self.stage}{self.on_conflict}"
+            )
+            written = cursor.rowcount
+            cursor.execute(f"TRUNCATE {self.stage}")
+        finally:
+            cursor.close()
+        return written
+
+
+def sqlite_timestamps(series):
+    """Format UTC datetimes the way Django's SQLite backend stores them."""
+    text = series.dt.tz_convert(None).dt.strftime("%Y-%m-%d %H:%M:%S.%f")
+    return text.str.replace(r"\.000000$", "", regex=True)
+
+
+class InsertWriter(BulkWriter):
+    """Portable fallback: one executemany per DataFrame."""
+
+    name = "insert"
+
+    def write(self, frame):
+        if frame.empty:
+            return 0
+        marker = "?" if self.conn.dialect.paramstyle == "qmark" else "%s"
+        placeholders = ", ".join([marker] * len(self.columns))
+        frame = self.tagged(frame)[self.columns]
+        if self.conn.dialect.name == "sqlite":
+            frame = frame.assign(Timestamp=sqlite_timestamps(frame["Timestamp"]))
+        # DBAPI drivers expect None, not NaN, for NULLs
+        frame = frame.astype(object).where(frame.notna(), None)
+        cursor = self.conn.connection.cursor()
+        try:
+            cursor.executemany(
+                f"INSERT INTO {quote(self.table)} ({self.column_list}) "
+                f"VALUES ({placeholders}){self.on_conflict}",
+                frame.itertuples(index=False, name=None),
+            )
+            # Summed over the batch; rows skipped on conflict count as 0
+            written = cursor.rowcount
+        finally:
+            cursor.close()
+        return written
+
+
+WRITERS = {writer.name: writer for writer in (CopyWriter, InsertWriter)}
+
+
+def get_writer(conn, **kwargs):
+    """
+    Pick the writer for this connection.
+
+    settings.TREE_DATA_BULK_WRITER may name a writer explicitly ("copy" or
+    "insert"); the default "auto" uses COPY on PostgreSQL only.
+    """
+    choice = getattr(settings, "TREE_DATA_BULK_WRITER", "auto")
+    if choice == "auto":
+        choice = "copy" if conn.dialect.name == "postgresql" else "insert"
+    try:
+        writer_class = WRITERS[choice]
+    except KeyError:
+        raise ValueError(f"Unknown bulk writer: {choice}")
+    return writer_class(conn, **kwargs)
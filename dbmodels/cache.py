@@ -0,0 +1,205 @@
+"""
+Result cache for /treeData/.
+
+Responses are stored in the "tree_data" cache (Django's cache framework, local
+memory unless TREE_DATA_CACHE_BACKEND says otherwise) under a key made of the
+normalized query and the current data generation. Every successful upload
+bumps the generation, so entries written before it are never read again and
+simply age out. Bodies larger than TREE_DATA_CACHE_MAX_BYTES are streamed
+without being kept.
+
+The generation is a row in tree_data_generation, so uploads loaded by
+process_upload_jobs or by another web worker invalidate every process's
+entries. Each process rereads it at most every
+TREE_DATA_CACHE_GENERATION_TTL seconds; its own uploads apply at once.
+
+Responses carry a strong ETag derived from the cache key: the normalized
+query and the generation decide the body, so the ETag is known before the
+body is, and misses get one too. Clients poll with If-None-Match and get a
+bodiless 304 while nothing changed, whether or not the body was cached.
+"""
+import hashlib
+import json
+import threading
+import time
+from datetime import timezone
+
+from django.conf import settings
+from django.core.cache import caches
+from django.http import HttpResponse, HttpResponseNotModified
+from django.utils.http import parse_etags
+from sqlalchemy import text
+
+from . import async_engine
+from . import engine as tree_engine
+
+GENERATION_TABLE = "tree_data_generation"
+DEFAULT_MAX_BYTES = 1024 * 1024
+DEFAULT_GENERATION_TTL = 1.0
+
+# The generation this process last read or wrote, and when
+_lock = threading.Lock()
+_generation = {"value": None, "read_at": 0.0}
+
+_SELECT_GENERATION = f"SELECT value FROM {GENERATION_TABLE} WHERE id = 1"
+# Seeded from the clock, so a table emptied by a restore or a test run never
+# counts again through values older keys were written under
+_BUMP_GENERATION = (
+    f"INSERT INTO {GENERATION_TABLE} (id, value) VALUES (1, :seed) "
+    f"ON CONFLICT (id) DO UPDATE SET value = {GENERATION_TABLE}.value + 1 "
+    "RETURNING value"
+)
+
+
+def get_cache():
+    return caches[getattr(settings, "TREE_DATA_CACHE_ALIAS", "tree_data")]
+
+
+def get_max_bytes():
+    return getattr(settings, "TREE_DATA_CACHE_MAX_BYTES", DEFAULT_MAX_BYTES)
+
+
+def _remembered():
+    """The generation last seen by this process, if it is recent enough."""
+    ttl = getattr(settings, "TREE_DATA_CACHE_GENERATION_TTL", DEFAULT_GENERATION_TTL)
+    with _lock:
+        if _generation["value"] is not None and time.monotonic() - _generation["read_at"] < ttl:
+            return _generation["value"]
+    return None
+
+
+def _remember(value):
+    with _lock:
+        _generation.update(value=value or 0, read_at=time.monotonic())
+    return value or 0
+
+
+def generation():
+    """Return the current data generation."""
+    value = _remembered()
+    if value is None:
+        with tree_engine.connect() as conn:
+            value = _remember(conn.execute(text(_SELECT_GENERATION)).scalar())
+    return value
+
+
+async def ageneration():
+    """generation() on the asyncio engine."""
+    value = _remembered()
+    if value is None:
+        async with async_engine.connect() as conn:
+            value = _remember((await conn.execute(text(_SELECT_GENERATION))).scalar())
+    return value
+
+
+def bump_generation():
+    """Invalidate every cached response; call once new data is committed."""
+    with tree_engine.begin() as conn:
+        value = conn.execute(text(_BUMP_GENERATION), {"seed": time.time_ns()}).scalar()
+    return _remember(value)
+
+
+def _key(query, generation):
+    digest = hashlib.sha256(json.dumps(query, sort_keys=True).encode()).hexdigest()
+    return f"tree_data:{generation}:{digest}"
+
+
+def cache_key(query):
+    """Key for a normalized query (a JSON-serializable dict) in this generation."""
+    return _key(query, generation())
+
+
+async def acache_key(query):
+    """cache_key() without blocking the event loop."""
+    return _key(query, await ageneration())
+
+
+def normalized_query(export_format, limit, after, filters):
+    """The parts of a /treeData/ request that decide its response."""
+    def iso(value):
+        return value.astimezone(timezone.utc).isoformat() if value is not None else None
+
+    return {
+        "format": export_format,
+        "limit": limit,
+        "after": [iso(after[0]), after[1]] if after is not None else None,
+        "start": iso(filters.start),
+        "end": iso(filters.end),
+        "fields": filters.fields,
+        "tree": filters.tree,
+        "quality": filters.quality,
+    }
+
+
+def etag_for(key):
+    """Strong ETag of the response for the cache key ``key``."""
+    return '"' + hashlib.sha256(key.encode()).hexdigest()[:32] + '"'
+
+
+def not_modified(request, key, cache_control):
+    """A 304 if the client already has the response for ``key``, else None."""
+    etag = etag_for(key)
+    client_etags = parse_etags(request.headers.get("If-None-Match", ""))
+    if etag not in client_etags and "*" not in client_etags:
+        return None
+    response = HttpResponseNotModified()
+    response["Cache-Control"] = cache_control
+    response["ETag"] = etag
+    response["X-Cache"] = "HIT"
+    return response
+
+
+def cached_response(cached):
+    """Response for a cache hit: the stored body."""
+    response = HttpResponse(cached["body"], headers=cached["headers"])
+    response["ETag"] = cached["etag"]
+    response["X-Cache"] = "HIT"
+    return response
+
+
+def caching_stream(chunks, key, headers):
+    """
+    Pass ``chunks`` through unchanged and, once the whole body has been sent,
+    store it under ``key`` together with ``headers``.
+
+    Nothing is stored if the body outgrows the size limit or the client
+    goes away before the end.
+    """
+    max_bytes = get_max_bytes()
+    parts = []
+    size = 0
+    try:
+        for chunk in chunks:
+            yield chunk
+            if parts is not None:
+                size += len(chunk)
+                if size > max_bytes:
+                    parts = None
+                else:
+                    parts.append(chunk)
+    finally:
+        chunks.close()
+    if parts is not None:
+        body = b"".join(parts)
+        get_cache().set(key, {"body": body, "headers": headers, "etag": etag_for(key)})
+
+
+async def acaching_stream(chunks, key, headers):
+    """caching_stream() for an async iterator of chunks."""
+    max_bytes = get_max_bytes()
+    parts = []
+    size = 0
+    try:
+        async for chunk in chunks:
+            yield chunk
+            if parts is not None:
+                size += len(chunk)
+                if size > max_bytes:
+                    parts = None
+                else:
+                    parts.append(chunk)
+    finally:
+        await chunks.aclose()
+    if parts is not None:
+        body = b"".join(parts)
+        await get_cache().aset(key, {"body": body, "headers": headers, "etag": etag_for(key)})
@@ -0,0 +1,254 @@
+"""
+Process-wide SQLAlchemy engine shared by the sensor-data views.
+
+The engine (and its connection pool) is created lazily on first use and then
+reused for every request handled by the worker. Under gunicorn's pre-fork
+model a child process must never reuse sockets opened by its parent, so the
+engine is tied to the PID that created it and rebuilt after a fork.
+"""
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import connections
+from sqlalchemy import create_engine, event, exc
+from sqlalchemy.engine import URL
+from sqlalchemy.pool import QueuePool
+
+from . import timing
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_ENGINE_SETTINGS = {
+    "URL": None,
+    "POOL_SIZE": 5,
+    "MAX_OVERFLOW": 5,
+    "POOL_TIMEOUT": 30,
+    "POOL_PRE_PING": True,
+    "POOL_RECYCLE": 300,
+}
+
+_lock = threading.Lock()
+_engine = None
+_engine_pid = None
+
+
+class PoolStatistics:
+    """Thread-safe counters describing how the pool is being used."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.connects = 0
+            self.checkouts = 0
+            self.checkins = 0
+            self.timeouts = 0
+            self.total_wait = 0.0
+            self.max_wait = 0.0
+
+    def record_connect(self):
+        with self._lock:
+            self.connects += 1
+
+    def record_checkout(self):
+        with self._lock:
+            self.checkouts += 1
+
+    def record_checkin(self):
+        with self._lock:
+            self.checkins += 1
+
+    def record_wait(self, seconds, timed_out=False):
+        with self._lock:
+            self.total_wait += seconds
+            self.max_wait = max(self.max_wait, seconds)
+            if timed_out:
+                self.timeouts += 1
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "connects": self.connects,
+                "checkouts": self.checkouts,
+                "checkins": self.checkins,
+                "timeouts": self.timeouts,
+                "total_wait_seconds": round(self.total_wait, 6),
+                "max_wait_seconds": round(self.max_wait, 6),
+                "mean_wait_seconds": round(
+                    self.total_wait / self.checkouts, 6
+                ) if self.checkouts else 0.0,
+            }
+
+
+stats = PoolStatistics()
+
+
+def get_engine_settings():
+    """Return the TREE_DATA_ENGINE settings merged over the defaults."""
+    config = dict(DEFAULT_ENGINE_SETTINGS)
+    config.update(getattr(settings, "TREE_DATA_ENGINE", {}))
+    return config
+
+
+def get_database_url():
+    """
+    Return the SQLAlchemy URL for the sensor data.
+
+    An explicit TREE_DATA_ENGINE["URL"] wins; otherwise the URL is built from
+    Django's "default" database, which itself comes from DATABASE_URL.
+    """
+    url = get_engine_settings()["URL"]
+    if url:
+        # Heroku/Render style URLs use the scheme SQLAlchemy no longer accepts
+        if url.startswith("postgres://"):
+            url = "postgresql://" + url[len("postgres://"):]
+        return url
+
+    db = connections["default"].settings_dict
+    vendor = db["ENGINE"].rsplit(".", 1)[-1]
+    if vendor == "sqlite3":
+        name = str(db["NAME"])
+        if name.startswith("file:"):
+            # In-memory test databases are shared through a URI filename
+            return f"sqlite:///{name}&uri=true" if "?" in name else f"sqlite:///{name}?uri=true"
+        return f"sqlite:///{name}"
+    if vendor in ("postgresql", "postgresql_psycopg2", "postgis"):
+        return URL.create(
+            "postgresql+psycopg2",
+            username=db.get("USER") or None,
+            password=db.get("PASSWORD") or None,
+            host=db.get("HOST") or None,
+            port=int(db["PORT"]) if db.get("PORT") else None,
+            database=db.get("NAME") or None,
+        )
+    raise ValueError(f"Unsupported database engine for tree data: {db['ENGINE']}")
+
+
+def _connect_args(url):
+    if str(url).startswith("sqlite"):
+        # Pooled connections may be handed to other request threads
+        return {"check_same_thread": False}
+    args = {}
+    if not get_engine_settings()["URL"]:
+        # Carry over options such as sslmode from the Django database settings
+        args.update(connections["default"].settings_dict.get("OPTIONS") or {})
+    # Hand timestamptz values back in UTC, whatever the server's default zone
+    args["options"] = (args.get("options", "") + " -c timezone=UTC").strip()
+    return args
+
+
+def _build_engine():
+    config = get_engine_settings()
+    url = get_database_url()
+    engine = create_engine(
+        url,
+        poolclass=QueuePool,
+        pool_size=config["POOL_SIZE"],
+        max_overflow=config["MAX_OVERFLOW"],
+        pool_timeout=config["POOL_TIMEOUT"],
+        pool_pre_ping=config["POOL_PRE_PING"],
+        pool_recycle=config["POOL_RECYCLE"],
+        connect_args=_connect_args(url),
+    )
+    event.listen(engine, "connect", lambda *args: stats.record_connect())
+    event.listen(engine, "checkout", lambda *args: stats.record_checkout())
+    event.listen(engine, "checkin", lambda *args: stats.record_checkin())
+    timing.install_engine_hooks(engine)
+    logger.info(
+        "Created tree data engine (pid=%s, pool_size=%s, max_overflow=%s)",
+        os.getpid(), config["POOL_SIZE"], config["MAX_OVERFLOW"],
+    )
+    return engine
+
+
+def get_engine():
+    """Return this process's engine, creating it on first use."""
+    global _engine, _engine_pid
+    pid = os.getpid()
+    if _engine is not None and _engine_pid == pid:
+        return _engine
+    with _lock:
+        if _engine is None or _engine_pid != pid:
+            _engine = _build_engine()
+            _engine_pid = pid
+    return _engine
+
+
+def reset_engine():
+    """Dispose of the current engine so the next call builds a fresh one."""
+    global _engine, _engine_pid
+    with _lock:
+        if _engine is not None and _engine_pid == os.getpid():
+            _engine.dispose()
+        _engine = None
+        _engine_pid = None
+    stats.reset()
+
+
+def _forget_engine_after_fork():
+    # The child inherits the parent's pool; drop the reference without
+    # closing, since closing would tear down the parent's sockets too.
+    global _engine, _engine_pid
+    _engine = None
+    _engine_pid = None
+    stats.reset()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_forget_engine_after_fork)
+
+
+def _timed(acquire):
+    start = time.perf_counter()
+    try:
+        conn = acquire()
+    except exc.TimeoutError:
+        stats.record_wait(time.perf_counter() - start, timed_out=True)
+        logger.error("Timed out waiting for a tree data connection: %s", pool_status())
+        raise
+    stats.record_wait(time.perf_counter() - start)
+    return conn
+
+
+@contextmanager
+def connect():
+    """Check a connection out of the shared pool, recording the wait."""
+    conn = _timed(get_engine().connect)
+    try:
+        yield conn
+    finally:
+        conn.close()
+
+
+@contextmanager
+def begin():
+    """Like connect(), but run everything inside one transaction."""
+    conn = _timed(get_engine().connect)
+    try:
+        with conn.begin():
+            yield conn
+    finally:
+        conn.close()
+
+
+def pool_status():
+    """Current pool occupancy plus the cumulative checkout/wait counters."""
+    status = {"pid": os.getpid(), **stats.snapshot()}
+    engine = _engine if _engine_pid == os.getpid() else None
+    if engine is not None:
+        pool = engine.pool
+        status.update(
+            {
+                "pool_size": pool.size(),
+                "checked_in": pool.checkedin(),
+                "checked_out": pool.checkedout(),
+                "overflow": pool.overflow(),
+            }
+        )
+    return status
@@ -0,0 +1,246 @@
+"""
+Notifications of committed uploads, for /async/treeData/events/.
+
+After an upload commits, its loader calls publish_upload() with the load
+summary. The event (file hash, logger, tree, row counts and the time range
+it covered) goes to a broadcaster, which hands it to every open event
+stream. Each stream has a Subscription: a bounded queue on its event loop.
+
+LocalBroadcaster reaches streams in the same process only. That suits
+tests, SQLite and single-process servers. PostgresBroadcaster sends every
+event with NOTIFY. Each worker process LISTENs on one connection per event
+loop and fans what arrives out locally. That way an upload committed by
+any process reaches every stream, including the upload job worker
+(process_upload_jobs).
+"""
+import asyncio
+import json
+import logging
+import threading
+import weakref
+from datetime import timezone
+
+from django.conf import settings
+from sqlalchemy import text
+
+from . import async_engine
+from . import engine as tree_engine
+
+logger = logging.getLogger(__name__)
+
+BACKENDS = ("auto", "local", "postgres")
+
+# NOTIFY channel; payloads are a few hundred bytes, well under its 8000 limit
+CHANNEL = "tree_data_uploads"
+
+# Events a stream may fall behind by before it starts missing them
+SUBSCRIBER_QUEUE = 100
+
+_broadcaster = None
+_lock = threading.Lock()
+
+
+class Subscription:
+    """Events for one stream, queued on the event loop that reads them."""
+
+    def __init__(self, maxsize=SUBSCRIBER_QUEUE):
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(maxsize)
+        self.missed = 0
+        self.closed = False
+
+    def put(self, event):
+        """Queue ``event`` from any thread."""
+        self.loop.call_soon_threadsafe(self._put, event)
+
+    def _put(self, event):
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            self.missed += 1
+
+    def close(self):
+        """End the stream once it has read what is queued."""
+        self.loop.call_soon_threadsafe(self._put, None)
+        self.closed = True
+
+    async def get(self, timeout):
+        """The next event, or None after ``timeout`` seconds or once closed."""
+        if self.closed and self.queue.empty():
+            return None
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+
+class LocalBroadcaster:
+    """Delivers events to the subscriptions of this process."""
+
+    name = "local"
+
+    def __init__(self):
+        self.subscriptions = set()
+        self._lock = threading.Lock()
+
+    async def subscribe(self):
+        subscription = Subscription()
+        with self._lock:
+            self.subscriptions.add(subscription)
+        return subscription
+
+    async def unsubscribe(self, subscription):
+        with self._lock:
+            self.subscriptions.discard(subscription)
+
+    def deliver(self, event, loop=None):
+        """Queue ``event`` for every subscription (on ``loop`` only, if given)."""
+        with self._lock:
+            subscriptions = [s for s in self.subscriptions if loop is None or s.loop is loop]
+        for subscription in subscriptions:
+            try:
+                subscription.put(event)
+            except RuntimeError:
+                # Its event loop has closed
+                with self._lock:
+                    self.subscriptions.discard(subscription)
+
+    def publish(self, event):
+        self.deliver(event)
+
+
+class PostgresBroadcaster(LocalBroadcaster):
+    """
+    Publishes with NOTIFY and listens with asyncpg. Each event loop with
+    subscriptions keeps one async engine connection listening, and returns
+    it when its last stream ends.
+    """
+
+    name = "postgres"
+
+    def __init__(self):
+        super().__init__()
+        self._listeners = weakref.WeakKeyDictionary()
+        self._starting = weakref.WeakKeyDictionary()
+
+    async def subscribe(self):
+        subscription = await super().subscribe()
+        try:
+            await self._listen(subscription.loop)
+        except Exception:
+            await self.unsubscribe(subscription)
+            raise
+        return subscription
+
+    async def unsubscribe(self, subscription):
+        await super().unsubscribe(subscription)
+        loop = subscription.loop
+        with self._lock:
+            idle = not any(s.loop is loop for s in self.subscriptions)
+        if idle and loop in self._listeners:
+            await self._stop(loop)
+
+    def publish(self, event):
+        with tree_engine.begin() as conn:
+            conn.execute(
+                text("SELECT pg_notify(:channel, :payload)"),
+                {"channel": CHANNEL, "payload": json.dumps(event)},
+            )
+
+    async def _listen(self, loop):
+        starting = self._starting.setdefault(loop, asyncio.Lock())
+        async with starting:
+            if loop in self._listeners:
+                return
+            conn = await async_engine.get_engine().connect()
+
+            def received(connection, pid, channel, payload):
+                self._received(loop, payload)
+
+            try:
+                raw = (await conn.get_raw_connection()).driver_connection
+                await raw.add_listener(CHANNEL, received)
+                raw.add_termination_listener(lambda _: self._lost(loop))
+            except Exception:
+                await conn.close()
+                raise
+            self._listeners[loop] = (conn, raw, received)
+
+    async def _stop(self, loop):
+        conn, raw, received = self._listeners.pop(loop)
+        try:
+            # UNLISTEN before the connection goes back to the pool
+            await raw.remove_listener(CHANNEL, received)
+        finally:
+            await conn.close()
+
+    def _received(self, loop, payload):
+        try:
+            event = json.loads(payload)
+        except ValueError:
+            logger.error(f"Ignoring malformed upload event: {payload[:200]}")
+            return
+        self.deliver(event, loop)
+
+    def _lost(self, loop):
+        # Streams end and their clients reconnect, which listens again
+        logger.error("Lost the upload event listener connection")
+        self._listeners.pop(loop, None)
+        with self._lock:
+            subscriptions = [s for s in self.subscriptions if s.loop is loop]
+        for subscription in subscriptions:
+            subscription.close()
+
+
+def get_backend():
+    """TREE_DATA_EVENTS_BACKEND, with "auto" resolved for the tree data database."""
+    backend = getattr(settings, "TREE_DATA_EVENTS_BACKEND", "auto")
+    if backend not in BACKENDS:
+        raise ValueError(f"TREE_DATA_EVENTS_BACKEND must be one of: {', '.join(BACKENDS)}")
+    if backend == "auto":
+        dialect = tree_engine.get_engine().dialect.name
+        backend = "postgres" if dialect == "postgresql" else "local"
+    return backend
+
+
+def get_broadcaster():
+    """Return the process-wide broadcaster, creating it on first use."""
+    global _broadcaster
+    with _lock:
+        backend = get_backend()
+        if _broadcaster is None or _broadcaster.name != backend:
+            _broadcaster = PostgresBroadcaster() if backend == "postgres" else LocalBroadcaster()
+        return _broadcaster
+
+
+def _iso(value):
+    if value is None:
+        return None
+    return value.astimezone(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+def upload_event(summary, source="", tree=""):
+    """The event for a load ``summary`` (see loader.load_chunks)."""
+    return {
+        "sha256": summary["sha256"],
+        "source": source,
+        "tree": tree,
+        "rows": summary["rows"],
+        "rows_new": summary["rows_new"],
+        "first_timestamp": _iso(summary["first_timestamp"]),
+        "last_timestamp": _iso(summary["last_timestamp"]),
+    }
+
+
+def publish_upload(summary, source="", tree=""):
+    """
+    Tell the event streams about an upload that has just committed. Loads
+    that stored nothing new are not announced. Errors are logged, not
+    raised: the upload itself has succeeded.
+    """
+    if not summary["rows_new"]:
+        return
+    try:
+        get_broadcaster().publish(upload_event(summary, source, tree))
+    except Exception as e:
+        logger.error(f"Could not publish upload event: {e}")
@@ -0,0 +1,156 @@
+"""
+Columnar exports of tree data: Arrow IPC stream, Parquet and gzip CSV.
+
+Each batch fetched from the server-side cursor is transposed into columns
+and written as one Arrow record batch (or Parquet row group, or CSV block),
+then flushed to the client. No per-row dicts are built along the way.
+pyarrow is optional; without it only the CSV export is available.
+"""
+import csv
+import gzip
+import io
+
+import pandas as pd
+
+from .queries import parse_db_timestamp
+from .timing import phase
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # pragma: no cover - depends on the environment
+    pa = pq = None
+
+
+def arrow_type(column):
+    if column == "id":
+        return pa.int64()
+    if column == "Timestamp":
+        return pa.timestamp("us", tz="UTC")
+    if column == "Timestamp_Raw":
+        return pa.string()
+    if column == "quality":
+        return pa.int16()
+    return pa.float64()
+
+
+def _timestamps(values, dialect_name):
+    # SQLite returns Timestamp as text; PostgreSQL gives UTC datetimes
+    if dialect_name == "sqlite":
+        return pd.to_datetime(pd.Series(values), utc=True)
+    return values
+
+
+class _Sink:
+    """Write-only file object that hands back whatever was written since the last drain."""
+
+    def __init__(self):
+        self.parts = []
+        self.position = 0
+        self.closed = False
+
+    def write(self, data):
+        data = bytes(data)
+        self.parts.append(data)
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def drain(self):
+        data = b"".join(self.parts)
+        self.parts = []
+        return data
+
+
+def _record_batches(columns, batches, dialect_name, schema):
+    for rows in batches:
+        with phase("encode"):
+            values = list(zip(*rows))
+            arrays = []
+            for column, data in zip(columns, values):
+                if column == "Timestamp":
+                    data = _timestamps(data, dialect_name)
+                arrays.append(pa.array(data, type=schema.field(column).type))
+            batch = pa.RecordBatch.from_arrays(arrays, schema=schema)
+        yield batch
+
+
+def _schema(columns):
+    return pa.schema([pa.field(c, arrow_type(c)) for c in columns])
+
+
+def arrow_stream(columns, batches, dialect_name):
+    """Yield an Arrow IPC stream, one record batch per fetched batch."""
+    schema = _schema(columns)
+    sink = _Sink()
+    try:
+        with pa.ipc.new_stream(pa.PythonFile(sink, mode="w"), schema) as writer:
+            yield sink.drain()
+            for batch in _record_batches(columns, batches, dialect_name, schema):
+                with phase("encode"):
+                    writer.write_batch(batch)
+                yield sink.drain()
+        yield sink.drain()
+    finally:
+        batches.close()
+
+
+def parquet_stream(columns, batches, dialect_name):
+    """Yield a Parquet file, one row group per fetched batch."""
+    schema = _schema(columns)
+    sink = _Sink()
+    try:
+        with pq.ParquetWriter(pa.PythonFile(sink, mode="w"), schema, compression="snappy") as writer:
+            for batch in _record_batches(columns, batches, dialect_name, schema):
+                with phase("encode"):
+                    writer.write_table(pa.Table.from_batches([batch]))
+                yield sink.drain()
+        yield sink.drain()
+    finally:
+        batches.close()
+
+
+def csv_gzip_stream(columns, batches, dialect_name):
+    """Yield gzip-compressed CSV with a header row (byte-identical for the same rows)."""
+    buffer = io.BytesIO()
+    text = io.TextIOWrapper(
+        gzip.GzipFile(fileobj=buffer, mode="wb", mtime=0), encoding="utf-8", newline=""
+    )
+    writer = csv.writer(text)
+    timestamp_index = columns.index("Timestamp")
+    try:
+        writer.writerow(columns)
+        for rows in batches:
+            with phase("encode"):
+                for row in rows:
+                    row = list(row)
+                    row[timestamp_index] = parse_db_timestamp(row[timestamp_index]).isoformat()
+                    writer.writerow(row)
+                text.flush()
+            if buffer.tell():
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+        text.close()
+        yield buffer.getvalue()
+    finally:
+        batches.close()
+
+
+EXPORTS = {
+    "arrow": arrow_stream,
+    "parquet": parquet_stream,
+    "csv": csv_gzip_stream,
+}
+
+
+def available(format_name):
+    return format_name == "csv" or pa is not None
@@ -0,0 +1,332 @@
+"""
+Parsing pipeline for logger CSV exports.
+
+Logger files start with a 29-line preamble, followed by a header row, a units
+row and the readings. The column layout is decided once from the header and
+the first rows; the readings are then read in a single typed pass that only
+keeps the columns tree_data stores, in fixed-size chunks so that memory stays
+bounded by the chunk size rather than the size of the export (see
+TreeReading for the schema).
+
+The pyarrow CSV reader is used when pyarrow is installed: its columns are
+kept as Arrow buffers until they are cast, so no Python object is built per
+value except for the raw logger timestamp. Without pyarrow the pandas C
+parser reads the same columns with inferred numeric types.
+"""
+from django.conf import settings
+import pandas as pd
+
+from .quality import QualityChecker
+from .timing import phase
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.csv as pa_csv
+except ImportError:  # pragma: no cover - depends on the environment
+    pa = pc = pa_csv = None
+
+# Lines of logger metadata before the CSV header
+PREAMBLE_ROWS = 29
+
+DEFAULT_CHUNK_ROWS = 50000
+
+# Rows (after the header) read to decide the column layout
+LAYOUT_SAMPLE_ROWS = 1000
+
+CSV_ENGINES = ("pyarrow", "pandas")
+
+# Clean column names for the database, in file order (after the first column)
+TREE_DATA_COLUMNS = [
+    "Timestamp_Raw",
+    "Timestamp",
+    "Temperature",
+    "Pressure",
+    "Humidity",
+    "Dendro",
+    "Sapflow",
+    "SF_maxD",
+    "SF_Signal",
+    "SF_Noise",
+    "Dendro_Dup",
+]
+
+# Every reading column except the raw logger timestamp is a float
+FLOAT_COLUMNS = TREE_DATA_COLUMNS[2:]
+
+# Sentinel the old TEXT schema stored in place of NULL
+LEGACY_MISSING_VALUE = "NULL_MISSING"
+
+
+class CSVFormatError(ValueError):
+    """The upload does not look like a logger export."""
+
+
+def get_chunk_rows():
+    return getattr(settings, "TREE_DATA_UPLOAD_CHUNK_ROWS", DEFAULT_CHUNK_ROWS)
+
+
+def get_csv_engine():
+    """
+    The parser for uploads. settings.TREE_DATA_CSV_ENGINE may name one
+    ("pyarrow" or "pandas"); the default "auto" uses pyarrow when installed.
+    """
+    choice = getattr(settings, "TREE_DATA_CSV_ENGINE", "auto")
+    if choice == "auto":
+        choice = "pyarrow" if pa_csv is not None else "pandas"
+    if choice not in CSV_ENGINES:
+        raise ValueError(f"Unknown CSV engine: {choice}")
+    if choice == "pyarrow" and pa_csv is None:
+        raise ValueError("The pyarrow CSV engine needs pyarrow installed")
+    return choice
+
+
+def _select_columns(sample):
+    """
+    Positions of the columns that map onto TREE_DATA_COLUMNS.
+
+    Columns that are entirely empty in the sample (units row included) are
+    dropped, as before, and the first remaining one is the record number.
+    """
+    columns = sample.columns[sample.notna().any()]
+    if len(columns) < len(TREE_DATA_COLUMNS) + 1:
+        raise CSVFormatError(
+            f"CSV has fewer than {len(TREE_DATA_COLUMNS) + 1} columns after "
+            f"skipping rows (found {len(columns)})"
+        )
+    return list(sample.columns.get_indexer(columns[1:len(TREE_DATA_COLUMNS) + 1]))
+
+
+def read_layout(csv_file):
+    """
+    Return (number of columns, positions of TREE_DATA_COLUMNS) from the
+    header and the first LAYOUT_SAMPLE_ROWS rows, or None for a file without
+    any. The file is left where it was.
+    """
+    position = csv_file.tell()
+    sample = pd.read_csv(
+        csv_file,
+        delimiter=",",
+        skiprows=PREAMBLE_ROWS,
+        header=0,
+        dtype=str,
+        encoding="utf-8",
+        nrows=LAYOUT_SAMPLE_ROWS,
+    )
+    csv_file.seek(position)
+    if sample.empty:
+        return None
+    return len(sample.columns), _select_columns(sample)
+
+
+def drop_rejected(chunk):
+    """Drop rows without a timestamp, counting them in ``chunk.attrs["rejected"]``."""
+    valid = chunk["Timestamp"].notna()
+    rejected = int((~valid).sum())
+    if rejected:
+        chunk = chunk[valid]
+    chunk.attrs["rejected"] = rejected
+    return chunk
+
+
+def parse_chunk(chunk):
+    """
+    Convert a chunk with TREE_DATA_COLUMNS to the typed schema.
+
+    Conversion is vectorized per column: timestamps become UTC datetimes and
+    readings floats, with anything unparseable becoming a real NULL. Columns
+    the parser already typed as numbers are left as they are. Rows without a
+    usable timestamp are dropped (see drop_rejected()).
+    """
+    chunk["Timestamp"] = pd.to_datetime(chunk["Timestamp"], errors="coerce", utc=True)
+    for column in FLOAT_COLUMNS:
+        chunk[column] = pd.to_numeric(chunk[column], errors="coerce").astype("float64", copy=False)
+    return drop_rejected(chunk)
+
+
+def _pandas_chunks(csv_file, width, positions, chunk_rows):
+    reader = pd.read_csv(
+        csv_file,
+        delimiter=",",
+        # Preamble, header and units row
+        skiprows=PREAMBLE_ROWS + 2,
+        header=None,
+        names=range(width),
+        usecols=positions,
+        # Numeric columns are inferred; the timestamps are parsed below
+        dtype={positions[0]: str, positions[1]: str},
+        encoding="utf-8",
+        chunksize=chunk_rows,
+    )
+    with reader:
+        while True:
+            with phase("parse"):
+                chunk = next(reader, None)
+            if chunk is None:
+                break
+            with phase("clean"):
+                chunk.columns = TREE_DATA_COLUMNS
+                chunk = parse_chunk(chunk)
+            yield chunk
+
+
+def _arrow_floats(column):
+    try:
+        return pc.cast(column, pa.float64())
+    except pa.ArrowInvalid:
+        # Text among the numbers: NULL for just those values
+        return pa.array(pd.to_numeric(column.to_pandas(), errors="coerce"), pa.float64(), from_pandas=True)
+
+
+def _arrow_timestamps(column):
+    try:
+        # ISO 8601 without an offset, as loggers write them, read as UTC
+        return pc.cast(column, pa.timestamp("ns")).cast(pa.timestamp("ns", tz="UTC"))
+    except pa.ArrowInvalid:
+        parsed = pd.to_datetime(column.to_pandas(), errors="coerce", utc=True)
+        return pa.array(parsed, pa.timestamp("ns", tz="UTC"), from_pandas=True)
+
+
+def _arrow_frame(table, offset, rejected):
+    """Typed DataFrame from a table of the raw string columns."""
+    columns = table.columns
+    typed = pa.table(
+        [columns[0], _arrow_timestamps(columns[1])] + [_arrow_floats(column) for column in columns[2:]],
+        names=TREE_DATA_COLUMNS,
+    )
+    # One copy into pandas; the raw timestamps stay in their Arrow buffer
+    # rather than becoming one Python str per row
+    frame = typed.to_pandas(types_mapper={pa.string(): pd.StringDtype("pyarrow")}.get)
+    # Numbered through the file, as the pandas reader does
+    frame.index = pd.RangeIndex(offset, offset + len(frame))
+    frame = drop_rejected(frame)
+    frame.attrs["rejected"] += rejected
+    return frame
+
+
+def _arrow_chunks(csv_file, width, positions, chunk_rows):
+    names = [f"column_{i}" for i in range(width)]
+    short_rows = 0
+
+    def invalid_row(row):
+        # Truncated rows are rejected; extra fields mean a malformed file
+        nonlocal short_rows
+        if row.actual_columns < row.expected_columns:
+            short_rows += 1
+            return "skip"
+        return "error"
+
+    with phase("parse"):
+        try:
+            reader = pa_csv.open_csv(
+                csv_file,
+                read_options=pa_csv.ReadOptions(
+                    # Preamble, header and units row
+                    skip_rows=PREAMBLE_ROWS + 2,
+                    column_names=names,
+                    # One core per upload; batches already parse files in parallel
+                    use_threads=False,
+                ),
+                parse_options=pa_csv.ParseOptions(invalid_row_handler=invalid_row),
+                convert_options=pa_csv.ConvertOptions(
+                    include_columns=[names[i] for i in positions],
+                    # Cast per chunk below, so stray text only affects its own values
+                    column_types=dict.fromkeys(names, pa.string()),
+                    strings_can_be_null=True,
+                ),
+            )
+        except pa.ArrowInvalid as e:
+            raise CSVFormatError(f"Error reading CSV file: {e}") from e
+    # Arrow reads blocks of bytes; regroup them into chunks of chunk_rows
+    pending = []
+    buffered = offset = 0
+    while True:
+        with phase("parse"):
+            try:
+                batch = reader.read_next_batch()
+            except StopIteration:
+                batch = None
+            except pa.ArrowInvalid as e:
+                raise CSVFormatError(f"Error reading CSV file: {e}") from e
+        if batch is not None:
+            pending.append(batch)
+            buffered += batch.num_rows
+        while buffered >= chunk_rows or (batch is None and (buffered or short_rows)):
+            with phase("clean"):
+                table = pa.Table.from_batches(pending, schema=reader.schema)
+                rest = table.slice(chunk_rows)
+                chunk = _arrow_frame(table.slice(0, chunk_rows), offset, short_rows)
+            pending = rest.to_batches()
+            buffered = rest.num_rows
+            offset += table.num_rows - rest.num_rows
+            short_rows = 0
+            yield chunk
+        if batch is None:
+            break
+
+
+def read_time_span(csv_file, chunk_rows=None):
+    """
+    Return (first, last) of the timestamps read_logger_chunks() would yield
+    for ``csv_file``, or None if it has none, reading only that column. Rows
+    it rejects are left for the full read to report. The file is left where
+    it was.
+    """
+    chunk_rows = chunk_rows or get_chunk_rows()
+    position = csv_file.tell()
+    with phase("parse"):
+        layout = read_layout(csv_file)
+        if layout is None:
+            return None
+        width, positions = layout
+        first = last = None
+        reader = pd.read_csv(
+            csv_file,
+            delimiter=",",
+            skiprows=PREAMBLE_ROWS + 2,
+            header=None,
+            names=range(width),
+            usecols=[positions[1]],
+            dtype=str,
+            encoding="utf-8",
+            on_bad_lines="skip",
+            chunksize=chunk_rows,
+        )
+        with reader:
+            for chunk in reader:
+                stamps = pd.to_datetime(chunk[positions[1]], errors="coerce", utc=True).dropna()
+                if stamps.empty:
+                    continue
+                first = stamps.min() if first is None else min(first, stamps.min())
+                last = stamps.max() if last is None else max(last, stamps.max())
+    csv_file.seek(position)
+    if first is None:
+        return None
+    return first.to_pydatetime(), last.to_pydatetime()
+
+
+def read_logger_chunks(csv_file, chunk_rows=None):
+    """
+    Yield cleaned DataFrames of at most ``chunk_rows`` readings, with their
+    quality flags (see quality.py) in a "quality" column.
+
+    Raises CSVFormatError (or a pandas parser error) while iterating if the
+    file is malformed, so callers should consume it inside their error
+    handling.
+    """
+    chunk_rows = chunk_rows or get_chunk_rows()
+    engine = get_csv_engine()
+    with phase("parse"):
+        layout = read_layout(csv_file)
+    if layout is None:
+        return
+    width, positions = layout
+    if engine == "pyarrow":
+        chunks = _arrow_chunks(csv_file, width, positions, chunk_rows)
+    else:
+        chunks = _pandas_chunks(csv_file, width, positions, chunk_rows)
+    checker = QualityChecker()
+    for chunk in chunks:
+        with phase("clean"):
+            chunk["quality"] = checker.check(chunk)
+        yield chunk
@@ -0,0 +1,159 @@
+"""
+Background loading of uploads.
+
+/upload-csv/ only stores the file and queues an UploadJob; `manage.py
+process_upload_jobs` claims queued jobs and loads each one (see loader.py),
+recording progress, throughput and errors on the job row as it goes.
+
+A worker that dies mid-load leaves its job running. requeue_stale() puts
+jobs whose heartbeat is older than TREE_DATA_UPLOAD_JOB_STALE_SECONDS back
+in the queue, and fails them after MAX_ATTEMPTS claims.
+"""
+import logging
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import F
+from django.utils import timezone
+
+from . import cache as tree_cache
+from .events import publish_upload
+from .loader import describe_error, load_csv
+from .models import UploadJob
+
+logger = logging.getLogger(__name__)
+
+# Minimum seconds between progress writes to the job row
+PROGRESS_INTERVAL = 2.0
+
+# Claims a job gets before a worker dying on it fails it for good
+MAX_ATTEMPTS = 3
+DEFAULT_STALE_SECONDS = 600
+
+
+def enqueue(uploaded_file, user=None, source="", tree="", filename=None):
+    """
+    Persist an uploaded file and queue it for loading; ``filename`` is the
+    name to report it by (default: the file's own name).
+    """
+    job = UploadJob(
+        filename=filename or uploaded_file.name,
+        source=source,
+        tree=tree,
+        user=user if user is not None and user.is_authenticated else None,
+    )
+    job.file.save(uploaded_file.name, uploaded_file, save=False)
+    job.save()
+    return job
+
+
+def claim_next():
+    """
+    Mark the oldest queued job as running and return its id, or None if the
+    queue is empty. The conditional UPDATE makes this safe with several
+    workers polling the same table.
+    """
+    while True:
+        job_id = (
+            UploadJob.objects.filter(status="queued")
+            .order_by("created_at", "id")
+            .values_list("id", flat=True)
+            .first()
+        )
+        if job_id is None:
+            return None
+        now = timezone.now()
+        claimed = UploadJob.objects.filter(id=job_id, status="queued").update(
+            status="running", started_at=now, heartbeat_at=now, attempts=F("attempts") + 1
+        )
+        if claimed:
+            return job_id
+
+
+def requeue_stale(exclude=()):
+    """
+    Queue again the running jobs whose worker has not been heard from for
+    TREE_DATA_UPLOAD_JOB_STALE_SECONDS, or fail those already claimed
+    MAX_ATTEMPTS times. ``exclude`` lists jobs this process is running.
+    Returns (requeued, failed).
+    """
+    stale_seconds = getattr(settings, "TREE_DATA_UPLOAD_JOB_STALE_SECONDS", DEFAULT_STALE_SECONDS)
+    stale = UploadJob.objects.filter(
+        status="running", heartbeat_at__lt=timezone.now() - timedelta(seconds=stale_seconds)
+    ).exclude(id__in=list(exclude))
+    # Each update repeats the status filter, so a job that finishes in the
+    # meantime is left alone
+    failed = stale.filter(attempts__gte=MAX_ATTEMPTS).update(
+        status="failed",
+        finished_at=timezone.now(),
+        error=f"The worker loading this file stopped {MAX_ATTEMPTS} times",
+    )
+    requeued = stale.filter(attempts__lt=MAX_ATTEMPTS).update(
+        status="queued", started_at=None, heartbeat_at=None
+    )
+    if requeued or failed:
+        logger.warning("Requeued %s and failed %s stale upload jobs", requeued, failed)
+    return requeued, failed
+
+
+def _progress_reporter(job_id):
+    # SQLite allows a single writer and the load transaction holds it, so
+    # there only the final totals are recorded (and the heartbeat is the
+    # claim time: keep TREE_DATA_UPLOAD_JOB_STALE_SECONDS above the longest load)
+    if connection.vendor == "sqlite":
+        return None
+    last_write = 0.0
+
+    def report(rows, rows_new, rows_rejected, chunks):
+        nonlocal last_write
+        now = time.monotonic()
+        if now - last_write < PROGRESS_INTERVAL:
+            return
+        last_write = now
+        UploadJob.objects.filter(id=job_id).update(
+            heartbeat_at=timezone.now(),
+            rows_parsed=rows + rows_rejected,
+            rows_loaded=rows_new,
+            rows_rejected=rows_rejected,
+            rows_skipped=rows - rows_new,
+            chunks=chunks,
+        )
+
+    return report
+
+
+def run_job(job_id):
+    """Load one claimed job and record the outcome; returns the final status."""
+    job = UploadJob.objects.get(id=job_id)
+    try:
+        with job.file.open("rb") as csv_file:
+            summary = load_csv(csv_file, progress=_progress_reporter(job_id), source=job.source, tree=job.tree)
+    except Exception as e:
+        logger.exception("Upload job %s failed", job_id)
+        UploadJob.objects.filter(id=job_id).update(
+            status="failed", finished_at=timezone.now(), error=describe_error(e)
+        )
+        return "failed"
+
+    # The rows are in tree_data now; failed uploads keep their file for a look
+    job.file.delete(save=False)
+    UploadJob.objects.filter(id=job_id).update(
+        status="succeeded",
+        file="",
+        finished_at=timezone.now(),
+        rows_parsed=summary["rows"] + summary["rows_rejected"],
+        rows_loaded=summary["rows_new"],
+        rows_rejected=summary["rows_rejected"],
+        rows_skipped=summary["rows_skipped"],
+        chunks=summary["chunks"],
+        seconds=summary["seconds"],
+        rows_per_second=summary["rows_per_second"],
+    )
+    # New data is committed: cached /treeData/ responses are now stale,
+    # and open event streams hear about it
+    if summary["rows_new"]:
+        tree_cache.bump_generation()
+    publish_upload(summary, summary["source"], job.tree)
+    return "succeeded"
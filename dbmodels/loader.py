@@ -0,0 +1,203 @@
+"""
+Load one logger CSV into tree_data.
+
+Shared by every upload path: the file is parsed chunk by chunk (ingest.py),
+each chunk is bulk-loaded (bulkload.py) before the next one is read, and the
+rollups covering the file's time span and the channel statistics (stats.py)
+are refreshed, all in one transaction. On partitioned PostgreSQL the months
+the file spans are created beforehand, in a short transaction of their own
+(see partitions.py).
+
+Loads are idempotent. Each file's SHA-256 is recorded in uploaded_files, so
+an exact re-upload is answered from that record without parsing anything,
+and readings already stored for the same source and timestamp are skipped.
+A file uploaded without a source gets one of its own (file_source()), so
+unnamed loggers never share a key.
+"""
+import hashlib
+import time
+from datetime import datetime, timezone
+
+import pandas as pd
+from sqlalchemy import text
+
+from . import engine as tree_engine
+from .bulkload import get_writer
+from .ingest import CSVFormatError, read_logger_chunks, read_time_span
+from .partitions import create_partitions, partitioned
+from .queries import db_timestamp
+from .rollups import refresh_rollups
+from .stats import RunningStats, record_upload_stats
+from .timing import phase
+
+# Errors pandas raises while walking a malformed upload
+READ_ERRORS = (pd.errors.ParserError, pd.errors.EmptyDataError, UnicodeDecodeError)
+
+
+def fingerprint(csv_file):
+    """Return (sha256 hex digest, size in bytes) of a file, leaving it rewound."""
+    digest = hashlib.sha256()
+    size = 0
+    csv_file.seek(0)
+    while True:
+        block = csv_file.read(1 << 20)
+        if not block:
+            break
+        if isinstance(block, str):
+            block = block.encode("utf-8")
+        digest.update(block)
+        size += len(block)
+    csv_file.seek(0)
+    return digest.hexdigest(), size
+
+
+def file_source(sha256):
+    """The source of a file uploaded without one: its own, from its hash."""
+    return f"file-{sha256[:16]}"
+
+
+def previous_upload(conn, sha256):
+    """Summary for a file whose content was already loaded, or None."""
+    row = conn.execute(
+        text('SELECT "rows", source FROM uploaded_files WHERE sha256 = :sha256'),
+        {"sha256": sha256},
+    ).first()
+    if row is None:
+        return None
+    return {
+        "duplicate": True,
+        "sha256": sha256,
+        "source": row[1],
+        "rows": row[0],
+        "rows_new": 0,
+        "rows_skipped": row[0],
+        "rows_rejected": 0,
+        "chunks": 0,
+        "writer": None,
+        "first_timestamp": None,
+        "last_timestamp": None,
+        "seconds": 0.0,
+        "rows_per_second": 0,
+    }
+
+
+def find_previous_upload(csv_file):
+    """Look ``csv_file`` up by content hash; see previous_upload()."""
+    sha256, _ = fingerprint(csv_file)
+    with tree_engine.connect() as conn:
+        return previous_upload(conn, sha256)
+
+
+def load_csv(csv_file, chunk_rows=None, progress=None, source="", tree="", filename=None):
+    """
+    Load ``csv_file`` as readings from logger ``source`` (default: see
+    file_source()) on ``tree`` and return a summary of what was written: the
+    ``source`` used, ``rows`` read, of which ``rows_new`` were stored and
+    ``rows_skipped`` were already there. An exact re-upload returns its
+    earlier record's summary with ``duplicate`` set.
+
+    ``progress``, if given, is called after every chunk with the running
+    ``rows``, ``rows_new``, ``rows_rejected`` and ``chunks`` totals.
+    ``filename`` is recorded in uploaded_files (default: the file's name).
+
+    Raises CSVFormatError or one of READ_ERRORS for a malformed file; in
+    that case (or on any database error) nothing is committed.
+    """
+    sha256, size = fingerprint(csv_file)
+    if partitioned():
+        span = read_time_span(csv_file, chunk_rows)
+        if span is not None:
+            create_partitions(*span)
+    with tree_engine.begin() as conn:
+        duplicate = previous_upload(conn, sha256)
+        if duplicate is not None:
+            return duplicate
+        return load_chunks(
+            conn,
+            read_logger_chunks(csv_file, chunk_rows),
+            sha256=sha256,
+            size=size,
+            filename=filename or getattr(csv_file, "name", "") or "",
+            source=source,
+            tree=tree,
+            progress=progress,
+        )
+
+
+def load_chunks(conn, chunks, sha256, size, filename, source="", progress=None, tree=""):
+    """
+    Write cleaned chunks (see ingest.py) of one file on ``conn``, which must
+    be inside a transaction, and record the file in uploaded_files. The
+    partitions the chunks fall in must already exist (see create_partitions()).
+
+    ``chunks`` may be a lazy reader, so parse errors can surface from here.
+    Returns the summary described in load_csv().
+    """
+    source = source or file_source(sha256)
+    rows = new = rejected = count = 0
+    first = last = None
+    started = time.perf_counter()
+    # Recorded first, so a concurrent upload of the same file waits on
+    # the unique sha256 instead of loading it twice
+    conn.execute(
+        text(
+            'INSERT INTO uploaded_files (sha256, filename, source, size, "rows", rows_new, uploaded_at) '
+            "VALUES (:sha256, :filename, :source, :size, 0, 0, :uploaded_at)"
+        ),
+        {
+            "sha256": sha256,
+            "filename": filename,
+            "source": source,
+            "size": size,
+            "uploaded_at": db_timestamp(conn.dialect.name, datetime.now(timezone.utc)),
+        },
+    )
+    writer = get_writer(conn, source=source, tree=tree)
+    stats = RunningStats()
+    for chunk in chunks:
+        # Timed as a whole: COPY bypasses the engine's statement hooks
+        with phase("db"):
+            new += writer.write(chunk)
+        stats.update(chunk)
+        rows += len(chunk)
+        rejected += chunk.attrs["rejected"]
+        count += 1
+        if progress is not None:
+            progress(rows=rows, rows_new=new, rows_rejected=rejected, chunks=count)
+        if not chunk.empty:
+            low, high = chunk["Timestamp"].min(), chunk["Timestamp"].max()
+            first = low if first is None else min(first, low)
+            last = high if last is None else max(last, high)
+    if first is not None and new:
+        refresh_rollups(conn, first.to_pydatetime(), last.to_pydatetime())
+    if rows:
+        record_upload_stats(conn, sha256, stats, overlapped=new < rows)
+    conn.execute(
+        text('UPDATE uploaded_files SET "rows" = :rows, rows_new = :rows_new WHERE sha256 = :sha256'),
+        {"rows": rows, "rows_new": new, "sha256": sha256},
+    )
+    elapsed = time.perf_counter() - started
+    return {
+        "duplicate": False,
+        "sha256": sha256,
+        "source": source,
+        "rows": rows,
+        "rows_new": new,
+        "rows_skipped": rows - new,
+        "rows_rejected": rejected,
+        "chunks": count,
+        "writer": writer.name,
+        "first_timestamp": first.to_pydatetime() if first is not None else None,
+        "last_timestamp": last.to_pydatetime() if last is not None else None,
+        "seconds": round(elapsed, 3),
+        "rows_per_second": round(rows / elapsed) if elapsed > 0 else rows,
+    }
+
+
+def describe_error(error):
+    """The message /upload-csv/ answers with for an error raised by a load."""
+    if isinstance(error, CSVFormatError):
+        return str(error)
+    if isinstance(error, READ_ERRORS):
+        return f"Error reading CSV file: {error}"
+    return f"Database write failed: {error}"
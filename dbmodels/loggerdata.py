@@ -0,0 +1,56 @@
+"""
+Synthetic logger exports for benchmarks.
+
+Files have the real layout (29-line preamble, header, units row, 12 columns)
+and plausible readings: a diurnal temperature/humidity cycle, a growing
+dendrometer trace and daytime sap flow. ``gap_rate`` drops readings (the
+logger skipped an interval) and ``missing_rate`` blanks single values. A
+given seed always produces the same bytes.
+"""
+import math
+import random
+from datetime import datetime, timedelta
+
+from .ingest import PREAMBLE_ROWS, TREE_DATA_COLUMNS
+
+UNITS = ["#", "s", "", "C", "hPa", "%", "um", "cm/h", "", "", "", "um"]
+
+
+def generate_logger_csv(rows, start=datetime(2024, 5, 1), interval_minutes=10,
+                        gap_rate=0.0, missing_rate=0.0, seed=0):
+    """Return a logger CSV with ``rows`` readings as bytes."""
+    rng = random.Random(seed)
+    lines = [f"# logger metadata line {i}" for i in range(PREAMBLE_ROWS)]
+    lines.append(",".join(["Record"] + TREE_DATA_COLUMNS))
+    lines.append(",".join(UNITS))
+    step = timedelta(minutes=interval_minutes)
+    ts = start
+    dendro = 1200.0
+    for record in range(rows):
+        while gap_rate and rng.random() < gap_rate:
+            ts += step
+        day = 2 * math.pi * (ts.hour * 60 + ts.minute) / 1440
+        sun = max(0.0, -math.cos(day))
+        dendro += rng.gauss(0.02, 0.05) - 0.3 * sun * (interval_minutes / 60)
+        sapflow = 12 * sun + rng.gauss(0, 0.3)
+        values = [
+            record,
+            int(ts.timestamp()),
+            ts.strftime("%Y-%m-%d %H:%M:%S"),
+            round(15 - 6 * math.cos(day) + rng.gauss(0, 0.4), 2),
+            round(1013 + rng.gauss(0, 1.5), 1),
+            round(min(100.0, 70 + 20 * math.cos(day) + rng.gauss(0, 2)), 1),
+            round(dendro, 2),
+            round(sapflow, 3),
+            round(1.5 + rng.random(), 3),
+            rng.randint(60, 95),
+            rng.randint(5, 20),
+            round(dendro, 2),
+        ]
+        if missing_rate:
+            for i in range(3, len(values)):
+                if rng.random() < missing_rate:
+                    values[i] = ""
+        lines.append(",".join(str(v) for v in values))
+        ts += step
+    return ("\n".join(lines) + "\n").encode("utf-8")
@@ -0,0 +1,75 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import setup_test_environment, teardown_test_environment
+
+from dbmodels import engine as tree_engine
+from dbmodels.benchmark import compare, run_benchmarks
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark CSV ingest and tree data reads against a throwaway test "
+        "database (SQLite, or PostgreSQL when DATABASE_URL points at one) and "
+        "write the results as a JSON baseline."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rows", type=int, default=50000, help="Readings per generated file.")
+        parser.add_argument("--files", type=int, default=2, help="Files to upload.")
+        parser.add_argument("--requests", type=int, default=50, help="Requests per read scenario.")
+        parser.add_argument("--gap-rate", type=float, default=0.01,
+                            help="Chance that the logger skips an interval.")
+        parser.add_argument("--missing-rate", type=float, default=0.005,
+                            help="Chance that a single value is blank.")
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument("--output", default="benchmark.json",
+                            help="Where to write the results.")
+        parser.add_argument("--compare", metavar="BASELINE",
+                            help="Earlier results to compare against; fails on regressions.")
+        parser.add_argument("--tolerance", type=float, default=0.2,
+                            help="Allowed p50 slowdown against --compare, as a fraction.")
+
+    def handle(self, *args, **options):
+        baseline = None
+        if options["compare"]:
+            try:
+                with open(options["compare"]) as f:
+                    baseline = json.load(f)
+            except (OSError, ValueError) as e:
+                raise CommandError(f"Cannot read baseline {options['compare']}: {e}")
+
+        # Same isolation as the test runner: a fresh test_<name> database
+        setup_test_environment()
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        try:
+            results = run_benchmarks(
+                rows=options["rows"],
+                files=options["files"],
+                requests=options["requests"],
+                gap_rate=options["gap_rate"],
+                missing_rate=options["missing_rate"],
+                seed=options["seed"],
+            )
+        finally:
+            tree_engine.reset_engine()
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+
+        with open(options["output"], "w") as f:
+            json.dump(results, f, indent=2)
+            f.write("\n")
+        for name, result in results["results"].items():
+            self.stdout.write(
+                f"{name}: p50 {result['p50_ms']} ms, p99 {result['p99_ms']} ms, "
+                f"{result['rows_per_second']} rows/s, peak RSS {result['peak_rss_mb']} MB"
+            )
+        self.stdout.write(self.style.SUCCESS(f"Wrote {options['output']}."))
+
+        if baseline is not None:
+            lines, regressions = compare(results, baseline, options["tolerance"])
+            for line in lines:
+                self.stdout.write(line)
+            if regressions:
+                raise CommandError(f"p50 regressed beyond {options['tolerance']:.0%}: {', '.join(regressions)}")
@@ -0,0 +1,142 @@
+from django.core.management.base import BaseCommand, CommandError
+from sqlalchemy import inspect, text
+import numpy as np
+import pandas as pd
+
+from dbmodels import cache as tree_cache
+from dbmodels import engine as tree_engine
+from dbmodels.bulkload import get_writer, quote
+from dbmodels.ingest import (
+    FLOAT_COLUMNS,
+    LEGACY_MISSING_VALUE,
+    TREE_DATA_COLUMNS,
+    get_chunk_rows,
+    parse_chunk,
+)
+from dbmodels.partitions import create_partitions, partitioned
+from dbmodels.quality import QualityChecker
+from dbmodels.rollups import rebuild_rollups
+from dbmodels.stats import rebuild_stats
+
+LEGACY_TABLE = "tree_data_legacy"
+
+
+class LegacySources:
+    """
+    Names the logger of each legacy reading. The old table did not record
+    loggers, so the different readings taken at one timestamp become
+    loggers "legacy-1", "legacy-2", ... in the order they are read. Identical
+    rows (a file uploaded twice) get the same name and are stored once.
+    Rows must come in time order; state carries over between chunks.
+    """
+
+    def __init__(self):
+        self.timestamp = None
+        self.seen = {}
+
+    def label(self, chunk):
+        values = chunk[FLOAT_COLUMNS].astype(object).where(chunk[FLOAT_COLUMNS].notna(), None)
+        sources = []
+        for timestamp, reading in zip(chunk["Timestamp"], values.itertuples(index=False, name=None)):
+            if timestamp != self.timestamp:
+                self.timestamp, self.seen = timestamp, {}
+            ordinal = self.seen.setdefault(reading, len(self.seen) + 1)
+            sources.append(f"legacy-{ordinal}")
+        return chunk.assign(source=sources)
+
+
+class Command(BaseCommand):
+    help = (
+        "One-shot copy of the old all-TEXT tree_data rows (set aside as "
+        f"{LEGACY_TABLE} by migration 0002) into the typed tree_data table."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--chunk-rows", type=int, default=None,
+            help="Rows converted per batch (defaults to TREE_DATA_UPLOAD_CHUNK_ROWS).",
+        )
+        parser.add_argument(
+            "--drop-legacy", action="store_true",
+            help=f"Drop {LEGACY_TABLE} once its rows have been copied.",
+        )
+
+    def handle(self, *args, **options):
+        chunk_rows = options["chunk_rows"] or get_chunk_rows()
+
+        with tree_engine.connect() as conn:
+            inspector = inspect(conn)
+            if not inspector.has_table(LEGACY_TABLE):
+                raise CommandError(f"No {LEGACY_TABLE} table to migrate.")
+            available = {c["name"] for c in inspector.get_columns(LEGACY_TABLE)}
+            missing = [c for c in TREE_DATA_COLUMNS if c not in available]
+            if missing:
+                raise CommandError(f"{LEGACY_TABLE} is missing columns: {', '.join(missing)}")
+
+        # PostgreSQL has no catch-all partition: create every month first, in
+        # a transaction of its own (see partitions.py)
+        if partitioned():
+            span = self.time_span(chunk_rows)
+            if span is not None:
+                create_partitions(*span)
+
+        with tree_engine.begin() as conn:
+            column_list = ", ".join(quote(c) for c in TREE_DATA_COLUMNS)
+            # The quality checks compare each reading with the one before it,
+            # so rows go in time order (the logger's text timestamps sort so)
+            result = conn.execution_options(stream_results=True).execute(
+                text(f'SELECT {column_list} FROM {quote(LEGACY_TABLE)} ORDER BY "Timestamp"')
+            )
+            writer = get_writer(conn, source=None)
+            sources = LegacySources()
+            checker = QualityChecker()
+            copied = duplicates = rejected = 0
+            while True:
+                rows = result.fetchmany(chunk_rows)
+                if not rows:
+                    break
+                chunk = pd.DataFrame(rows, columns=TREE_DATA_COLUMNS, dtype=object)
+                chunk = chunk.replace(LEGACY_MISSING_VALUE, np.nan)
+                chunk = parse_chunk(chunk)
+                chunk["quality"] = checker.check(chunk)
+                written = writer.write(sources.label(chunk))
+                copied += written
+                duplicates += len(chunk) - written
+                rejected += chunk.attrs["rejected"]
+                self.stdout.write(f"Copied {copied} rows...")
+            result.close()
+            rebuild_rollups(conn)
+            rebuild_stats(conn)
+
+            if options["drop_legacy"]:
+                conn.exec_driver_sql(f"DROP TABLE {quote(LEGACY_TABLE)}")
+
+        tree_cache.bump_generation()
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Migrated {copied} rows into tree_data ({duplicates} identical duplicates and "
+            f"{rejected} without a usable timestamp skipped)."
+        ))
+
+    def time_span(self, chunk_rows):
+        """(first, last) usable timestamp in the legacy table, or None."""
+        first = last = None
+        with tree_engine.connect() as conn:
+            result = conn.execution_options(stream_results=True).execute(
+                text(f'SELECT "Timestamp" FROM {quote(LEGACY_TABLE)}')
+            )
+            while True:
+                rows = result.fetchmany(chunk_rows)
+                if not rows:
+                    break
+                stamps = pd.to_datetime(
+                    pd.Series([row[0] for row in rows], dtype=object), errors="coerce", utc=True
+                ).dropna()
+                if stamps.empty:
+                    continue
+                first = stamps.min() if first is None else min(first, stamps.min())
+                last = stamps.max() if last is None else max(last, stamps.max())
+            result.close()
+        if first is None:
+            return None
+        return first.to_pydatetime(), last.to_pydatetime()
@@ -0,0 +1,110 @@
+import logging
+import multiprocessing
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connections
+from django.utils import timezone
+
+from dbmodels import events
+from dbmodels.jobs import claim_next, requeue_stale, run_job
+from dbmodels.models import UploadJob
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = (
+        "Load queued CSV uploads (UploadJob rows) into tree_data, several at "
+        "a time in a pool of worker processes. Jobs left running by a worker "
+        "that died are queued again."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--workers", type=int, default=None,
+            help="Worker processes (defaults to TREE_DATA_UPLOAD_WORKERS); "
+                 "0 loads jobs in this process.",
+        )
+        parser.add_argument(
+            "--poll-interval", type=float, default=2.0,
+            help="Seconds to wait before looking at an empty queue again.",
+        )
+        parser.add_argument(
+            "--once", action="store_true",
+            help="Exit once the queue is empty instead of waiting for more jobs.",
+        )
+
+    def handle(self, *args, **options):
+        workers = options["workers"]
+        if workers is None:
+            workers = getattr(settings, "TREE_DATA_UPLOAD_WORKERS", None) or os.cpu_count() or 1
+        self.poll_interval = options["poll_interval"]
+        self.once = options["once"]
+
+        if events.get_backend() == "local":
+            # Cached responses still go stale through the generation row
+            logger.warning(
+                "Upload events are in-process on this database: event streams "
+                "served by the web workers will not hear about these jobs"
+            )
+
+        # Whatever a previous run was loading when it stopped
+        requeue_stale()
+        if workers == 0:
+            self.run_inline()
+        else:
+            self.run_pool(workers)
+
+    def run_inline(self):
+        while True:
+            job_id = claim_next()
+            if job_id is None:
+                if self.once:
+                    return
+                time.sleep(self.poll_interval)
+                requeue_stale()
+                continue
+            self.report(job_id, run_job(job_id))
+
+    def run_pool(self, workers):
+        # Forked workers reuse this process's loaded Django; the tree data
+        # engine is rebuilt after a fork (see engine.py)
+        context = multiprocessing.get_context("fork")
+        running = {}
+        with ProcessPoolExecutor(max_workers=workers, mp_context=context) as executor:
+            while True:
+                while len(running) < workers:
+                    job_id = claim_next()
+                    if job_id is None:
+                        break
+                    # Never let a worker inherit an open database connection
+                    connections.close_all()
+                    running[executor.submit(run_job, job_id)] = job_id
+
+                if not running:
+                    if self.once:
+                        return
+                    time.sleep(self.poll_interval)
+                    requeue_stale()
+                    continue
+
+                done, _ = wait(running, timeout=self.poll_interval, return_when=FIRST_COMPLETED)
+                for future in done:
+                    job_id = running.pop(future)
+                    try:
+                        result = future.result()
+                    except Exception as e:
+                        # The worker process itself died; run_job never got to record it
+                        UploadJob.objects.filter(id=job_id).update(
+                            status="failed", finished_at=timezone.now(), error=f"Worker failed: {e}"
+                        )
+                        result = "failed"
+                    self.report(job_id, result)
+
+    def report(self, job_id, result):
+        style = self.style.SUCCESS if result == "succeeded" else self.style.ERROR
+        self.stdout.write(style(f"Upload job {job_id}: {result}"))
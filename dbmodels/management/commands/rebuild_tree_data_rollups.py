@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+from sqlalchemy import text
+
+from dbmodels import engine as tree_engine
+from dbmodels.rollups import ROLLUP_TABLES, rebuild_rollups
+from dbmodels.stats import rebuild_stats
+
+
+class Command(BaseCommand):
+    help = (
+        "Recompute the hourly and daily tree_data rollups, and the overall "
+        "channel statistics, from the raw readings."
+    )
+
+    def handle(self, *args, **options):
+        with tree_engine.begin() as conn:
+            rebuild_rollups(conn)
+            rebuild_stats(conn)
+            counts = {
+                table: conn.execute(text(f"SELECT COUNT(*) FROM {table}")).scalar()
+                for table, _ in ROLLUP_TABLES
+            }
+        summary = ", ".join(f"{table}: {count} rows" for table, count in counts.items())
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt rollups ({summary})."))
@@ -0,0 +1,185 @@
+"""
+Request latency histograms in the Prometheus text format.
+
+Each process keeps its own histograms per (view, phase). A background
+thread writes them to a file of the process's own in TREE_DATA_METRICS_DIR
+every METRICS_WRITE_INTERVAL seconds while there is something new, and
+again at exit, so requests never wait on the disk. /metrics/ adds up every
+process's file, so whichever gunicorn worker answers the scrape reports the
+whole server. Other workers' numbers can be that interval behind.
+
+Files are named by process instance, not just PID, so a reused PID never
+overwrites an earlier worker's numbers. Each file names its server (the
+gunicorn master, i.e. the parent process); files left by a server that is
+no longer running are removed instead of being added up.
+"""
+import atexit
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+import uuid
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+METRIC = "urbantree_request_phase_seconds"
+METRICS_WRITE_INTERVAL = 1.0
+
+_lock = threading.Lock()
+# (view, phase) -> [count per bucket..., count over the last bucket, sum]
+_histograms = {}
+_dirty = False
+_flusher = None
+_instance = None
+
+
+def get_metrics_dir():
+    return getattr(settings, "TREE_DATA_METRICS_DIR", None) or os.path.join(
+        tempfile.gettempdir(), "urbantree-metrics"
+    )
+
+
+def _instance_id():
+    global _instance
+    if _instance is None:
+        _instance = f"{os.getpid()}-{uuid.uuid4().hex[:12]}"
+    return _instance
+
+
+def _alive(pid):
+    if not isinstance(pid, int) or pid <= 0:
+        return False
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def observe(view, phase, seconds):
+    global _dirty
+    _start_flusher()
+    with _lock:
+        _dirty = True
+        values = _histograms.get((view, phase))
+        if values is None:
+            values = _histograms[(view, phase)] = [0] * (len(BUCKETS) + 1) + [0.0]
+        for i, bound in enumerate(BUCKETS):
+            if seconds <= bound:
+                break
+        else:
+            i = len(BUCKETS)
+        values[i] += 1
+        values[-1] += seconds
+
+
+def _snapshot():
+    global _dirty
+    with _lock:
+        _dirty = False
+        return [[view, phase, list(values)] for (view, phase), values in _histograms.items()]
+
+
+def write():
+    """Write this process's histograms to its file."""
+    directory = get_metrics_dir()
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f"{_instance_id()}.json")
+    entry = {"pid": os.getpid(), "server": os.getppid(), "histograms": _snapshot()}
+    # Written aside and renamed, so readers never see half a file
+    with open(path + ".tmp", "w") as f:
+        json.dump(entry, f)
+    os.replace(path + ".tmp", path)
+
+
+def _flush_forever():
+    while True:
+        time.sleep(METRICS_WRITE_INTERVAL)
+        if _dirty:
+            try:
+                write()
+            except OSError as e:
+                logger.error(f"Could not write request metrics: {e}")
+
+
+def _start_flusher():
+    global _flusher
+    if _flusher is not None:
+        return
+    with _lock:
+        if _flusher is None:
+            _flusher = threading.Thread(target=_flush_forever, name="metrics-flusher", daemon=True)
+            _flusher.start()
+
+
+def collect():
+    """Histograms summed over every process of a running server that has written a file."""
+    write()
+    merged = {}
+    directory = get_metrics_dir()
+    for name in os.listdir(directory):
+        if not name.endswith(".json"):
+            continue
+        path = os.path.join(directory, name)
+        try:
+            with open(path) as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            continue
+        if not isinstance(entry, dict) or not _alive(entry.get("server")):
+            # Left by an earlier run of the server (or an older format)
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            continue
+        for view, phase, values in entry["histograms"]:
+            total = merged.setdefault((view, phase), [0] * len(values))
+            for i, value in enumerate(values):
+                total[i] += value
+    return merged
+
+
+def render():
+    lines = [
+        f"# HELP {METRIC} Time spent per request in each phase, by view.",
+        f"# TYPE {METRIC} histogram",
+    ]
+    for (view, phase), values in sorted(collect().items()):
+        labels = f'view="{view}",phase="{phase}"'
+        cumulative = 0
+        for bound, count in zip(BUCKETS, values):
+            cumulative += count
+            lines.append(f'{METRIC}_bucket{{{labels},le="{bound}"}} {cumulative}')
+        count = cumulative + values[len(BUCKETS)]
+        lines.append(f'{METRIC}_bucket{{{labels},le="+Inf"}} {count}')
+        lines.append(f"{METRIC}_sum{{{labels}}} {values[-1]}")
+        lines.append(f"{METRIC}_count{{{labels}}} {count}")
+    return "\n".join(lines) + "\n"
+
+
+def reset():
+    global _dirty
+    with _lock:
+        _histograms.clear()
+        _dirty = False
+
+
+def _after_fork():
+    # A forked worker starts from zero under a file of its own; its parent's
+    # numbers are in the parent's file, and the flusher thread stayed there
+    global _flusher, _instance, _lock
+    _lock = threading.Lock()
+    _flusher = _instance = None
+    reset()
+
+
+os.register_at_fork(after_in_child=_after_fork)
+atexit.register(lambda: write() if _histograms else None)
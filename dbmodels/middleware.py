@@ -0,0 +1,103 @@
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connection
+
+from . import metrics, timing
+
+
+class ServerTimingMiddleware:
+    """
+    Times every request by phase (see timing.py), reports the phases in a
+    Server-Timing header and feeds the /metrics/ histograms.
+
+    Streamed bodies are produced after the headers go out, so for them the
+    header covers the time to the first byte and the histograms the whole
+    response.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        timings = timing.Timings()
+        token = timing.activate(timings)
+        try:
+            with connection.execute_wrapper(timing.db_wrapper):
+                response = self.get_response(request)
+        finally:
+            timing.deactivate(token)
+        return self.finish(request, response, timings)
+
+    async def __acall__(self, request):
+        timings = timing.Timings()
+        token = timing.activate(timings)
+        try:
+            response = await self.get_response(request)
+        finally:
+            timing.deactivate(token)
+        return self.finish(request, response, timings)
+
+    def finish(self, request, response, timings):
+        view = _view_name(request)
+        if getattr(settings, "SERVER_TIMING", True):
+            response["Server-Timing"] = timings.header()
+        if not response.streaming:
+            _record(view, timings)
+        elif response.is_async:
+            response.streaming_content = _atimed(response.streaming_content, view, timings)
+        else:
+            response.streaming_content = _timed(response.streaming_content, view, timings)
+        return response
+
+
+def _view_name(request):
+    match = getattr(request, "resolver_match", None)
+    if match is None:
+        return "unmatched"
+    view_class = getattr(match.func, "view_class", None)
+    return (view_class or match.func).__name__
+
+
+def _record(view, timings):
+    metrics.observe(view, "total", timings.elapsed())
+    for name, seconds in timings.durations.items():
+        metrics.observe(view, name, seconds)
+
+
+def _timed(content, view, timings):
+    # The body is produced outside the request's context; lend it ours
+    iterator = iter(content)
+    try:
+        while True:
+            token = timing.activate(timings)
+            try:
+                chunk = next(iterator, None)
+            finally:
+                timing.deactivate(token)
+            if chunk is None:
+                break
+            yield chunk
+    finally:
+        _record(view, timings)
+
+
+async def _atimed(content, view, timings):
+    iterator = content.__aiter__()
+    try:
+        while True:
+            token = timing.activate(timings)
+            try:
+                chunk = await iterator.__anext__()
+            except StopAsyncIteration:
+                break
+            finally:
+                timing.deactivate(token)
+            yield chunk
+    finally:
+        _record(view, timings)
@@ -0,0 +1,55 @@
+# Generated by Django 4.2.17 on 2026-10-17 18:35
+
+from django.db import migrations, models
+
+
+def set_aside_legacy_table(apps, schema_editor):
+    # Uploads used to create tree_data implicitly through pandas, with TEXT
+    # columns and no primary key. Keep those rows for migrate_tree_data_text.
+    connection = schema_editor.connection
+    with connection.cursor() as cursor:
+        if 'tree_data' not in connection.introspection.table_names(cursor):
+            return
+        columns = [c.name for c in connection.introspection.get_table_description(cursor, 'tree_data')]
+    if 'id' not in columns:
+        schema_editor.execute('ALTER TABLE tree_data RENAME TO tree_data_legacy')
+
+
+def restore_legacy_table(apps, schema_editor):
+    connection = schema_editor.connection
+    with connection.cursor() as cursor:
+        tables = connection.introspection.table_names(cursor)
+    if 'tree_data_legacy' in tables and 'tree_data' not in tables:
+        schema_editor.execute('ALTER TABLE tree_data_legacy RENAME TO tree_data')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dbmodels', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.RunPython(set_aside_legacy_table, restore_legacy_table),
+        migrations.CreateModel(
+            name='TreeReading',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('timestamp_raw', models.CharField(blank=True, db_column='Timestamp_Raw', max_length=32, null=True)),
+                ('timestamp', models.DateTimeField(db_column='Timestamp')),
+                ('temperature', models.FloatField(blank=True, db_column='Temperature', null=True)),
+                ('pressure', models.FloatField(blank=True, db_column='Pressure', null=True)),
+                ('humidity', models.FloatField(blank=True, db_column='Humidity', null=True)),
+                ('dendro', models.FloatField(blank=True, db_column='Dendro', null=True)),
+                ('sapflow', models.FloatField(blank=True, db_column='Sapflow', null=True)),
+                ('sf_max_d', models.FloatField(blank=True, db_column='SF_maxD', null=True)),
+                ('sf_signal', models.FloatField(blank=True, db_column='SF_Signal', null=True)),
+                ('sf_noise', models.FloatField(blank=True, db_column='SF_Noise', null=True)),
+                ('dendro_dup', models.FloatField(blank=True, db_column='Dendro_Dup', null=True)),
+            ],
+            options={
+                'db_table': 'tree_data',
+                'indexes': [models.Index(fields=['timestamp', 'id'], name='tree_data_timestamp_idx')],
+            },
+        ),
+    ]
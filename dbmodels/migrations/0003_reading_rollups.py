@@ -0,0 +1,53 @@
+# Generated by Django 4.2.17 on 2026-10-17 18:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dbmodels', '0002_tree_reading'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('bucket', models.DateTimeField()),
+                ('channel', models.CharField(max_length=20)),
+                ('count', models.BigIntegerField()),
+                ('sum', models.FloatField()),
+                ('sum_sq', models.FloatField()),
+                ('min', models.FloatField()),
+                ('max', models.FloatField()),
+            ],
+            options={
+                'db_table': 'tree_data_daily',
+            },
+        ),
+        migrations.CreateModel(
+            name='HourlyRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('bucket', models.DateTimeField()),
+                ('channel', models.CharField(max_length=20)),
+                ('count', models.BigIntegerField()),
+                ('sum', models.FloatField()),
+                ('sum_sq', models.FloatField()),
+                ('min', models.FloatField()),
+                ('max', models.FloatField()),
+            ],
+            options={
+                'db_table': 'tree_data_hourly',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='hourlyrollup',
+            constraint=models.UniqueConstraint(fields=('bucket', 'channel'), name='tree_data_hourly_bucket_channel'),
+        ),
+        migrations.AddConstraint(
+            model_name='dailyrollup',
+            constraint=models.UniqueConstraint(fields=('bucket', 'channel'), name='tree_data_daily_bucket_channel'),
+        ),
+    ]
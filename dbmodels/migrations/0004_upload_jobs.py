@@ -0,0 +1,41 @@
+# Generated by Django 4.2.17 on 2026-10-17 18:48
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('dbmodels', '0003_reading_rollups'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UploadJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('file', models.FileField(upload_to='upload_jobs/')),
+                ('filename', models.CharField(max_length=255)),
+                ('status', models.CharField(choices=[('queued', 'Queued'), ('running', 'Running'), ('succeeded', 'Succeeded'), ('failed', 'Failed')], default='queued', max_length=20)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('started_at', models.DateTimeField(blank=True, null=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('rows_parsed', models.BigIntegerField(default=0)),
+                ('rows_loaded', models.BigIntegerField(default=0)),
+                ('rows_rejected', models.BigIntegerField(default=0)),
+                ('chunks', models.IntegerField(default=0)),
+                ('seconds', models.FloatField(blank=True, null=True)),
+                ('rows_per_second', models.FloatField(blank=True, null=True)),
+                ('error', models.TextField(blank=True)),
+                ('user', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'db_table': 'upload_jobs',
+                'indexes': [models.Index(fields=['status', 'created_at'], name='upload_jobs_queue_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,77 @@
+# Generated by Django 4.2.17 on 2026-10-17 18:51
+
+import logging
+
+from django.db import migrations, models
+
+logger = logging.getLogger(__name__)
+
+
+def drop_duplicate_readings(apps, schema_editor):
+    # Overlapping uploads used to be appended as-is. Keep the first copy of
+    # each reading so the unique (source, Timestamp) key can be added.
+    if schema_editor.connection.vendor == 'postgresql':
+        sql = (
+            'DELETE FROM tree_data a USING tree_data b '
+            'WHERE a."Timestamp" = b."Timestamp" AND a.source = b.source AND a.id > b.id'
+        )
+    else:
+        sql = (
+            'DELETE FROM tree_data WHERE id NOT IN '
+            '(SELECT MIN(id) FROM tree_data GROUP BY source, "Timestamp")'
+        )
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(sql)
+        removed = cursor.rowcount
+    if removed > 0:
+        logger.warning(
+            "Removed %s duplicate tree_data readings; run "
+            "`manage.py rebuild_tree_data_rollups` to correct the rollups.",
+            removed,
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dbmodels', '0004_upload_jobs'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UploadedFile',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('sha256', models.CharField(max_length=64, unique=True)),
+                ('filename', models.CharField(max_length=255)),
+                ('source', models.CharField(blank=True, default='', max_length=64)),
+                ('size', models.BigIntegerField()),
+                ('rows', models.BigIntegerField(default=0)),
+                ('rows_new', models.BigIntegerField(default=0)),
+                ('uploaded_at', models.DateTimeField()),
+            ],
+            options={
+                'db_table': 'uploaded_files',
+            },
+        ),
+        migrations.AddField(
+            model_name='treereading',
+            name='source',
+            field=models.CharField(blank=True, db_column='source', default='', max_length=64),
+        ),
+        migrations.AddField(
+            model_name='uploadjob',
+            name='rows_skipped',
+            field=models.BigIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='uploadjob',
+            name='source',
+            field=models.CharField(blank=True, default='', max_length=64),
+        ),
+        migrations.RunPython(drop_duplicate_readings, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='treereading',
+            constraint=models.UniqueConstraint(fields=('source', 'timestamp'), name='tree_data_source_timestamp_uniq'),
+        ),
+    ]
@@ -0,0 +1,104 @@
+# Generated by Django 4.2.17 on 2026-10-17 19:09
+
+from datetime import datetime, timezone
+
+from django.db import migrations, models
+
+
+def _months(first, last):
+    month = datetime(first.year, first.month, 1, tzinfo=timezone.utc)
+    while month <= last:
+        following = datetime(month.year + month.month // 12, month.month % 12 + 1, 1, tzinfo=timezone.utc)
+        yield month, following
+        month = following
+
+
+def partition_tree_data(apps, schema_editor):
+    # Declarative partitioning is PostgreSQL-only; elsewhere tree_data stays
+    # one plain table
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute("SELECT relkind FROM pg_class WHERE oid = 'tree_data'::regclass")
+        if cursor.fetchone()[0] == 'p':
+            return
+        # Plain indexes are rebuilt on the new table; key constraints are redone below
+        cursor.execute(
+            "SELECT indexdef FROM pg_indexes i WHERE schemaname = current_schema() "
+            "AND tablename = 'tree_data' AND NOT EXISTS ("
+            "SELECT 1 FROM pg_constraint c WHERE c.conindid = "
+            "(quote_ident(i.schemaname) || '.' || quote_ident(i.indexname))::regclass)"
+        )
+        index_definitions = [row[0] for row in cursor.fetchall()]
+
+        cursor.execute('ALTER TABLE tree_data RENAME TO tree_data_flat')
+        cursor.execute(
+            'CREATE TABLE tree_data (LIKE tree_data_flat INCLUDING DEFAULTS) '
+            'PARTITION BY RANGE ("Timestamp")'
+        )
+        # The old id sequence belongs to tree_data_flat and goes with it
+        cursor.execute('CREATE SEQUENCE tree_data_partitioned_id_seq')
+        cursor.execute(
+            "ALTER TABLE tree_data ALTER COLUMN id SET DEFAULT nextval('tree_data_partitioned_id_seq')"
+        )
+        cursor.execute('ALTER SEQUENCE tree_data_partitioned_id_seq OWNED BY tree_data.id')
+
+        cursor.execute('SELECT MIN("Timestamp"), MAX("Timestamp") FROM tree_data_flat')
+        first, last = cursor.fetchone()
+        if first is not None:
+            for start, end in _months(first, last):
+                cursor.execute(
+                    f'CREATE TABLE tree_data_{start:%Y_%m} PARTITION OF tree_data '
+                    'FOR VALUES FROM (%s) TO (%s)',
+                    [start, end],
+                )
+        cursor.execute('INSERT INTO tree_data SELECT * FROM tree_data_flat')
+        cursor.execute(
+            "SELECT setval('tree_data_partitioned_id_seq', COALESCE(MAX(id), 0) + 1, false) FROM tree_data"
+        )
+        cursor.execute('DROP TABLE tree_data_flat')
+
+        # Unique keys on a partitioned table must include the partition key
+        cursor.execute('ALTER TABLE tree_data ADD PRIMARY KEY (id, "Timestamp")')
+        cursor.execute(
+            'ALTER TABLE tree_data ADD CONSTRAINT tree_data_source_tree_timestamp_uniq '
+            'UNIQUE (source, tree, "Timestamp")'
+        )
+        for definition in index_definitions:
+            cursor.execute(definition)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dbmodels', '0005_idempotent_ingest'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='treereading',
+            name='tree',
+            field=models.CharField(blank=True, db_column='tree', default='', max_length=64),
+        ),
+        migrations.AddField(
+            model_name='uploadjob',
+            name='tree',
+            field=models.CharField(blank=True, default='', max_length=64),
+        ),
+        migrations.AddIndex(
+            model_name='treereading',
+            index=models.Index(fields=['tree', 'timestamp', 'id'], name='tree_data_tree_idx'),
+        ),
+        # A logger moved to another tree keeps both trees' readings apart
+        migrations.RemoveConstraint(
+            model_name='treereading',
+            name='tree_data_source_timestamp_uniq',
+        ),
+        migrations.AddConstraint(
+            model_name='treereading',
+            constraint=models.UniqueConstraint(
+                fields=('source', 'tree', 'timestamp'), name='tree_data_source_tree_timestamp_uniq'
+            ),
+        ),
+        migrations.RunPython(partition_tree_data, migrations.RunPython.noop),
+    ]
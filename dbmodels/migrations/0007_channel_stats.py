@@ -0,0 +1,35 @@
+# Generated by Django 4.2.17 on 2026-10-17 19:23
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dbmodels', '0006_tree_partitions'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ChannelStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('upload', models.CharField(blank=True, default='', max_length=64)),
+                ('channel', models.CharField(max_length=20)),
+                ('count', models.BigIntegerField()),
+                ('mean', models.FloatField()),
+                ('m2', models.FloatField()),
+                ('min', models.FloatField()),
+                ('max', models.FloatField()),
+                ('first', models.DateTimeField()),
+                ('last', models.DateTimeField()),
+            ],
+            options={
+                'db_table': 'tree_data_stats',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='channelstats',
+            constraint=models.UniqueConstraint(fields=('upload', 'channel'), name='tree_data_stats_upload_channel'),
+        ),
+    ]
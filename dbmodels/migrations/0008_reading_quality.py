@@ -0,0 +1,18 @@
+# Generated by Django 4.2.17 on 2026-10-17 19:26
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dbmodels', '0007_channel_stats'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='treereading',
+            name='quality',
+            field=models.SmallIntegerField(db_column='quality', default=0),
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 4.2.17 on 2026-10-17 19:48
+
+from django.db import migrations, models
+
+
+def backfill_heartbeats(apps, schema_editor):
+    # Jobs already running have only their claim time to go on
+    UploadJob = apps.get_model('dbmodels', 'UploadJob')
+    UploadJob.objects.filter(status='running').update(
+        heartbeat_at=models.F('started_at'), attempts=1
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dbmodels', '0009_data_generation'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='uploadjob',
+            name='attempts',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='uploadjob',
+            name='heartbeat_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.RunPython(backfill_heartbeats, migrations.RunPython.noop),
+    ]
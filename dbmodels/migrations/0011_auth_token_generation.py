@@ -0,0 +1,23 @@
+# Generated by Django 4.2.17 on 2026-10-17 20:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dbmodels', '0010_upload_job_heartbeat'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AuthGeneration',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('value', models.BigIntegerField()),
+            ],
+            options={
+                'db_table': 'auth_token_generation',
+            },
+        ),
+    ]
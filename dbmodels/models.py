@@ -19,3 +19,201 @@ class UserProfile(models.Model):
     
     def __str__(self):
         return self.user.username
+
+
+class TreeReading(models.Model):
+    """
+    One logger reading. Database column names match the logger export
+    headers (and the JSON keys served by /treeData/). ``source`` names the
+    logger an upload came from and ``tree`` the tree it was measured on; a
+    logger has one reading per tree and timestamp. ``quality`` is a bitmask of
+    the checks the reading failed at ingest (see quality.py). On PostgreSQL
+    the table is partitioned by month of Timestamp (see partitions.py).
+    """
+    source = models.CharField(max_length=64, default='', blank=True, db_column='source')
+    tree = models.CharField(max_length=64, default='', blank=True, db_column='tree')
+    timestamp_raw = models.CharField(max_length=32, null=True, blank=True, db_column='Timestamp_Raw')
+    timestamp = models.DateTimeField(db_column='Timestamp')
+    temperature = models.FloatField(null=True, blank=True, db_column='Temperature')
+    pressure = models.FloatField(null=True, blank=True, db_column='Pressure')
+    humidity = models.FloatField(null=True, blank=True, db_column='Humidity')
+    dendro = models.FloatField(null=True, blank=True, db_column='Dendro')
+    sapflow = models.FloatField(null=True, blank=True, db_column='Sapflow')
+    sf_max_d = models.FloatField(null=True, blank=True, db_column='SF_maxD')
+    sf_signal = models.FloatField(null=True, blank=True, db_column='SF_Signal')
+    sf_noise = models.FloatField(null=True, blank=True, db_column='SF_Noise')
+    dendro_dup = models.FloatField(null=True, blank=True, db_column='Dendro_Dup')
+    quality = models.SmallIntegerField(default=0, db_column='quality')
+
+    class Meta:
+        db_table = 'tree_data'
+        indexes = [
+            models.Index(fields=['timestamp', 'id'], name='tree_data_timestamp_idx'),
+            models.Index(fields=['tree', 'timestamp', 'id'], name='tree_data_tree_idx'),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=['source', 'tree', 'timestamp'], name='tree_data_source_tree_timestamp_uniq'
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.timestamp}"
+
+
+class ReadingRollup(models.Model):
+    """
+    Per-channel aggregates of tree_data over one time bucket. Kept up to date
+    by uploads; rebuild with `manage.py rebuild_tree_data_rollups`.
+    """
+    bucket = models.DateTimeField()
+    channel = models.CharField(max_length=20)
+    count = models.BigIntegerField()
+    sum = models.FloatField()
+    sum_sq = models.FloatField()
+    min = models.FloatField()
+    max = models.FloatField()
+
+    class Meta:
+        abstract = True
+
+    def __str__(self):
+        return f"{self.channel} @ {self.bucket}"
+
+
+class HourlyRollup(ReadingRollup):
+    class Meta:
+        db_table = 'tree_data_hourly'
+        constraints = [
+            models.UniqueConstraint(fields=['bucket', 'channel'], name='tree_data_hourly_bucket_channel'),
+        ]
+
+
+class DailyRollup(ReadingRollup):
+    class Meta:
+        db_table = 'tree_data_daily'
+        constraints = [
+            models.UniqueConstraint(fields=['bucket', 'channel'], name='tree_data_daily_bucket_channel'),
+        ]
+
+
+class ChannelStats(models.Model):
+    """
+    Running summary of one channel, over all of tree_data (``upload`` '') or
+    over one uploaded file (``upload`` = its SHA-256). ``m2`` is the sum of
+    squared deviations from the mean. Kept by loader.py (see stats.py).
+    """
+    upload = models.CharField(max_length=64, default='', blank=True)
+    channel = models.CharField(max_length=20)
+    count = models.BigIntegerField()
+    mean = models.FloatField()
+    m2 = models.FloatField()
+    min = models.FloatField()
+    max = models.FloatField()
+    first = models.DateTimeField()
+    last = models.DateTimeField()
+
+    class Meta:
+        db_table = 'tree_data_stats'
+        constraints = [
+            models.UniqueConstraint(fields=['upload', 'channel'], name='tree_data_stats_upload_channel'),
+        ]
+
+    def __str__(self):
+        return f"{self.channel} ({self.upload[:12] or 'all'})"
+
+
+class DataGeneration(models.Model):
+    """
+    One row (id 1) counting changes to tree_data. Cached /treeData/
+    responses are keyed on it (see cache.py); it lives in the database so an
+    upload loaded by any process invalidates them in every process.
+    """
+    value = models.BigIntegerField()
+
+    class Meta:
+        db_table = 'tree_data_generation'
+
+    def __str__(self):
+        return str(self.value)
+
+
+class AuthGeneration(models.Model):
+    """
+    One row (id 1) counting token revocations and user changes. Cached token
+    lookups are keyed on it (see authentication.py), so a logout or role
+    change in one worker reaches every worker.
+    """
+    value = models.BigIntegerField()
+
+    class Meta:
+        db_table = 'auth_token_generation'
+
+    def __str__(self):
+        return str(self.value)
+
+
+UPLOAD_JOB_STATES = (
+    ('queued', 'Queued'),
+    ('running', 'Running'),
+    ('succeeded', 'Succeeded'),
+    ('failed', 'Failed'),
+)
+
+
+class UploadJob(models.Model):
+    """
+    A logger CSV accepted by /upload-csv/ and waiting for (or going through)
+    the background loader, `manage.py process_upload_jobs`. A running job's
+    worker refreshes ``heartbeat_at`` as it loads; ``attempts`` counts the
+    times it was claimed (see jobs.requeue_stale).
+    """
+    user = models.ForeignKey(User, null=True, blank=True, on_delete=models.SET_NULL)
+    file = models.FileField(upload_to='upload_jobs/')
+    filename = models.CharField(max_length=255)
+    source = models.CharField(max_length=64, default='', blank=True)
+    tree = models.CharField(max_length=64, default='', blank=True)
+    status = models.CharField(max_length=20, choices=UPLOAD_JOB_STATES, default='queued')
+    created_at = models.DateTimeField(default=timezone.now)
+    started_at = models.DateTimeField(null=True, blank=True)
+    heartbeat_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    attempts = models.IntegerField(default=0)
+    rows_parsed = models.BigIntegerField(default=0)
+    rows_loaded = models.BigIntegerField(default=0)
+    rows_rejected = models.BigIntegerField(default=0)
+    rows_skipped = models.BigIntegerField(default=0)
+    chunks = models.IntegerField(default=0)
+    seconds = models.FloatField(null=True, blank=True)
+    rows_per_second = models.FloatField(null=True, blank=True)
+    error = models.TextField(blank=True)
+
+    class Meta:
+        db_table = 'upload_jobs'
+        indexes = [
+            models.Index(fields=['status', 'created_at'], name='upload_jobs_queue_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.filename} ({self.status})"
+
+
+class UploadedFile(models.Model):
+    """
+    Fingerprint (SHA-256 of the content) of every logger CSV loaded into
+    tree_data, so an exact re-upload is recognised before it is parsed.
+    Written by loader.py in the upload's own transaction.
+    """
+    sha256 = models.CharField(max_length=64, unique=True)
+    filename = models.CharField(max_length=255)
+    source = models.CharField(max_length=64, default='', blank=True)
+    size = models.BigIntegerField()
+    rows = models.BigIntegerField(default=0)
+    rows_new = models.BigIntegerField(default=0)
+    uploaded_at = models.DateTimeField()
+
+    class Meta:
+        db_table = 'uploaded_files'
+
+    def __str__(self):
+        return f"{self.filename} ({self.sha256[:12]})"
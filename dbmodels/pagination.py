@@ -0,0 +1,12 @@
+from rest_framework.pagination import CursorPagination
+
+
+class ListingCursorPagination(CursorPagination):
+    """
+    Keyset pages for the user and profile listings: ``?page_size=`` (up to
+    MAX) and an opaque ``?cursor=`` taken from ``next``/``previous``.
+    """
+    ordering = "id"
+    page_size = 50
+    page_size_query_param = "page_size"
+    max_page_size = 500
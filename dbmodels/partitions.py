@@ -0,0 +1,94 @@
+"""
+Monthly partitions of tree_data on PostgreSQL.
+
+Migration 0006 turns tree_data into a table partitioned by month of
+"Timestamp" (partition tree_data_YYYY_MM holds that calendar month, UTC).
+There is no default partition, so the months a load needs must exist
+before it writes: the loader creates them with create_partitions(), in a
+short transaction of its own, before it opens the one it loads in. New
+months are built as plain tables and attached, which locks tree_data only
+against other DDL, so reads and concurrent loads carry on meanwhile.
+Queries with a time range only scan the months it covers. On other
+databases tree_data is a single table and all of this is a no-op.
+"""
+from datetime import datetime, timezone
+
+from sqlalchemy import text
+
+from . import engine as tree_engine
+from .bulkload import TREE_DATA_TABLE, quote
+
+# Arbitrary key for the advisory lock serializing partition creation
+PARTITION_LOCK_ID = 7_321_004
+
+
+def month_bounds(first, last):
+    """(start, end) of every calendar month (UTC) touched by [first, last]."""
+    first = first.astimezone(timezone.utc)
+    last = last.astimezone(timezone.utc)
+    month = datetime(first.year, first.month, 1, tzinfo=timezone.utc)
+    while month <= last:
+        following = datetime(month.year + month.month // 12, month.month % 12 + 1, 1, tzinfo=timezone.utc)
+        yield month, following
+        month = following
+
+
+def partition_name(month):
+    return f"{TREE_DATA_TABLE}_{month:%Y_%m}"
+
+
+def is_partitioned(conn):
+    if conn.dialect.name != "postgresql":
+        return False
+    return conn.execute(
+        text("SELECT relkind FROM pg_class WHERE oid = to_regclass(:table)"),
+        {"table": TREE_DATA_TABLE},
+    ).scalar() == "p"
+
+
+def _exists(conn, name):
+    return conn.execute(text("SELECT to_regclass(:name)"), {"name": name}).scalar() is not None
+
+
+def ensure_partitions(conn, first, last):
+    """
+    Create any missing monthly partitions for readings between ``first`` and
+    ``last`` on ``conn``. Whatever transaction ``conn`` is in holds the
+    partition lock until it ends, so use create_partitions() rather than
+    calling this from inside a load.
+    """
+    if not is_partitioned(conn):
+        return []
+    created = []
+    for start, end in month_bounds(first, last):
+        name = partition_name(start)
+        if _exists(conn, name):
+            continue
+        # Concurrent loads of the same month wait here, then see the table
+        conn.execute(text("SELECT pg_advisory_xact_lock(:id)"), {"id": PARTITION_LOCK_ID})
+        if _exists(conn, name):
+            continue
+        # CREATE TABLE ... PARTITION OF would hold ACCESS EXCLUSIVE on
+        # tree_data; ATTACH PARTITION only needs SHARE UPDATE EXCLUSIVE
+        conn.execute(text(f"CREATE TABLE {quote(name)} (LIKE {quote(TREE_DATA_TABLE)} INCLUDING DEFAULTS)"))
+        conn.execute(
+            text(
+                f"ALTER TABLE {quote(TREE_DATA_TABLE)} ATTACH PARTITION {quote(name)} "
+                "FOR VALUES FROM (:start) TO (:end)"
+            ),
+            {"start": start, "end": end},
+        )
+        created.append(name)
+    return created
+
+
+def create_partitions(first, last):
+    """ensure_partitions() in a transaction of its own, committed on return."""
+    with tree_engine.begin() as conn:
+        return ensure_partitions(conn, first, last)
+
+
+def partitioned():
+    """Whether tree_data is partitioned (see is_partitioned())."""
+    with tree_engine.connect() as conn:
+        return is_partitioned(conn)
@@ -0,0 +1,122 @@
+"""
+Quality flags for logger readings.
+
+Every reading gets a bitmask in tree_data.quality, computed at ingest by
+vectorized rules over each chunk; 0 means no rule fired. A flag marks the
+reading, not just one channel, so clients pick the flags that matter for
+what they plot (see ``quality=`` on /treeData/).
+
+Rules that compare a reading with earlier ones (spikes, stuck sensors) look
+back only, so they run chunk by chunk: QualityChecker keeps the last few
+readings of the previous chunk. Files are assumed to be in time order, as
+loggers write them. Readings loaded before flags existed have 0.
+"""
+import numpy as np
+import pandas as pd
+from django.conf import settings
+
+TEMPERATURE_RANGE = 1
+HUMIDITY_RANGE = 2
+SAPFLOW_SIGNAL = 4
+DENDRO_SPIKE = 8
+STUCK_SENSOR = 16
+
+FLAGS = {
+    "temperature_range": TEMPERATURE_RANGE,
+    "humidity_range": HUMIDITY_RANGE,
+    "sapflow_signal": SAPFLOW_SIGNAL,
+    "dendro_spike": DENDRO_SPIKE,
+    "stuck_sensor": STUCK_SENSOR,
+}
+
+DEFAULT_RULES = {
+    # Plausible air temperature (C) and relative humidity (%)
+    "TEMPERATURE_RANGE": (-40.0, 60.0),
+    "HUMIDITY_RANGE": (0.0, 100.0),
+    # Sap flow is unreliable when SF_Signal is under this multiple of SF_Noise
+    "SAPFLOW_MIN_SIGNAL_TO_NOISE": 3.0,
+    # Fastest believable dendrometer change, in um per hour
+    "DENDRO_MAX_RATE": 50.0,
+    # Readings in a row with the same value before a sensor counts as stuck
+    "STUCK_RUN": 12,
+}
+
+# Every flag at once
+ALL_FLAGS = sum(FLAGS.values())
+
+# Channels a stuck sensor shows up in (humidity legitimately sits at 100%
+# through rain and fog), with the values each may hold for any length of
+# time: sap flow stays at zero all night
+STUCK_CHANNELS = {
+    "Temperature": [],
+    "Dendro": [],
+    "Sapflow": [0.0],
+}
+
+
+def get_rules():
+    return {**DEFAULT_RULES, **getattr(settings, "TREE_DATA_QUALITY_RULES", {})}
+
+
+def _outside(values, bounds):
+    low, high = bounds
+    # NaN compares False: a missing value is not out of range
+    return (values < low) | (values > high)
+
+
+def _run_lengths(values):
+    """For each position, how many values in a row up to it are equal to it."""
+    changed = np.ones(len(values), dtype=bool)
+    changed[1:] = values[1:] != values[:-1]
+    # NaN never equals NaN, so gaps break runs
+    starts = np.flatnonzero(changed)
+    run_start = starts[np.searchsorted(starts, np.arange(len(values)), side="right") - 1]
+    return np.arange(len(values)) - run_start + 1
+
+
+class QualityChecker:
+    """Flags the chunks of one file in order (see the module docstring)."""
+
+    def __init__(self, rules=None):
+        self.rules = rules or get_rules()
+        self.history = None
+
+    def check(self, chunk):
+        """Bitmask for every reading of a cleaned chunk, as an int16 array."""
+        rules = self.rules
+        flags = np.zeros(len(chunk), dtype="int16")
+        if chunk.empty:
+            return flags
+        flags[_outside(chunk["Temperature"].to_numpy(), rules["TEMPERATURE_RANGE"])] |= TEMPERATURE_RANGE
+        flags[_outside(chunk["Humidity"].to_numpy(), rules["HUMIDITY_RANGE"])] |= HUMIDITY_RANGE
+        signal = chunk["SF_Signal"].to_numpy()
+        noise = chunk["SF_Noise"].to_numpy()
+        flags[signal < noise * rules["SAPFLOW_MIN_SIGNAL_TO_NOISE"]] |= SAPFLOW_SIGNAL
+
+        # Look-back rules run over the tail of the previous chunk plus this one
+        window = chunk[["Timestamp", *STUCK_CHANNELS]]
+        if self.history is not None:
+            window = pd.concat([self.history, window])
+        carried = len(window) - len(chunk)
+
+        seconds = window["Timestamp"].astype("int64").to_numpy() / 1e9
+        dendro = window["Dendro"].to_numpy()
+        with np.errstate(invalid="ignore", divide="ignore"):
+            hours = np.diff(seconds) / 3600
+            rate = np.abs(np.diff(dendro)) / hours
+        spike = np.zeros(len(window), dtype=bool)
+        spike[1:] = (hours > 0) & (rate > rules["DENDRO_MAX_RATE"])
+        flags[spike[carried:]] |= DENDRO_SPIKE
+
+        stuck = np.zeros(len(window), dtype=bool)
+        for channel, resting in STUCK_CHANNELS.items():
+            values = window[channel].to_numpy()
+            stuck |= (
+                (_run_lengths(values) >= rules["STUCK_RUN"])
+                & ~np.isnan(values)
+                & ~np.isin(values, resting)
+            )
+        flags[stuck[carried:]] |= STUCK_SENSOR
+
+        self.history = window.iloc[-max(rules["STUCK_RUN"] - 1, 1):]
+        return flags
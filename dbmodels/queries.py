@@ -0,0 +1,229 @@
+"""
+SQL builders for reading tree_data.
+
+Pages are ordered by (Timestamp, id) and continue from an opaque cursor with
+a row-value comparison, so every page is an index seek on
+tree_data_timestamp_idx instead of an OFFSET scan. Time ranges and column
+lists requested by the client are pushed down into the SQL as well.
+"""
+import base64
+import json
+from datetime import datetime, timezone
+
+from .bulkload import TREE_DATA_TABLE, quote
+from .ingest import TREE_DATA_COLUMNS
+from .quality import ALL_FLAGS, FLAGS
+
+READING_COLUMNS = ["id"] + TREE_DATA_COLUMNS + ["quality"]
+
+# Channels a client may ask for with ?fields= (id and Timestamp always come back)
+SELECTABLE_FIELDS = [c for c in READING_COLUMNS if c not in ("id", "Timestamp")]
+
+
+class InvalidQuery(ValueError):
+    """A client-supplied parameter (cursor, range, field...) is not usable."""
+
+
+def parse_db_timestamp(value):
+    """Return an aware UTC datetime for a Timestamp value read from the DB."""
+    if isinstance(value, str):
+        # SQLite hands back Django's text format
+        value = datetime.fromisoformat(value)
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.astimezone(timezone.utc)
+
+
+def db_timestamp(dialect_name, value):
+    """Bind an aware datetime the way the Timestamp column stores it."""
+    if dialect_name == "sqlite":
+        return str(value.astimezone(timezone.utc).replace(tzinfo=None))
+    return value
+
+
+def epoch_sql(dialect_name, column='"Timestamp"'):
+    """SQL expression for a timestamp column as Unix seconds."""
+    if dialect_name == "sqlite":
+        # Whole seconds, exact (julianday() arithmetic drifts at boundaries)
+        return f"CAST(strftime('%s', {column}) AS INTEGER)"
+    return f"EXTRACT(EPOCH FROM {column})"
+
+
+def bucket_sql(dialect_name, width_param=":width", column='"Timestamp"'):
+    """SQL expression numbering epoch-aligned buckets of width_param seconds."""
+    if dialect_name == "sqlite":
+        # Integer division floors for post-1970 timestamps
+        return f"({epoch_sql(dialect_name, column)} / {width_param})"
+    return f"FLOOR({epoch_sql(dialect_name, column)} / {width_param})"
+
+
+def bucket_start_sql(dialect_name, width_param=":width", column='"Timestamp"'):
+    """SQL expression for the start of a timestamp's bucket, as a timestamp."""
+    seconds = f"({bucket_sql(dialect_name, width_param, column)} * {width_param})"
+    if dialect_name == "sqlite":
+        return f"datetime({seconds}, 'unixepoch')"
+    return f"TO_TIMESTAMP({seconds})"
+
+
+def encode_cursor(timestamp, row_id):
+    payload = json.dumps([parse_db_timestamp(timestamp).isoformat(), row_id])
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor):
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        timestamp, row_id = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        return parse_db_timestamp(timestamp), int(row_id)
+    except (ValueError, TypeError, AttributeError):
+        raise InvalidQuery("Invalid cursor")
+
+
+def parse_timestamp_param(name, value):
+    """Parse an ISO 8601 date or datetime; naive values are taken as UTC."""
+    try:
+        parsed = datetime.fromisoformat(value.strip().replace("Z", "+00:00"))
+    except ValueError:
+        raise InvalidQuery(f"'{name}' must be an ISO 8601 date or datetime")
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed
+
+
+def parse_limit(value, default, maximum=10000):
+    """Page size from ?limit=, falling back to ``default`` when unusable."""
+    try:
+        limit = int(value) if value is not None else default
+    except ValueError:
+        return default
+    if limit < 1 or limit > maximum:  # Enforce reasonable limits
+        return default
+    return limit
+
+
+def parse_fields(value, allowed=SELECTABLE_FIELDS):
+    """Validate a comma-separated ?fields= list against the known columns."""
+    fields = [f.strip() for f in value.split(",") if f.strip()]
+    unknown = [f for f in fields if f not in allowed]
+    if unknown:
+        raise InvalidQuery(
+            f"Unknown field(s): {', '.join(unknown)}. Allowed: {', '.join(allowed)}"
+        )
+    # Keep table order and drop repeats
+    return [c for c in allowed if c in fields]
+
+
+def parse_quality(value):
+    """
+    Parse ?quality= into (exclude, mask): "good" (no flag), "flagged" (any
+    flag), flag names (any of them) or flag names each prefixed with "-"
+    (none of them). See quality.py for the flags.
+    """
+    value = value.strip().lower()
+    if value == "good":
+        return True, ALL_FLAGS
+    if value == "flagged":
+        return False, ALL_FLAGS
+    names = [name.strip() for name in value.split(",") if name.strip()]
+    exclude = all(name.startswith("-") for name in names)
+    if not names or (not exclude and any(name.startswith("-") for name in names)):
+        raise InvalidQuery("'quality' must be good, flagged, or flag names (all or none prefixed with '-')")
+    names = [name.lstrip("-") for name in names]
+    unknown = [name for name in names if name not in FLAGS]
+    if unknown:
+        raise InvalidQuery(
+            f"Unknown quality flag(s): {', '.join(unknown)}. Known: {', '.join(FLAGS)}"
+        )
+    mask = 0
+    for name in names:
+        mask |= FLAGS[name]
+    return exclude, mask
+
+
+class ReadingFilters:
+    """Time range, tree, quality and column projection shared by the tree data endpoints."""
+
+    def __init__(self, start=None, end=None, fields=None, tree=None, quality=None, source=None):
+        self.start = start
+        self.end = end
+        self.fields = fields
+        self.tree = tree
+        self.quality = quality
+        # Not a query parameter; set by the upload event stream (events.py)
+        self.source = source
+
+    @classmethod
+    def from_params(cls, params, allowed_fields=SELECTABLE_FIELDS):
+        start = end = fields = None
+        if params.get("start"):
+            start = parse_timestamp_param("start", params["start"])
+        if params.get("end"):
+            end = parse_timestamp_param("end", params["end"])
+        if start and end and end <= start:
+            raise InvalidQuery("'end' must be after 'start'")
+        if params.get("fields"):
+            fields = parse_fields(params["fields"], allowed_fields)
+        tree = params.get("tree", "").strip() or None
+        if tree is not None and len(tree) > 64:
+            raise InvalidQuery("'tree' must be at most 64 characters")
+        quality = parse_quality(params["quality"]) if params.get("quality") else None
+        return cls(start, end, fields, tree, quality)
+
+    def columns(self):
+        if self.fields is None:
+            return list(READING_COLUMNS)
+        return ["id", "Timestamp"] + self.fields
+
+    def where(self, dialect_name, params):
+        """
+        Return SQL predicates for the range (start inclusive, end exclusive),
+        tree, logger and quality flags. On PostgreSQL the range also prunes
+        tree_data's monthly partitions; the tree is found through
+        tree_data_tree_idx.
+        """
+        clauses = []
+        if self.tree is not None:
+            clauses.append("tree = :tree")
+            params["tree"] = self.tree
+        if self.source is not None:
+            clauses.append("source = :source")
+            params["source"] = self.source
+        if self.quality is not None:
+            exclude, mask = self.quality
+            clauses.append(f"(quality & :quality_mask) {'=' if exclude else '<>'} 0")
+            params["quality_mask"] = mask
+        if self.start is not None:
+            clauses.append('"Timestamp" >= :start')
+            params["start"] = db_timestamp(dialect_name, self.start)
+        if self.end is not None:
+            clauses.append('"Timestamp" < :end')
+            params["end"] = db_timestamp(dialect_name, self.end)
+        return clauses
+
+
+def build_page_query(dialect_name, limit, after=None, filters=None):
+    """
+    Return (sql, params) for one page of readings.
+
+    One extra row is fetched so the caller can tell whether a next page
+    exists without a COUNT. A ``limit`` of None selects every matching row
+    (used by the streamed exports).
+    """
+    filters = filters or ReadingFilters()
+    params = {}
+    clauses = filters.where(dialect_name, params)
+    if after is not None:
+        timestamp, row_id = after
+        clauses.append('("Timestamp", id) > (:after_ts, :after_id)')
+        params["after_ts"] = db_timestamp(dialect_name, timestamp)
+        params["after_id"] = row_id
+    where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+    column_list = ", ".join(quote(c) for c in filters.columns())
+    sql = (
+        f"SELECT {column_list} FROM {quote(TREE_DATA_TABLE)} {where} "
+        'ORDER BY "Timestamp", id'
+    )
+    if limit is not None:
+        sql += " LIMIT :limit"
+        params["limit"] = limit + 1
+    return sql, params
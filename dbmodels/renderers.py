@@ -0,0 +1,38 @@
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+
+
+class ExportRenderer(BaseRenderer):
+    """
+    Advertises an export format for content negotiation (Accept header or
+    ?format=). The view builds the streamed body itself; anything rendered
+    through here is an error payload, which goes out as JSON.
+    """
+    charset = None
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return JSONRenderer().render(data)
+
+
+class ArrowStreamRenderer(ExportRenderer):
+    media_type = 'application/vnd.apache.arrow.stream'
+    format = 'arrow'
+
+
+class ParquetRenderer(ExportRenderer):
+    media_type = 'application/vnd.apache.parquet'
+    format = 'parquet'
+
+
+class CSVRenderer(ExportRenderer):
+    media_type = 'text/csv'
+    format = 'csv'
+
+
+class JSONErrorsMixin:
+    """Send error responses as JSON whatever format was negotiated."""
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        if response.status_code >= 400 and getattr(request, 'accepted_renderer', None) is not None:
+            request.accepted_renderer = JSONRenderer()
+            request.accepted_media_type = JSONRenderer.media_type
+        return super().finalize_response(request, response, *args, **kwargs)
@@ -0,0 +1,132 @@
+"""
+Hourly and daily rollups of tree_data.
+
+Each rollup row holds count, sum, sum of squares, min and max of one channel
+over one bucket. Uploads refresh only the buckets their readings fall into;
+coarse aggregation queries are then answered from the rollups without
+touching raw rows.
+"""
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import text
+
+from .bulkload import TREE_DATA_TABLE, quote
+from .ingest import FLOAT_COLUMNS
+from .queries import bucket_sql, bucket_start_sql, db_timestamp
+
+HOUR = 3600
+DAY = 86400
+
+# Coarsest first, so the smallest rollup that fits a bucket width wins
+ROLLUP_TABLES = [("tree_data_daily", DAY), ("tree_data_hourly", HOUR)]
+
+ROLLUP_COLUMNS = '"bucket", "channel", "count", "sum", "sum_sq", "min", "max"'
+
+# Arbitrary key for the advisory lock serializing rollup refreshes
+ROLLUP_LOCK_ID = 7_321_003
+
+
+def align(value, width):
+    """Round an aware datetime down to an epoch-aligned bucket edge."""
+    seconds = value.timestamp()
+    return datetime.fromtimestamp(seconds - seconds % width, tz=timezone.utc)
+
+
+def refresh_rollups(conn, start, end):
+    """
+    Recompute every rollup bucket overlapping [start, end] from tree_data.
+
+    Runs inside the caller's transaction, so an upload and its rollups
+    commit together.
+    """
+    dialect = conn.dialect.name
+    _lock(conn)
+    for table, width in ROLLUP_TABLES:
+        params = {
+            "width": width,
+            "lo": db_timestamp(dialect, align(start, width)),
+            "hi": db_timestamp(dialect, align(end, width) + timedelta(seconds=width)),
+        }
+        conn.execute(
+            text(f'DELETE FROM {quote(table)} WHERE "bucket" >= :lo AND "bucket" < :hi'),
+            params,
+        )
+        where = 'WHERE "Timestamp" >= :lo AND "Timestamp" < :hi'
+        conn.execute(text(_rollup_insert_sql(dialect, table, where)), params)
+
+
+def rebuild_rollups(conn):
+    """Throw away and recompute all rollups from tree_data."""
+    dialect = conn.dialect.name
+    _lock(conn)
+    for table, width in ROLLUP_TABLES:
+        conn.execute(text(f"DELETE FROM {quote(table)}"))
+        conn.execute(text(_rollup_insert_sql(dialect, table, "")), {"width": width})
+
+
+def _lock(conn):
+    # Two loads covering the same bucket would otherwise each delete it
+    # without seeing the other's uncommitted rows, then both insert it.
+    # Held until commit, so the second load recomputes from committed data.
+    if conn.dialect.name == "postgresql":
+        conn.execute(text("SELECT pg_advisory_xact_lock(:id)"), {"id": ROLLUP_LOCK_ID})
+
+
+def _rollup_insert_sql(dialect, table, where):
+    selects = []
+    for channel in FLOAT_COLUMNS:
+        column = quote(channel)
+        selects.append(
+            f"SELECT {bucket_start_sql(dialect)} AS bucket, '{channel}' AS channel, "
+            f"COUNT({column}), SUM({column}), SUM({column} * {column}), MIN({column}), MAX({column}) "
+            f"FROM {quote(TREE_DATA_TABLE)} {where} "
+            f"GROUP BY 1 HAVING COUNT({column}) > 0"
+        )
+    return f"INSERT INTO {quote(table)} ({ROLLUP_COLUMNS}) " + " UNION ALL ".join(selects)
+
+
+def rollup_for(width, filters):
+    """
+    Return the rollup table that can answer buckets of ``width`` seconds for
+    these filters, or None if raw rows are needed.
+    """
+    if filters.tree is not None or filters.quality is not None:
+        # Rollups are kept over all trees and readings together
+        return None
+    for table, rollup_width in ROLLUP_TABLES:
+        if width % rollup_width:
+            continue
+        edges = [t for t in (filters.start, filters.end) if t is not None]
+        if all(align(t, rollup_width) == t for t in edges):
+            return table
+    return None
+
+
+def rollup_stats_rows(conn, table, filters, fields, width):
+    """
+    (bucket, count, min, max, mean, ...) rows like aggregation.bucket_stats
+    produces, merged from rollup rows instead of raw readings.
+    """
+    dialect = conn.dialect.name
+    params = {"width": width}
+    clauses = []
+    if filters.start is not None:
+        clauses.append('"bucket" >= :start')
+        params["start"] = db_timestamp(dialect, filters.start)
+    if filters.end is not None:
+        clauses.append('"bucket" < :end')
+        params["end"] = db_timestamp(dialect, filters.end)
+    channels = ", ".join(f"'{field}'" for field in fields)
+    clauses.append(f'"channel" IN ({channels})')
+    bucket = bucket_sql(dialect, column='"bucket"')
+    sql = (
+        f'SELECT {bucket} AS b, "channel", SUM("count"), MIN("min"), MAX("max"), SUM("sum") '
+        f"FROM {quote(table)} WHERE {' AND '.join(clauses)} "
+        'GROUP BY b, "channel" ORDER BY b'
+    )
+    merged = {}
+    for b, channel, count, minimum, maximum, total in conn.execute(text(sql), params):
+        row = merged.setdefault(b, [b] + [0, None, None, None] * len(fields))
+        offset = 1 + 4 * fields.index(channel)
+        row[offset:offset + 4] = [count, minimum, maximum, total / count]
+    return list(merged.values())
@@ -1,9 +1,30 @@
 from rest_framework import serializers
 from django.contrib.auth.models import User
-from .models import UserProfile, USER_ROLES
+from .models import UploadJob, UserProfile, USER_ROLES
 
 
-class UserSerializer(serializers.ModelSerializer):
+class SelectableFieldsMixin:
+    """
+    Lets GET requests trim the output to ``?fields=a,b``; unknown names are
+    a 400. Only applies to the top-level serializer.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        request = self.context.get('request')
+        if request is None or request.method != 'GET' or not request.query_params.get('fields'):
+            return
+        wanted = {name.strip() for name in request.query_params['fields'].split(',') if name.strip()}
+        unknown = wanted - set(self.fields)
+        if unknown:
+            raise serializers.ValidationError(
+                {'error': f"Unknown fields: {', '.join(sorted(unknown))}"}
+            )
+        for name in set(self.fields) - wanted:
+            self.fields.pop(name)
+
+
+class UserSerializer(SelectableFieldsMixin, serializers.ModelSerializer):
     """Serializer for the User model."""
     class Meta:
         model = User
@@ -11,7 +32,7 @@ class UserSerializer(serializers.ModelSerializer):
         read_only_fields = ['id', 'date_joined']
 
 
-class UserProfileSerializer(serializers.ModelSerializer):
+class UserProfileSerializer(SelectableFieldsMixin, serializers.ModelSerializer):
     """Serializer for the UserProfile model."""
     user = UserSerializer(read_only=True)
     username = serializers.CharField(source='user.username', read_only=True)
@@ -66,3 +87,15 @@ class LoginSerializer(serializers.Serializer):
 class UpdateRoleSerializer(serializers.Serializer):
     """Serializer for updating user role."""
     role = serializers.ChoiceField(choices=USER_ROLES, required=True)
+
+
+class UploadJobSerializer(serializers.ModelSerializer):
+    """Serializer for the status of a queued CSV upload."""
+    username = serializers.CharField(source='user.username', read_only=True, default=None)
+
+    class Meta:
+        model = UploadJob
+        fields = ['id', 'filename', 'source', 'tree', 'username', 'status', 'created_at', 'started_at',
+                  'finished_at', 'attempts', 'rows_parsed', 'rows_loaded', 'rows_skipped', 'rows_rejected', 'chunks',
+                  'seconds', 'rows_per_second', 'error']
+        read_only_fields = fields
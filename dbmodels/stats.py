@@ -0,0 +1,233 @@
+"""
+Summary statistics of every channel, kept current by uploads.
+
+tree_data_stats holds one row per channel for all of tree_data (upload '')
+and one per channel for each uploaded file (upload = its SHA-256): count,
+mean, M2 (sum of squared deviations from the mean), min, max and the first
+and last timestamp with a value. /treeData/stats/ reads those rows instead
+of scanning readings.
+
+The loader feeds every chunk it writes to RunningStats, which merges chunk
+moments with Chan et al.'s parallel update, so a file's statistics cost one
+vectorized pass over data already in memory. The file's statistics are
+then merged into the global ones the same way. When part of the file was
+already stored (an overlapping export), merging would count those readings
+twice, so count, mean, M2, min and max are instead recomputed from the
+daily rollups the same transaction has just refreshed.
+"""
+import numpy as np
+import pandas as pd
+from sqlalchemy import text
+
+from .bulkload import TREE_DATA_TABLE, quote
+from .ingest import FLOAT_COLUMNS
+from .queries import db_timestamp, parse_db_timestamp
+
+STATS_TABLE = "tree_data_stats"
+
+STATS_COLUMNS = '"upload", "channel", "count", "mean", "m2", "min", "max", "first", "last"'
+
+# Arbitrary key for the advisory lock serializing updates of the global row
+STATS_LOCK_ID = 7_321_005
+
+# Placeholders for "no timestamp yet" in the int64 nanosecond arrays
+_NO_FIRST = np.iinfo("int64").max
+_NO_LAST = np.iinfo("int64").min
+
+
+class RunningStats:
+    """Mergeable per-channel count, mean, M2, min, max, first and last."""
+
+    def __init__(self, channels=FLOAT_COLUMNS):
+        size = len(channels)
+        self.channels = list(channels)
+        self.count = np.zeros(size, dtype="int64")
+        self.mean = np.zeros(size)
+        self.m2 = np.zeros(size)
+        self.min = np.full(size, np.nan)
+        self.max = np.full(size, np.nan)
+        # Nanoseconds since the epoch, UTC
+        self.first = np.full(size, _NO_FIRST, dtype="int64")
+        self.last = np.full(size, _NO_LAST, dtype="int64")
+
+    def update(self, chunk):
+        """Add the readings of a cleaned chunk (see ingest.py)."""
+        if chunk.empty:
+            return
+        values = chunk[self.channels].to_numpy(dtype="float64")
+        present = ~np.isnan(values)
+        count = present.sum(axis=0)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            mean = np.nansum(values, axis=0) / count
+            m2 = np.nansum((values - mean) ** 2, axis=0)
+        stamps = chunk["Timestamp"].astype("int64").to_numpy()[:, None]
+        self.merge_moments(
+            count,
+            mean,
+            m2,
+            np.fmin.reduce(values, axis=0),
+            np.fmax.reduce(values, axis=0),
+            np.where(present, stamps, _NO_FIRST).min(axis=0),
+            np.where(present, stamps, _NO_LAST).max(axis=0),
+        )
+
+    def merge(self, other):
+        self.merge_moments(other.count, other.mean, other.m2, other.min, other.max, other.first, other.last)
+
+    def merge_moments(self, count, mean, m2, low, high, first, last):
+        """Chan et al.'s pairwise update, for every channel at once."""
+        total = self.count + count
+        with np.errstate(invalid="ignore", divide="ignore"):
+            delta = mean - self.mean
+            merged_mean = self.mean + delta * count / total
+            merged_m2 = self.m2 + m2 + delta ** 2 * self.count * count / total
+        fresh = count > 0
+        self.mean = np.where(fresh, merged_mean, self.mean)
+        self.m2 = np.where(fresh, merged_m2, self.m2)
+        self.count = total
+        self.min = np.fmin(self.min, low)
+        self.max = np.fmax(self.max, high)
+        self.first = np.minimum(self.first, first)
+        self.last = np.maximum(self.last, last)
+
+    def as_dict(self, fields=None):
+        """Per-channel JSON-ready summary (sample standard deviation)."""
+        summary = {}
+        for i, channel in enumerate(self.channels):
+            if fields is not None and channel not in fields:
+                continue
+            count = int(self.count[i])
+            summary[channel] = {
+                "count": count,
+                "min": float(self.min[i]) if count else None,
+                "max": float(self.max[i]) if count else None,
+                "mean": float(self.mean[i]) if count else None,
+                "stddev": float(np.sqrt(self.m2[i] / (count - 1))) if count > 1 else None,
+                "first": _iso(self.first[i]) if count else None,
+                "last": _iso(self.last[i]) if count else None,
+            }
+        return summary
+
+
+def _datetime(nanoseconds):
+    return pd.Timestamp(int(nanoseconds), tz="UTC").to_pydatetime()
+
+
+def _iso(nanoseconds):
+    return pd.Timestamp(int(nanoseconds), tz="UTC").strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+def _nanoseconds(value):
+    return pd.Timestamp(parse_db_timestamp(value)).value
+
+
+def load_stats(conn, upload=""):
+    """RunningStats stored for ``upload`` ('' for all of tree_data)."""
+    stats = RunningStats()
+    rows = conn.execute(
+        text(f'SELECT {STATS_COLUMNS} FROM {quote(STATS_TABLE)} WHERE "upload" = :upload'),
+        {"upload": upload},
+    )
+    for _, channel, count, mean, m2, low, high, first, last in rows:
+        if channel not in stats.channels:
+            continue
+        i = stats.channels.index(channel)
+        stats.count[i], stats.mean[i], stats.m2[i] = count, mean, m2
+        stats.min[i], stats.max[i] = low, high
+        stats.first[i], stats.last[i] = _nanoseconds(first), _nanoseconds(last)
+    return stats
+
+
+def save_stats(conn, stats, upload=""):
+    dialect = conn.dialect.name
+    conn.execute(text(f'DELETE FROM {quote(STATS_TABLE)} WHERE "upload" = :upload'), {"upload": upload})
+    rows = [
+        {
+            "upload": upload,
+            "channel": channel,
+            "count": int(stats.count[i]),
+            "mean": float(stats.mean[i]),
+            "m2": float(stats.m2[i]),
+            "min": float(stats.min[i]),
+            "max": float(stats.max[i]),
+            "first": db_timestamp(dialect, _datetime(stats.first[i])),
+            "last": db_timestamp(dialect, _datetime(stats.last[i])),
+        }
+        for i, channel in enumerate(stats.channels)
+        if stats.count[i]
+    ]
+    if rows:
+        conn.execute(
+            text(
+                f"INSERT INTO {quote(STATS_TABLE)} ({STATS_COLUMNS}) VALUES "
+                "(:upload, :channel, :count, :mean, :m2, :min, :max, :first, :last)"
+            ),
+            rows,
+        )
+
+
+def moments_from_rollups(conn):
+    """
+    Global count, mean, M2, min and max per channel, merged from the daily
+    rollups. First and last are left empty; callers supply them.
+    """
+    stats = RunningStats()
+    rows = conn.execute(
+        text('SELECT "channel", "count", "sum", "sum_sq", "min", "max" FROM "tree_data_daily"')
+    ).fetchall()
+    if not rows:
+        return stats
+    channel = np.array([stats.channels.index(row[0]) for row in rows])
+    count, total, total_sq, low, high = (np.array([row[k] for row in rows], dtype="float64") for k in range(1, 6))
+    mean = total / count
+    # Within one day the sum of squares is small enough to difference safely
+    m2 = np.maximum(total_sq - total * mean, 0.0)
+    for i in range(len(stats.channels)):
+        days = channel == i
+        if not days.any():
+            continue
+        # Chan's update over the days of one channel, reduced in one go
+        n = count[days].sum()
+        channel_mean = (count[days] * mean[days]).sum() / n
+        stats.count[i] = int(n)
+        stats.mean[i] = channel_mean
+        stats.m2[i] = (m2[days] + count[days] * (mean[days] - channel_mean) ** 2).sum()
+        stats.min[i] = low[days].min()
+        stats.max[i] = high[days].max()
+    return stats
+
+
+def record_upload_stats(conn, sha256, stats, overlapped):
+    """
+    Store a loaded file's ``stats`` and fold them into the global ones.
+    ``overlapped`` says some of its readings were already stored.
+    """
+    if conn.dialect.name == "postgresql":
+        conn.execute(text("SELECT pg_advisory_xact_lock(:id)"), {"id": STATS_LOCK_ID})
+    save_stats(conn, stats, upload=sha256)
+    overall = load_stats(conn)
+    if overlapped:
+        first, last = overall.first, overall.last
+        overall = moments_from_rollups(conn)
+        overall.first = np.minimum(first, stats.first)
+        overall.last = np.maximum(last, stats.last)
+    else:
+        overall.merge(stats)
+    save_stats(conn, overall)
+
+
+def rebuild_stats(conn):
+    """Recompute the global statistics from the rollups and tree_data."""
+    overall = moments_from_rollups(conn)
+    for i, channel in enumerate(overall.channels):
+        if not overall.count[i]:
+            continue
+        column = quote(channel)
+        first, last = conn.execute(
+            text(
+                f'SELECT MIN("Timestamp"), MAX("Timestamp") FROM {quote(TREE_DATA_TABLE)} '
+                f"WHERE {column} IS NOT NULL"
+            )
+        ).one()
+        overall.first[i], overall.last[i] = _nanoseconds(first), _nanoseconds(last)
+    save_stats(conn, overall)
@@ -0,0 +1,162 @@
+"""
+Streaming JSON output for tree data.
+
+Rows come off a server-side cursor in batches and are encoded batch by batch,
+so time-to-first-byte and peak memory do not grow with the result size.
+orjson is used when it is installed; the stdlib encoder is the fallback.
+"""
+import json
+
+from django.core.serializers.json import DjangoJSONEncoder
+from sqlalchemy import text
+
+from . import async_engine
+from . import engine as tree_engine
+from .queries import encode_cursor, parse_db_timestamp
+from .timing import phase
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - depends on the environment
+    orjson = None
+
+BATCH_ROWS = 1000
+
+
+def dumps(value):
+    """Encode ``value`` as JSON bytes, with datetimes as ISO 8601 (UTC as Z)."""
+    if orjson is not None:
+        return orjson.dumps(value, option=orjson.OPT_UTC_Z | orjson.OPT_NAIVE_UTC)
+    return json.dumps(value, cls=DjangoJSONEncoder, separators=(",", ":")).encode()
+
+
+def iter_batches(sql, params, batch_size=None):
+    """
+    Run ``sql`` on a pooled connection and yield the column names, then lists
+    of rows.
+
+    Call next() once before handing the generator to a response: that runs
+    the query, so database errors surface while a proper error response can
+    still be sent. The connection goes back to the pool when the generator
+    is exhausted or closed.
+    """
+    with tree_engine.connect() as conn:
+        result = conn.execution_options(stream_results=True).execute(text(sql), params)
+        try:
+            yield list(result.keys())
+            while True:
+                with phase("db"):
+                    rows = result.fetchmany(batch_size or BATCH_ROWS)
+                if not rows:
+                    break
+                yield rows
+        finally:
+            result.close()
+
+
+class _Page:
+    """Encoding and next-cursor bookkeeping shared by json_page and ajson_page."""
+
+    head = b'{"results":['
+
+    def __init__(self, columns, limit, dialect_name):
+        self.columns = columns
+        self.limit = limit
+        self.id_index = columns.index("id")
+        self.timestamp_index = columns.index("Timestamp")
+        # SQLite returns Timestamp as text; PostgreSQL already gives UTC datetimes
+        self.convert = dialect_name == "sqlite"
+        self.sent = 0
+        self.last = None
+        self.has_more = False
+
+    def encode(self, rows):
+        """Encode one batch as a slice of the results array (b"" if empty)."""
+        with phase("encode"):
+            return self._encode(rows)
+
+    def _encode(self, rows):
+        if self.sent + len(rows) > self.limit:
+            self.has_more = True
+            rows = rows[:self.limit - self.sent]
+        if not rows:
+            return b""
+        records = []
+        for row in rows:
+            record = dict(zip(self.columns, row))
+            if self.convert:
+                record["Timestamp"] = parse_db_timestamp(record["Timestamp"])
+            records.append(record)
+        encoded = dumps(records)[1:-1]
+        if self.sent:
+            encoded = b"," + encoded
+        self.sent += len(rows)
+        self.last = rows[-1]
+        return encoded
+
+    def tail(self):
+        next_cursor = None
+        if self.has_more and self.last is not None:
+            next_cursor = encode_cursor(self.last[self.timestamp_index], self.last[self.id_index])
+        return b'],"next":' + dumps(next_cursor) + b"}"
+
+
+def json_page(columns, batches, limit, dialect_name):
+    """
+    Encode up to ``limit`` rows as {"results": [...], "next": cursor}.
+
+    The query is expected to fetch one extra row; if it arrives, ``next``
+    points just past the last row sent.
+    """
+    page = _Page(columns, limit, dialect_name)
+    yield page.head
+    try:
+        for rows in batches:
+            encoded = page.encode(rows)
+            if encoded:
+                yield encoded
+            if page.has_more:
+                break
+    finally:
+        # Return the connection now rather than when the generator is collected
+        batches.close()
+    yield page.tail()
+
+
+def json_rows(columns, rows, dialect_name):
+    """Encode ``rows`` as a JSON array of records, as in a page's results."""
+    return b"[" + _Page(columns, len(rows), dialect_name).encode(rows) + b"]"
+
+
+async def aiter_batches(sql, params, batch_size=None):
+    """iter_batches() on the asyncio engine (async_engine.py)."""
+    async with async_engine.connect() as conn:
+        with phase("db"):
+            result = await conn.stream(text(sql), params)
+        try:
+            yield list(result.keys())
+            partitions = result.partitions(batch_size or BATCH_ROWS).__aiter__()
+            while True:
+                with phase("db"):
+                    rows = await partitions.__anext__()
+                yield rows
+        except StopAsyncIteration:
+            pass
+        finally:
+            await result.close()
+
+
+async def ajson_page(columns, batches, limit, dialect_name):
+    """json_page() over an async iterator of batches."""
+    page = _Page(columns, limit, dialect_name)
+    yield page.head
+    try:
+        async for rows in batches:
+            encoded = page.encode(rows)
+            if encoded:
+                yield encoded
+            if page.has_more:
+                break
+    finally:
+        await batches.aclose()
+    yield page.tail()
@@ -1,6 +1,67 @@
-from django.test import TestCase
+from asgiref.sync import sync_to_async
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.db.models import F
+from django.test import AsyncClient, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.core.management import call_command
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
 from django.contrib.auth.models import User
-from .models import UserProfile
+import asyncio
+import gzip
+import io
+import json
+import os
+import shutil
+import subprocess
+import tempfile
+import time
+import zipfile
+from unittest import mock, skipIf
+import numpy as np
+import pandas as pd
+from datetime import datetime, timedelta, timezone
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # pragma: no cover - depends on the environment
+    pa = pq = None
+from sqlalchemy import text
+from .models import DailyRollup, DataGeneration, HourlyRollup, TreeReading, UploadedFile, UploadJob, UserProfile
+from . import activity
+from . import async_engine
+from . import authentication
+from . import events
+from . import jobs
+from .jobs import claim_next, requeue_stale
+from . import benchmark
+from . import metrics
+from . import partitions
+from . import quality
+from . import cache as tree_cache
+from . import engine as tree_engine
+from . import streaming
+from .bulkload import InsertWriter, get_writer
+from .ingest import FLOAT_COLUMNS, TREE_DATA_COLUMNS, CSVFormatError, read_logger_chunks, read_time_span
+from .quality import QualityChecker
+from .stats import RunningStats
+from .loggerdata import generate_logger_csv
+
+
+def make_logger_csv(rows, start=datetime(2024, 5, 1), missing_every=0):
+    """Build a small logger export: preamble, header, units row, readings."""
+    lines = [f"# logger metadata line {i}" for i in range(29)]
+    lines.append(",".join(["Record"] + TREE_DATA_COLUMNS))
+    lines.append(",".join(["#", "s", "", "C", "hPa", "%", "um", "cm/h", "", "", "", "um"]))
+    for i in range(rows):
+        ts = start + timedelta(minutes=10 * i)
+        values = [i, int(ts.timestamp()), ts.strftime("%Y-%m-%d %H:%M:%S"),
+                  20 + i % 5, 1010.5, 55.25, 1200 + i, 3.5, 4.1, 80, 12, 1200 + i]
+        if missing_every and i % missing_every == 0:
+            values[6] = ""
+        lines.append(",".join(str(v) for v in values))
+    return ("\n".join(lines) + "\n").encode("utf-8")
 
 class UserProfileTestCase(TestCase):
     def setUp(self):
@@ -17,3 +78,1349 @@ class UserProfileTestCase(TestCase):
     def test_user_profile_creation(self):
         self.assertEqual(self.profile.user.username, 'testuser')
         self.assertEqual(self.profile.role, 'viewer')
+
+
+class CachedTokenAuthenticationTestCase(TestCase):
+    def setUp(self):
+        authentication.get_cache().clear()
+        self.admin = User.objects.create_user(username="boss", password="testpass123")
+        UserProfile.objects.create(user=self.admin, role="admin")
+        self.other = User.objects.create_user(username="deputy", password="testpass123")
+        UserProfile.objects.create(user=self.other, role="admin")
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f"Token {Token.objects.create(user=self.admin).key}")
+        self.other_client = APIClient()
+        self.other_client.credentials(HTTP_AUTHORIZATION=f"Token {Token.objects.create(user=self.other).key}")
+
+    @override_settings(AUTH_CACHE_GENERATION_TTL=60)
+    def test_steady_state_costs_no_auth_queries(self):
+        self.assertEqual(self.client.get("/api/db-pool/").status_code, 200)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get("/api/db-pool/").status_code, 200)
+
+    def test_role_change_takes_effect_immediately(self):
+        self.assertEqual(self.other_client.get("/api/db-pool/").status_code, 200)
+        response = self.client.patch(
+            f"/api/profile/update-role/{self.other.id}/", {"role": "viewer"}, format="json"
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.other_client.get("/api/db-pool/").status_code, 403)
+
+    def test_logout_revokes_cached_token(self):
+        self.assertEqual(self.client.get("/api/db-pool/").status_code, 200)
+        self.assertEqual(self.client.post("/api/auth/logout/").status_code, 200)
+        self.assertEqual(self.client.get("/api/db-pool/").status_code, 401)
+
+    def test_cache_holds_only_what_authentication_needs(self):
+        self.assertEqual(self.client.get("/api/db-pool/").status_code, 200)
+        key = Token.objects.get(user=self.admin).key
+        entry = authentication.get_cache().get(authentication._key(key))
+        self.assertEqual(entry["id"], self.admin.id)
+        self.assertEqual(entry["profile"][1], "admin")
+        self.assertNotIn("password", entry)
+        self.assertNotIn(self.admin.password, repr(entry))
+
+    @override_settings(AUTH_CACHE_GENERATION_TTL=0)
+    def test_logout_in_another_worker_revokes_cached_token(self):
+        self.assertEqual(self.client.get("/api/db-pool/").status_code, 200)
+        # What LogoutView does in a worker whose cache is not this one
+        Token.objects.filter(user=self.admin).delete()
+        with connection.cursor() as cursor:
+            cursor.execute(authentication._BUMP_GENERATION, [time.time_ns()])
+        self.assertEqual(self.client.get("/api/db-pool/").status_code, 401)
+
+
+class ActivityBufferTestCase(TestCase):
+    def setUp(self):
+        # Leftovers from other tests point at rows that no longer exist
+        activity.buffer.flush()
+        self.users = []
+        for name in ("ann", "ben"):
+            user = User.objects.create_user(username=name, password="testpass123")
+            UserProfile.objects.create(user=user, role="viewer")
+            self.users.append(user)
+
+    def login(self, client, username):
+        response = client.post("/api/auth/login/", {"username": username, "password": "testpass123"})
+        self.assertEqual(response.status_code, 200)
+        return response.json()["token"]
+
+    def test_login_defers_and_coalesces_profile_writes(self):
+        client = APIClient()
+        with CaptureQueriesContext(connection) as queries:
+            self.login(client, "ann")
+        self.assertFalse([q for q in queries if q["sql"].startswith("UPDATE") and "userprofile" in q["sql"]])
+        first = UserProfile.objects.get(user__username="ann").last_login_time
+        self.assertIsNone(first)
+        token = self.login(client, "ann")
+        client.credentials(HTTP_AUTHORIZATION=f"Token {token}")
+        self.assertEqual(client.post("/api/auth/logout/").status_code, 200)
+        self.assertEqual(len(activity.buffer), 1)
+
+        self.assertEqual(activity.buffer.flush(), 1)
+        profile = UserProfile.objects.get(user__username="ann")
+        self.assertIsNotNone(profile.last_login_time)
+        self.assertGreaterEqual(profile.last_logout_time, profile.last_login_time)
+
+    @override_settings(ACTIVITY_FLUSH_SIZE=2)
+    def test_flushes_after_the_response_at_the_size_threshold(self):
+        self.login(APIClient(), "ann")
+        self.assertEqual(len(activity.buffer), 1)
+        self.login(APIClient(), "ben")
+        self.assertEqual(len(activity.buffer), 0)
+        self.assertEqual(UserProfile.objects.filter(last_login_time__isnull=False).count(), 2)
+        # A login alone must not clear an earlier logout time
+        UserProfile.objects.update(last_logout_time=datetime(2024, 1, 1, tzinfo=timezone.utc))
+        activity.buffer.record(self.users[0].userprofile.id, "last_login_time", datetime.now(timezone.utc))
+        activity.buffer.flush()
+        self.assertIsNotNone(UserProfile.objects.get(user=self.users[0]).last_logout_time)
+
+
+class UserListingTestCase(TestCase):
+    def setUp(self):
+        self.admin = User.objects.create_user(username="boss", password="testpass123")
+        UserProfile.objects.create(user=self.admin, role="admin")
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    def add_users(self, count, role="viewer"):
+        start = User.objects.count()
+        for i in range(start, start + count):
+            user = User.objects.create_user(username=f"user{i:03d}", email=f"user{i}@example.com")
+            UserProfile.objects.create(user=user, role=role)
+
+    def count_queries(self, path):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(path)
+        self.assertEqual(response.status_code, 200)
+        return len(queries)
+
+    def test_page_query_count_does_not_grow_with_users(self):
+        self.add_users(3)
+        counts = [self.count_queries("/api/profiles/"), self.count_queries("/api/users/")]
+        self.add_users(30)
+        self.assertEqual([self.count_queries("/api/profiles/"), self.count_queries("/api/users/")], counts)
+
+    def test_cursor_pages_filters_and_fields(self):
+        self.add_users(5)
+        self.add_users(2, role="researcher")
+        response = self.client.get("/api/profiles/", {"role": "viewer", "page_size": 3, "fields": "id,username"})
+        body = response.json()
+        self.assertEqual(len(body["results"]), 3)
+        self.assertEqual(set(body["results"][0]), {"id", "username"})
+        rest = self.client.get(body["next"]).json()
+        self.assertEqual(len(rest["results"]), 2)
+        self.assertIsNone(rest["next"])
+
+        response = self.client.get("/api/users/", {"username_prefix": "user00", "role": "researcher"})
+        self.assertEqual([u["username"] for u in response.json()["results"]], ["user006", "user007"])
+        self.assertEqual(self.client.get("/api/users/", {"role": "owner"}).status_code, 400)
+        self.assertEqual(self.client.get("/api/users/", {"fields": "password"}).status_code, 400)
+
+
+def streamed_json(response):
+    """Decode a StreamingHttpResponse body."""
+    return json.loads(b"".join(response.streaming_content))
+
+
+class TreeDataEngineTestCase(TestCase):
+    def setUp(self):
+        tree_engine.reset_engine()
+        self.addCleanup(tree_engine.reset_engine)
+
+    def test_engine_is_shared_within_a_process(self):
+        self.assertIs(tree_engine.get_engine(), tree_engine.get_engine())
+
+    def test_engine_is_rebuilt_after_fork(self):
+        parent = tree_engine.get_engine()
+        tree_engine._forget_engine_after_fork()
+        self.assertIsNot(tree_engine.get_engine(), parent)
+        parent.dispose()
+
+    def test_pool_status_counts_checkouts(self):
+        for _ in range(3):
+            with tree_engine.connect() as conn:
+                self.assertEqual(conn.execute(text("SELECT 1")).scalar(), 1)
+        status = tree_engine.pool_status()
+        self.assertEqual(status["checkouts"], 3)
+        self.assertEqual(status["checked_out"], 0)
+        self.assertEqual(status["timeouts"], 0)
+
+
+class LoggerChunkReaderTestCase(TestCase):
+    def test_chunks_match_whole_file_read(self):
+        data = make_logger_csv(25, missing_every=7)
+        chunks = list(read_logger_chunks(io.BytesIO(data), chunk_rows=10))
+        self.assertTrue(all(len(chunk) <= 10 for chunk in chunks))
+        whole = list(read_logger_chunks(io.BytesIO(data), chunk_rows=1000))
+        self.assertEqual(len(whole), 1)
+        combined = pd.concat(chunks)
+        self.assertEqual(list(combined.columns), TREE_DATA_COLUMNS + ["quality"])
+        self.assertEqual(len(combined), 25)
+        self.assertTrue(combined.equals(whole[0]))
+        # Units row is dropped once; values are typed, missing ones are NaN
+        self.assertEqual(combined["Timestamp"].iloc[0], pd.Timestamp("2024-05-01", tz="UTC"))
+        self.assertEqual(combined["Temperature"].dtype, "float64")
+        self.assertTrue(pd.isna(combined["Dendro"].iloc[0]))
+
+    def test_time_span_covers_the_readings(self):
+        data = make_logger_csv(25, start=datetime(2024, 5, 31, 23)) + b"25,0,not a date,21,1,2,3,4,5,6,7,8\n"
+        upload = io.BytesIO(data)
+        first, last = read_time_span(upload, chunk_rows=10)
+        chunks = pd.concat(read_logger_chunks(io.BytesIO(data), chunk_rows=10))
+        self.assertEqual(first, chunks["Timestamp"].min().to_pydatetime())
+        self.assertEqual(last, chunks["Timestamp"].max().to_pydatetime())
+        self.assertEqual(last.month, 6)
+        self.assertEqual(upload.tell(), 0)
+
+    @skipIf(pa is None, "pyarrow is not installed")
+    def test_engines_agree_on_messy_files(self):
+        data = make_logger_csv(20, missing_every=3) + (
+            b"20,0,not a date,21,1,2,3,4,5,6,7,8\n"
+            b"21,0,2024-05-02 03:00:00,21,1,2,,4,5,6,7,8\n"
+            b"22,0,2024-05-02 04:00:00,warm,1,2,3,4,5,6,7,8\n"
+        )
+        frames = {}
+        for engine in ("pyarrow", "pandas"):
+            with self.settings(TREE_DATA_CSV_ENGINE=engine):
+                chunks = list(read_logger_chunks(io.BytesIO(data), chunk_rows=8))
+            self.assertEqual([len(chunk) for chunk in chunks], [8, 8, 6])
+            self.assertEqual(sum(chunk.attrs["rejected"] for chunk in chunks), 1)
+            frames[engine] = pd.concat(chunks)
+        arrow, pandas = frames["pyarrow"], frames["pandas"]
+        self.assertEqual(arrow["Timestamp"].iloc[-1], pd.Timestamp("2024-05-02T04:00:00", tz="UTC"))
+        self.assertTrue(pd.isna(arrow["Temperature"].iloc[-1]))
+        self.assertTrue(pd.isna(arrow["Dendro"].iloc[-2]))
+        self.assertEqual(arrow["Timestamp_Raw"].iloc[0], "1714521600")
+        pd.testing.assert_frame_equal(arrow, pandas, check_dtype=False)
+
+    @skipIf(pa is None, "pyarrow is not installed")
+    def test_truncated_and_overlong_rows(self):
+        with self.settings(TREE_DATA_CSV_ENGINE="pyarrow"):
+            chunks = list(read_logger_chunks(io.BytesIO(make_logger_csv(5) + b"5,0,2024-05-02\n")))
+            self.assertEqual(len(chunks[0]), 5)
+            self.assertEqual(chunks[0].attrs["rejected"], 1)
+            # Past the rows the layout is decided from
+            with mock.patch("dbmodels.ingest.LAYOUT_SAMPLE_ROWS", 3), self.assertRaises(CSVFormatError):
+                list(read_logger_chunks(io.BytesIO(make_logger_csv(5) + b"x," * 40 + b"\n")))
+
+
+@override_settings(TREE_DATA_ASYNC_UPLOADS=False)
+class UploadCSVFileTestCase(TransactionTestCase):
+    def setUp(self):
+        tree_engine.reset_engine()
+        tree_cache.get_cache().clear()
+        self.user = User.objects.create_user(username="uploader", password="testpass123")
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def tearDown(self):
+        tree_engine.reset_engine()
+
+    def upload(self, data, filename="logger.csv", source=None):
+        return self.client.post(
+            "/api/upload-csv/" + (f"?source={source}" if source else ""),
+            data=data,
+            content_type="text/csv",
+            HTTP_CONTENT_DISPOSITION=f'attachment; filename="{filename}"',
+        )
+
+    def count_rows(self):
+        with tree_engine.connect() as conn:
+            return conn.execute(text("SELECT COUNT(*) FROM tree_data")).scalar()
+
+    def test_upload_is_bulk_loaded_in_chunks(self):
+        with self.settings(TREE_DATA_UPLOAD_CHUNK_ROWS=10):
+            response = self.upload(make_logger_csv(35, missing_every=7))
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(response.data["rows"], 35)
+        self.assertEqual(response.data["chunks"], 4)
+        self.assertEqual(response.data["writer"], "insert")
+        self.assertIn("rows_per_second", response.data)
+        self.assertEqual(self.count_rows(), 35)
+        reading = TreeReading.objects.order_by("timestamp").first()
+        self.assertEqual(reading.timestamp, datetime(2024, 5, 1, tzinfo=timezone.utc))
+        # 35 ten-minute readings span six hours of the same day
+        self.assertEqual(HourlyRollup.objects.filter(channel="Temperature").count(), 6)
+        daily = DailyRollup.objects.get(channel="Temperature")
+        self.assertEqual(daily.count, 35)
+        self.assertEqual(daily.sum, sum(20 + i % 5 for i in range(35)))
+        self.assertEqual(reading.temperature, 20.0)
+        self.assertIsNone(TreeReading.objects.get(timestamp=reading.timestamp).dendro)
+
+    def test_rows_without_timestamp_are_rejected(self):
+        data = make_logger_csv(5) + b"5,0,not a date,1,2,3,4,5,6,7,8,9\n"
+        response = self.upload(data)
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(response.data["rows"], 5)
+        self.assertEqual(response.data["rows_rejected"], 1)
+
+    def test_malformed_upload_loads_nothing(self):
+        data = make_logger_csv(30) + b"1,2,3\n" + b"x," * 40 + b"\n"
+        with self.settings(TREE_DATA_UPLOAD_CHUNK_ROWS=10):
+            response = self.upload(data)
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.count_rows(), 0)
+
+    def test_overlapping_and_repeated_uploads_are_deduplicated(self):
+        self.assertEqual(self.upload(make_logger_csv(20), source="logger-a").data["rows_new"], 20)
+        overlapping = make_logger_csv(30)
+        response = self.upload(overlapping, source="logger-a")
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(response.data["rows"], 30)
+        self.assertEqual(response.data["rows_new"], 10)
+        self.assertEqual(response.data["rows_skipped"], 20)
+        self.assertFalse(response.data["duplicate"])
+        self.assertEqual(self.count_rows(), 30)
+        self.assertEqual(DailyRollup.objects.get(channel="Temperature").count, 30)
+
+        # The exact same file again is recognised by its hash
+        response = self.upload(overlapping)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["message"], "CSV already uploaded")
+        self.assertTrue(response.data["duplicate"])
+        self.assertEqual(response.data["source"], "logger-a")
+        self.assertEqual(response.data["rows_skipped"], 30)
+        self.assertEqual(UploadedFile.objects.count(), 2)
+        self.assertEqual(UploadedFile.objects.get(sha256=response.data["sha256"]).rows_new, 10)
+
+        # Another logger may report the same timestamps
+        response = self.upload(make_logger_csv(10), source="logger-b")
+        self.assertEqual(response.data["rows_new"], 10)
+        self.assertEqual(TreeReading.objects.filter(source="logger-b").count(), 10)
+        self.assertEqual(self.count_rows(), 40)
+
+        # ...and a logger moved to another tree keeps both trees' readings
+        response = self.client.post(
+            "/api/upload-csv/?source=logger-b&tree=oak-2",
+            data=make_logger_csv(10, missing_every=2),
+            content_type="text/csv",
+            HTTP_CONTENT_DISPOSITION='attachment; filename="moved.csv"',
+        )
+        self.assertEqual(response.data["rows_new"], 10)
+        self.assertEqual(self.count_rows(), 50)
+
+    def test_unnamed_uploads_are_separate_loggers(self):
+        first = self.upload(make_logger_csv(10))
+        second = self.upload(make_logger_csv(10, missing_every=3))
+        self.assertEqual(first.data["rows_new"], 10)
+        self.assertEqual(second.data["rows_new"], 10)
+        self.assertNotEqual(first.data["source"], second.data["source"])
+        self.assertEqual(first.data["source"], "file-" + first.data["sha256"][:16])
+        self.assertEqual(self.count_rows(), 20)
+
+    def test_upload_invalidates_cached_tree_data(self):
+        self.assertEqual(streamed_json(self.client.get("/api/treeData/"))["results"], [])
+        self.assertEqual(self.client.get("/api/treeData/")["X-Cache"], "HIT")
+        # A failed upload leaves the cache alone
+        self.assertEqual(self.upload(make_logger_csv(3) + b"1,2,3\n" + b"x," * 40 + b"\n").status_code, 400)
+        self.assertEqual(self.client.get("/api/treeData/")["X-Cache"], "HIT")
+        self.assertEqual(self.upload(make_logger_csv(3)).status_code, 200)
+        response = self.client.get("/api/treeData/")
+        self.assertEqual(response["X-Cache"], "MISS")
+        self.assertEqual(len(streamed_json(response)["results"]), 3)
+
+    def test_uploads_are_labelled_and_filtered_by_tree(self):
+        self.assertEqual(self.upload(make_logger_csv(10), source="logger-a").status_code, 200)
+        response = self.client.post(
+            "/api/upload-csv/?source=logger-b&tree=oak-1",
+            data=make_logger_csv(4),
+            content_type="text/csv",
+            HTTP_CONTENT_DISPOSITION='attachment; filename="oak.csv"',
+        )
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(TreeReading.objects.filter(tree="oak-1", source="logger-b").count(), 4)
+        rows = streamed_json(self.client.get("/api/treeData/", {"tree": "oak-1"}))["results"]
+        self.assertEqual(len(rows), 4)
+        self.assertEqual(len(streamed_json(self.client.get("/api/treeData/"))["results"]), 14)
+        self.assertEqual(self.client.get("/api/treeData/", {"tree": "x" * 65}).status_code, 400)
+
+    def test_quality_flags_are_stored_and_filtered(self):
+        data = make_logger_csv(5) + b"5,0,2024-05-01 00:50:00,99,1010.5,55.25,1205,3.5,4.1,80,12,1205\n"
+        self.assertEqual(self.upload(data).status_code, 200)
+        self.assertEqual(TreeReading.objects.get(temperature=99.0).quality, quality.TEMPERATURE_RANGE)
+        good = streamed_json(self.client.get("/api/treeData/", {"quality": "good"}))["results"]
+        self.assertEqual(len(good), 5)
+        self.assertTrue(all(row["quality"] == 0 for row in good))
+        flagged = streamed_json(self.client.get("/api/treeData/", {"quality": "temperature_range"}))["results"]
+        self.assertEqual([row["Temperature"] for row in flagged], [99.0])
+        rows = streamed_json(self.client.get("/api/treeData/", {"quality": "-stuck_sensor,-temperature_range"}))
+        self.assertEqual(len(rows["results"]), 5)
+        self.assertEqual(self.client.get("/api/treeData/", {"quality": "bogus"}).status_code, 400)
+        self.assertEqual(self.client.get("/api/treeData/", {"quality": "-stuck_sensor,dendro_spike"}).status_code, 400)
+        body = self.client.get("/api/treeData/aggregate/", {
+            "bucket": "1h", "fields": "Temperature", "quality": "good",
+        }).json()
+        self.assertEqual(body["series"]["Temperature"]["max"], [24.0])
+
+    def test_partitions_are_created_before_the_load_transaction(self):
+        created = []
+
+        def create_partitions(first, last):
+            # Committed before the load opens its transaction
+            created.append((first, last, self.count_rows()))
+
+        with mock.patch("dbmodels.loader.partitioned", return_value=True), \
+                mock.patch("dbmodels.loader.create_partitions", side_effect=create_partitions):
+            response = self.upload(make_logger_csv(20, start=datetime(2024, 5, 31, 23)))
+        self.assertEqual(response.status_code, 200, response.content)
+        [(first, last, rows_then)] = created
+        self.assertEqual((first.month, last.month), (5, 6))
+        self.assertEqual(rows_then, 0)
+        self.assertEqual(self.count_rows(), 20)
+
+    def test_month_bounds_and_partitions(self):
+        first = datetime(2023, 11, 20, tzinfo=timezone.utc)
+        last = datetime(2024, 1, 1, tzinfo=timezone.utc)
+        bounds = list(partitions.month_bounds(first, last))
+        self.assertEqual([partitions.partition_name(start) for start, _ in bounds],
+                         ["tree_data_2023_11", "tree_data_2023_12", "tree_data_2024_01"])
+        self.assertEqual(bounds[1][1], datetime(2024, 1, 1, tzinfo=timezone.utc))
+        # SQLite keeps tree_data as a single table
+        with tree_engine.connect() as conn:
+            self.assertEqual(partitions.ensure_partitions(conn, first, last), [])
+
+    def test_uploads_keep_channel_stats(self):
+        self.assertEqual(self.upload(make_logger_csv(20, missing_every=4), source="logger-a").status_code, 200)
+        # Overlaps the first file: its 20 shared readings must not count twice
+        response = self.upload(make_logger_csv(30, missing_every=4), source="logger-a")
+        self.assertEqual(response.data["rows_new"], 10)
+        stored = pd.DataFrame(TreeReading.objects.values("timestamp", "temperature", "dendro"))
+        body = self.client.get("/api/treeData/stats/", {"fields": "Temperature,Dendro"}).json()
+        self.assertEqual(list(body["channels"]), ["Temperature", "Dendro"])
+        dendro = body["channels"]["Dendro"]
+        self.assertEqual(dendro["count"], stored["dendro"].count())
+        self.assertAlmostEqual(dendro["mean"], stored["dendro"].mean())
+        self.assertAlmostEqual(dendro["stddev"], stored["dendro"].std())
+        self.assertEqual(dendro["min"], stored["dendro"].min())
+        self.assertEqual(dendro["max"], stored["dendro"].max())
+        self.assertEqual(dendro["first"], "2024-05-01T00:10:00Z")
+        self.assertEqual(body["last_timestamp"], "2024-05-01T04:50:00Z")
+
+        # Per upload, and after a rebuild from scratch
+        upload = self.client.get("/api/treeData/stats/", {"upload": response.data["sha256"]}).json()
+        self.assertEqual(upload["channels"]["Temperature"]["count"], 30)
+        call_command("rebuild_tree_data_rollups", stdout=io.StringIO())
+        rebuilt = self.client.get("/api/treeData/stats/", {"fields": "Temperature,Dendro"}).json()
+        self.assertEqual(rebuilt["channels"]["Dendro"]["count"], dendro["count"])
+        self.assertAlmostEqual(rebuilt["channels"]["Dendro"]["stddev"], dendro["stddev"])
+        self.assertEqual(rebuilt["channels"]["Dendro"]["first"], dendro["first"])
+
+        self.assertEqual(self.client.get("/api/treeData/stats/", {"start": "2024-05-01"}).status_code, 400)
+        self.assertEqual(self.client.get("/api/treeData/stats/", {"upload": "0" * 64}).status_code, 404)
+        # Answered from tree_data_stats alone
+        with tree_engine.begin() as conn:
+            conn.execute(text("DELETE FROM tree_data"))
+        self.assertEqual(self.client.get("/api/treeData/stats/").json()["channels"]["Dendro"], dendro)
+
+    def test_writer_selection(self):
+        with tree_engine.connect() as conn:
+            self.assertIsInstance(get_writer(conn), InsertWriter)
+            with self.settings(TREE_DATA_BULK_WRITER="bogus"):
+                with self.assertRaises(ValueError):
+                    get_writer(conn)
+
+
+class QualityFlagsTestCase(TestCase):
+    def test_rules_flag_readings_across_chunks(self):
+        start = datetime(2024, 5, 1, tzinfo=timezone.utc)
+        frame = pd.DataFrame({
+            "Timestamp": pd.date_range(start, periods=30, freq="10min"),
+            "Temperature": np.arange(30, dtype="float64"),
+            "Humidity": np.full(30, 60.0),
+            "Dendro": 1200 + np.arange(30) * 0.5,
+            "Sapflow": np.linspace(0, 3, 30),
+            "SF_Signal": np.full(30, 80.0),
+            "SF_Noise": np.full(30, 12.0),
+        })
+        frame.loc[3, "Temperature"] = 75.0
+        frame.loc[4, "Humidity"] = 104.0
+        frame.loc[5, "SF_Signal"] = 20.0
+        frame.loc[6, "Dendro"] = 1300.0
+        # Stuck from row 10: flagged once the run reaches STUCK_RUN (12) readings
+        frame.loc[10:, "Temperature"] = 18.5
+        checker = QualityChecker()
+        flags = np.concatenate([checker.check(frame.iloc[i:i + 8]) for i in range(0, 30, 8)])
+        self.assertEqual(flags[3], quality.TEMPERATURE_RANGE)
+        self.assertEqual(flags[4], quality.HUMIDITY_RANGE)
+        self.assertEqual(flags[5], quality.SAPFLOW_SIGNAL)
+        # The jump up and the jump back down
+        self.assertEqual(flags[6], quality.DENDRO_SPIKE)
+        self.assertEqual(flags[7], quality.DENDRO_SPIKE)
+        self.assertEqual(list(np.flatnonzero(flags == quality.STUCK_SENSOR)), list(range(21, 30)))
+        self.assertEqual(flags[:3].tolist(), [0, 0, 0])
+        np.testing.assert_array_equal(flags, QualityChecker().check(frame))
+
+    def test_sap_flow_at_rest_overnight_is_not_stuck(self):
+        start = datetime(2024, 5, 1, 20, tzinfo=timezone.utc)
+        # Twelve hours of 10-minute readings: no flow from 21:00 to 05:00
+        sapflow = np.full(72, 1.5) + np.arange(72) * 0.01
+        sapflow[6:54] = 0.0
+        frame = pd.DataFrame({
+            "Timestamp": pd.date_range(start, periods=72, freq="10min"),
+            "Temperature": 15 + np.arange(72) * 0.05,
+            "Humidity": np.full(72, 70.0),
+            "Dendro": 1200 + np.arange(72) * 0.1,
+            "Sapflow": sapflow,
+            "SF_Signal": np.full(72, 80.0),
+            "SF_Noise": np.full(72, 12.0),
+        })
+        flags = QualityChecker().check(frame)
+        self.assertEqual(flags.tolist(), [0] * 72)
+        # A sensor stuck at a non-zero flow is still caught
+        frame.loc[60:, "Sapflow"] = 2.0
+        flags = QualityChecker().check(frame)
+        self.assertEqual(list(np.flatnonzero(flags == quality.STUCK_SENSOR)), [71])
+
+
+class RunningStatsTestCase(TestCase):
+    def test_chunked_moments_match_numpy(self):
+        rng = np.random.default_rng(0)
+        values = rng.normal(1013.0, 2.0, size=1000)
+        values[::7] = np.nan
+        frame = pd.DataFrame({channel: values for channel in FLOAT_COLUMNS})
+        frame["Timestamp"] = pd.date_range("2024-05-01", periods=1000, freq="10min", tz="UTC")
+        stats = RunningStats()
+        for start in range(0, 1000, 300):
+            part = RunningStats()
+            part.update(frame.iloc[start:start + 300])
+            stats.merge(part)
+        summary = stats.as_dict()["Pressure"]
+        self.assertEqual(summary["count"], int((~np.isnan(values)).sum()))
+        self.assertAlmostEqual(summary["mean"], np.nanmean(values))
+        self.assertAlmostEqual(summary["stddev"], np.nanstd(values, ddof=1))
+        self.assertEqual(summary["max"], np.nanmax(values))
+        self.assertEqual(summary["first"], "2024-05-01T00:10:00Z")
+
+
+class UploadCSVBatchTestCase(TransactionTestCase):
+    def setUp(self):
+        tree_engine.reset_engine()
+        self.user = User.objects.create_user(username="uploader", password="testpass123")
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def tearDown(self):
+        tree_engine.reset_engine()
+
+    def post(self, *files, **data):
+        return self.client.post(
+            "/api/upload-csv/batch/", {"files": list(files), **data}, format="multipart"
+        )
+
+    @override_settings(TREE_DATA_ASYNC_UPLOADS=False, TREE_DATA_UPLOAD_CHUNK_ROWS=10)
+    def test_files_and_archives_are_loaded_with_per_file_results(self):
+        archive = io.BytesIO()
+        with zipfile.ZipFile(archive, "w") as zf:
+            zf.writestr("oak/june.csv", make_logger_csv(12, start=datetime(2024, 6, 1)))
+            zf.writestr("oak/may.csv", make_logger_csv(30))
+            zf.writestr("__MACOSX/oak/._june.csv", b"junk")
+        response = self.post(
+            SimpleUploadedFile("may.csv", make_logger_csv(25)),
+            SimpleUploadedFile("broken.csv", make_logger_csv(3) + b"1,2,3\n" + b"x," * 40 + b"\n"),
+            SimpleUploadedFile("campaign.zip", archive.getvalue()),
+            SimpleUploadedFile("notes.txt", b"hello"),
+            SimpleUploadedFile("may-again.csv", make_logger_csv(25)),
+            manifest=json.dumps({
+                "may.csv": {"source": "logger-a", "tree": "oak-1"},
+                "campaign.zip/oak/may.csv": {"source": "logger-a", "tree": "oak-1"},
+            }),
+        )
+        self.assertEqual(response.status_code, 200, response.content)
+        results = {r["file"]: r for r in response.data["files"]}
+        self.assertEqual(
+            list(results),
+            ["may.csv", "broken.csv", "campaign.zip/oak/june.csv", "campaign.zip/oak/may.csv",
+             "notes.txt", "may-again.csv"],
+        )
+        self.assertEqual(results["may.csv"]["status"], "loaded")
+        self.assertEqual(results["may.csv"]["chunks"], 3)
+        self.assertIn("seconds", results["may.csv"])
+        self.assertEqual(results["broken.csv"]["status"], "failed")
+        self.assertTrue(results["broken.csv"]["error"])
+        self.assertEqual(results["campaign.zip/oak/june.csv"]["rows_new"], 12)
+        # Files the manifest leaves out are loggers of their own
+        self.assertTrue(results["campaign.zip/oak/june.csv"]["source"].startswith("file-"))
+        self.assertEqual(results["campaign.zip/oak/may.csv"]["tree"], "oak-1")
+        self.assertEqual(results["notes.txt"]["error"], "File is not CSV type")
+        self.assertEqual(results["may-again.csv"]["duplicate_of"], "may.csv")
+        # may.csv and oak/may.csv are one logger and overlap in their first 25 readings
+        may = results["may.csv"]["rows_new"] + results["campaign.zip/oak/may.csv"]["rows_new"]
+        self.assertEqual(may, 30)
+        totals = response.data["totals"]
+        self.assertEqual((totals["loaded"], totals["duplicate"], totals["failed"]), (3, 1, 2))
+        self.assertEqual(totals["rows_new"], 42)
+        self.assertEqual(TreeReading.objects.count(), 42)
+        self.assertEqual(UploadedFile.objects.filter(filename="campaign.zip/oak/may.csv").count(), 1)
+
+        # The whole batch again loads nothing
+        response = self.post(SimpleUploadedFile("campaign.zip", archive.getvalue()))
+        self.assertEqual(response.data["totals"]["duplicate"], 2)
+        self.assertEqual(TreeReading.objects.count(), 42)
+
+    def test_files_are_queued_as_upload_jobs(self):
+        archive = io.BytesIO()
+        with zipfile.ZipFile(archive, "w") as zf:
+            zf.writestr("oak/may.csv", make_logger_csv(30))
+            zf.writestr("elm/may.csv", make_logger_csv(30))
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        with self.settings(MEDIA_ROOT=media_root, TREE_DATA_ASYNC_UPLOADS=True):
+            response = self.post(
+                SimpleUploadedFile("campaign.zip", archive.getvalue()),
+                SimpleUploadedFile("oak-june.csv", make_logger_csv(12, start=datetime(2024, 6, 1))),
+                manifest=json.dumps({
+                    "campaign.zip/oak/may.csv": {"source": "oak-logger", "tree": "oak"},
+                    "oak-june.csv": {"source": "oak-logger", "tree": "oak"},
+                }),
+                tree="park",
+            )
+            self.assertEqual(response.status_code, 202, response.content)
+            self.assertEqual(response.data["totals"]["queued"], 2)
+            self.assertEqual(TreeReading.objects.count(), 0)
+            results = response.data["files"]
+            self.assertEqual(
+                [r["file"] for r in results],
+                ["campaign.zip/oak/may.csv", "campaign.zip/elm/may.csv", "oak-june.csv"],
+            )
+            # The elm file has the same content as the oak one
+            self.assertEqual(results[1]["status"], "duplicate")
+            job = self.client.get(results[0]["status_url"]).json()
+            self.assertEqual(
+                (job["filename"], job["source"], job["tree"], job["status"]),
+                ("campaign.zip/oak/may.csv", "oak-logger", "oak", "queued"),
+            )
+            call_command("process_upload_jobs", "--once", "--workers", "0", stdout=io.StringIO())
+        self.assertEqual(TreeReading.objects.filter(source="oak-logger", tree="oak").count(), 42)
+
+    def test_loggers_are_named_per_file(self):
+        csv = SimpleUploadedFile("may.csv", make_logger_csv(5))
+        self.assertEqual(self.post(csv, source="logger-a").status_code, 400)
+        csv.seek(0)
+        response = self.post(csv, manifest=json.dumps({"june.csv": {"source": "logger-a"}}))
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("june.csv", response.data["error"])
+        self.assertEqual(TreeReading.objects.count(), 0)
+
+    def test_oversized_batch_is_rejected(self):
+        with self.settings(TREE_DATA_BATCH_MAX_BYTES=1000):
+            response = self.post(SimpleUploadedFile("may.csv", make_logger_csv(25)))
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(TreeReading.objects.count(), 0)
+
+
+class UploadJobTestCase(TransactionTestCase):
+    def setUp(self):
+        tree_engine.reset_engine()
+        self.media_root = tempfile.mkdtemp()
+        self.settings_override = override_settings(
+            MEDIA_ROOT=self.media_root, TREE_DATA_ASYNC_UPLOADS=True
+        )
+        self.settings_override.enable()
+        self.user = User.objects.create_user(username="uploader", password="testpass123")
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def tearDown(self):
+        self.settings_override.disable()
+        shutil.rmtree(self.media_root)
+        tree_engine.reset_engine()
+
+    def upload(self, data):
+        return self.client.post(
+            "/api/upload-csv/",
+            data=data,
+            content_type="text/csv",
+            HTTP_CONTENT_DISPOSITION='attachment; filename="logger.csv"',
+        )
+
+    def process_jobs(self):
+        call_command("process_upload_jobs", "--once", "--workers", "0", stdout=io.StringIO())
+
+    def test_upload_is_queued_and_loaded_by_worker(self):
+        response = self.upload(make_logger_csv(25, missing_every=5))
+        self.assertEqual(response.status_code, 202, response.content)
+        status_url = response.data["status_url"]
+        self.assertEqual(response["Location"], status_url)
+        self.assertEqual(TreeReading.objects.count(), 0)
+
+        job = self.client.get(status_url).json()
+        self.assertEqual(job["status"], "queued")
+        self.assertEqual(job["username"], "uploader")
+
+        with self.settings(TREE_DATA_UPLOAD_CHUNK_ROWS=10):
+            self.process_jobs()
+        job = self.client.get(status_url).json()
+        self.assertEqual(job["status"], "succeeded")
+        self.assertEqual(job["rows_parsed"], 25)
+        self.assertEqual(job["rows_loaded"], 25)
+        self.assertEqual(job["chunks"], 3)
+        self.assertIsNotNone(job["rows_per_second"])
+        self.assertEqual(TreeReading.objects.count(), 25)
+        # The stored file is removed once its rows are loaded
+        self.assertFalse(UploadJob.objects.get(id=job["id"]).file)
+
+    def test_failed_job_reports_error(self):
+        response = self.upload(b"not,a,logger\n1,2,3\n")
+        with self.assertLogs("dbmodels.jobs", "ERROR"):
+            self.process_jobs()
+        job = self.client.get(response.data["status_url"]).json()
+        self.assertEqual(job["status"], "failed")
+        self.assertTrue(job["error"])
+        self.assertEqual(TreeReading.objects.count(), 0)
+
+    def test_unknown_job(self):
+        self.assertEqual(self.client.get("/api/upload-jobs/999/").status_code, 404)
+
+    def test_jobs_are_visible_to_their_uploader_and_admins(self):
+        status_url = self.upload(make_logger_csv(5)).data["status_url"]
+        other = User.objects.create_user(username="other", password="testpass123")
+        self.client.force_authenticate(other)
+        self.assertEqual(self.client.get(status_url).status_code, 404)
+        UserProfile.objects.update_or_create(user=other, defaults={"role": "admin"})
+        other.refresh_from_db()
+        self.assertEqual(self.client.get(status_url).status_code, 200)
+
+    def test_stale_running_jobs_are_requeued_then_failed(self):
+        job_id = self.upload(make_logger_csv(5)).data["job_id"]
+        self.assertEqual(claim_next(), job_id)
+        # The worker died mid-load
+        long_ago = datetime.now(timezone.utc) - timedelta(hours=1)
+        UploadJob.objects.filter(id=job_id).update(heartbeat_at=long_ago)
+        self.assertEqual(requeue_stale(exclude=[job_id]), (0, 0))
+        with self.assertLogs("dbmodels.jobs", "WARNING"):
+            self.assertEqual(requeue_stale(), (1, 0))
+        self.assertEqual(UploadJob.objects.get(id=job_id).status, "queued")
+
+        for _ in range(jobs.MAX_ATTEMPTS - 1):
+            self.assertEqual(claim_next(), job_id)
+            UploadJob.objects.filter(id=job_id).update(heartbeat_at=long_ago)
+            with self.assertLogs("dbmodels.jobs", "WARNING"):
+                requeue_stale()
+        job = UploadJob.objects.get(id=job_id)
+        self.assertEqual(job.status, "failed")
+        self.assertEqual(job.attempts, jobs.MAX_ATTEMPTS)
+        self.assertTrue(job.error)
+
+
+class MigrateTreeDataTextTestCase(TransactionTestCase):
+    def setUp(self):
+        tree_engine.reset_engine()
+        columns = ", ".join(f'"{c}" TEXT' for c in TREE_DATA_COLUMNS)
+        placeholders = ", ".join(f":{i}" for i in range(len(TREE_DATA_COLUMNS)))
+        rows = [
+            ["1714521600", "2024-05-01 00:00:00", "21.5", "1010", "55", "NULL_MISSING",
+             "3.1", "4", "80", "12", "1200", ],
+            ["1714522200", "NULL_MISSING", "21.7", "1010", "55", "1201", "3.2", "4",
+             "80", "12", "1201"],
+        ]
+        with tree_engine.begin() as conn:
+            conn.exec_driver_sql(f"CREATE TABLE tree_data_legacy ({columns})")
+            conn.execute(
+                text(f"INSERT INTO tree_data_legacy VALUES ({placeholders})"),
+                [{str(i): v for i, v in enumerate(row)} for row in rows],
+            )
+
+    def tearDown(self):
+        with tree_engine.begin() as conn:
+            conn.exec_driver_sql("DROP TABLE IF EXISTS tree_data_legacy")
+        tree_engine.reset_engine()
+
+    def test_text_rows_are_typed_and_copied(self):
+        call_command("migrate_tree_data_text", "--drop-legacy", stdout=io.StringIO())
+        reading = TreeReading.objects.get()
+        self.assertEqual(reading.temperature, 21.5)
+        self.assertIsNone(reading.dendro)
+        self.assertEqual(reading.timestamp_raw, "1714521600")
+        with tree_engine.connect() as conn:
+            self.assertFalse(conn.dialect.has_table(conn, "tree_data_legacy"))
+
+    def test_readings_from_several_loggers_are_all_kept(self):
+        rows = []
+        for minute in range(3):
+            ts = datetime(2024, 5, 2, 0, 10 * minute)
+            for dendro in ("1300", "1400"):
+                rows.append([str(int(ts.timestamp())), ts.strftime("%Y-%m-%d %H:%M:%S"), "20", "1010",
+                             "55", dendro, "3", "4", "80", "12", dendro])
+        # The same file uploaded twice is one set of readings
+        rows.append(rows[-1])
+        placeholders = ", ".join(f":{i}" for i in range(len(TREE_DATA_COLUMNS)))
+        with tree_engine.begin() as conn:
+            conn.execute(
+                text(f"INSERT INTO tree_data_legacy VALUES ({placeholders})"),
+                [{str(i): v for i, v in enumerate(row)} for row in rows],
+            )
+        out = io.StringIO()
+        call_command("migrate_tree_data_text", "--chunk-rows", "3", stdout=out)
+        copied = TreeReading.objects.filter(timestamp__gte=datetime(2024, 5, 2, tzinfo=timezone.utc))
+        self.assertEqual(copied.count(), 6)
+        self.assertEqual(set(copied.values_list("source", flat=True)), {"legacy-1", "legacy-2"})
+        self.assertEqual(copied.filter(source="legacy-2", dendro=1400).count(), 3)
+        self.assertIn("Migrated 7 rows", out.getvalue())
+        self.assertIn("1 identical duplicates", out.getvalue())
+
+    def test_partitions_are_created_before_the_copy(self):
+        command = "dbmodels.management.commands.migrate_tree_data_text"
+        with mock.patch(f"{command}.partitioned", return_value=True), \
+                mock.patch(f"{command}.create_partitions") as create:
+            create.side_effect = lambda first, last: self.assertFalse(TreeReading.objects.exists())
+            call_command("migrate_tree_data_text", "--chunk-rows", "1", stdout=io.StringIO())
+        # The second legacy row has no usable timestamp
+        create.assert_called_once()
+        first, last = create.call_args.args
+        self.assertEqual(first, last)
+        self.assertEqual(first, datetime(2024, 5, 1, tzinfo=timezone.utc))
+        self.assertTrue(TreeReading.objects.exists())
+
+
+class TreeDataTestCase(TransactionTestCase):
+    def setUp(self):
+        tree_engine.reset_engine()
+        tree_cache.get_cache().clear()
+        self.user = User.objects.create_user(username="reader", password="testpass123")
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        start = datetime(2024, 5, 1, tzinfo=timezone.utc)
+        # Pairs of readings from two loggers share a timestamp to exercise
+        # the id tie-breaker
+        TreeReading.objects.bulk_create(
+            TreeReading(
+                source=f"logger-{i % 2}",
+                timestamp=start + timedelta(minutes=10 * (i // 2)),
+                temperature=20 + i,
+                sapflow=float(i),
+                dendro=1200.0 + i,
+            )
+            for i in range(25)
+        )
+
+    def tearDown(self):
+        tree_engine.reset_engine()
+
+    def test_cursor_pagination_walks_every_row_once(self):
+        seen = []
+        pages = 0
+        response = self.client.get("/api/treeData/", {"limit": 10})
+        while True:
+            self.assertEqual(response.status_code, 200)
+            body = streamed_json(response)
+            pages += 1
+            seen.extend(row["id"] for row in body["results"])
+            if body["next"] is None:
+                break
+            response = self.client.get("/api/treeData/", {"limit": 10, "cursor": body["next"]})
+        self.assertEqual(pages, 3)
+        expected = list(TreeReading.objects.order_by("timestamp", "id").values_list("id", flat=True))
+        self.assertEqual(seen, expected)
+
+    def test_body_is_streamed_in_batches(self):
+        with mock.patch.object(streaming, "BATCH_ROWS", 4):
+            response = self.client.get("/api/treeData/", {"limit": 10})
+            self.assertTrue(response.streaming)
+            chunks = list(response.streaming_content)
+        # Envelope opening, three batches (4 + 4 + 2 rows), closing with the cursor
+        self.assertEqual(len(chunks), 5)
+        body = json.loads(b"".join(chunks))
+        self.assertEqual(len(body["results"]), 10)
+        self.assertEqual(body["results"][0]["Timestamp"], "2024-05-01T00:00:00Z")
+        self.assertIsNotNone(body["next"])
+
+    def test_stdlib_encoder_matches_orjson(self):
+        fast = streamed_json(self.client.get("/api/treeData/", {"limit": 5}))
+        tree_cache.get_cache().clear()
+        with mock.patch.object(streaming, "orjson", None):
+            slow = streamed_json(self.client.get("/api/treeData/", {"limit": 5}))
+        self.assertEqual(fast, slow)
+
+    def test_invalid_cursor_is_rejected(self):
+        response = self.client.get("/api/treeData/", {"cursor": "not-a-cursor"})
+        self.assertEqual(response.status_code, 400)
+
+    def test_time_range_and_fields_are_pushed_down(self):
+        response = self.client.get("/api/treeData/", {
+            "start": "2024-05-01T00:20:00Z",
+            "end": "2024-05-01T00:40:00",
+            "fields": "Sapflow,Dendro",
+        })
+        self.assertEqual(response.status_code, 200)
+        rows = streamed_json(response)["results"]
+        self.assertEqual([row["Sapflow"] for row in rows], [4.0, 5.0, 6.0, 7.0])
+        self.assertEqual(set(rows[0]), {"id", "Timestamp", "Dendro", "Sapflow"})
+
+    def test_unknown_field_is_rejected(self):
+        response = self.client.get("/api/treeData/", {"fields": "Sapflow,password"})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("password", response.json()["error"])
+
+    def test_repeated_query_is_cached_with_etag(self):
+        first = self.client.get("/api/treeData/", {"limit": 5, "fields": "Sapflow"})
+        body = b"".join(first.streaming_content)
+        self.assertEqual(first["X-Cache"], "MISS")
+        # Same query, parameters spelled differently
+        second = self.client.get("/api/treeData/", {"fields": "Sapflow,Sapflow", "limit": "5"})
+        self.assertEqual(second["X-Cache"], "HIT")
+        self.assertEqual(second.content, body)
+        self.assertEqual(second["Content-Type"], "application/json")
+        etag = second["ETag"]
+        # The response that filled the cache had the same ETag
+        self.assertEqual(first["ETag"], etag)
+
+        with mock.patch.object(tree_engine, "connect") as connect:
+            not_modified = self.client.get(
+                "/api/treeData/", {"limit": 5, "fields": "Sapflow"}, HTTP_IF_NONE_MATCH=etag
+            )
+        connect.assert_not_called()
+        self.assertEqual(not_modified.status_code, 304)
+        self.assertEqual(not_modified.content, b"")
+        self.assertEqual(not_modified["ETag"], etag)
+
+        # Other formats are cached separately
+        csv = self.client.get("/api/treeData/", {"limit": 5, "fields": "Sapflow", "format": "csv"})
+        self.assertEqual(csv["X-Cache"], "MISS")
+        b"".join(csv.streaming_content)
+
+        tree_cache.bump_generation()
+        changed = self.client.get(
+            "/api/treeData/", {"limit": 5, "fields": "Sapflow"}, HTTP_IF_NONE_MATCH=etag
+        )
+        self.assertEqual(changed.status_code, 200)
+        self.assertEqual(changed["X-Cache"], "MISS")
+        self.assertEqual(b"".join(changed.streaming_content), body)
+
+    def test_large_bodies_are_not_cached(self):
+        def fetch(params):
+            response = self.client.get("/api/treeData/", params)
+            if response.streaming:
+                b"".join(response.streaming_content)
+            return response["X-Cache"]
+
+        with self.settings(TREE_DATA_CACHE_MAX_BYTES=300):
+            self.assertEqual(fetch({}), "MISS")
+            self.assertEqual(fetch({}), "MISS")
+            self.assertEqual(fetch({"limit": 1}), "MISS")
+            self.assertEqual(fetch({"limit": 1}), "HIT")
+            # Bodies too large to keep still answer If-None-Match
+            large = self.client.get("/api/treeData/")
+            b"".join(large.streaming_content)
+            etag = large["ETag"]
+            self.assertEqual(self.client.get("/api/treeData/", HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+    @override_settings(TREE_DATA_CACHE_GENERATION_TTL=0)
+    def test_upload_in_another_process_invalidates(self):
+        def fetch():
+            response = self.client.get("/api/treeData/", {"limit": 5})
+            if response.streaming:
+                b"".join(response.streaming_content)
+            return response["X-Cache"]
+
+        tree_cache.bump_generation()
+        self.assertEqual(fetch(), "MISS")
+        self.assertEqual(fetch(), "HIT")
+        # What process_upload_jobs does after loading a file
+        DataGeneration.objects.filter(id=1).update(value=F("value") + 1)
+        self.assertEqual(fetch(), "MISS")
+
+    @skipIf(pa is None, "pyarrow is not installed")
+    def test_arrow_export_via_format_parameter(self):
+        response = self.client.get("/api/treeData/", {"format": "arrow", "fields": "Sapflow"})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["Content-Type"], "application/vnd.apache.arrow.stream")
+        table = pa.ipc.open_stream(b"".join(response.streaming_content)).read_all()
+        self.assertEqual(table.num_rows, 25)
+        self.assertEqual(table.column_names, ["id", "Timestamp", "Sapflow"])
+        self.assertEqual(table.schema.field("Sapflow").type, pa.float64())
+        self.assertEqual(table.column("Sapflow").to_pylist(), [float(i) for i in range(25)])
+
+    @skipIf(pa is None, "pyarrow is not installed")
+    def test_parquet_export_via_accept_header(self):
+        with mock.patch.object(streaming, "BATCH_ROWS", 10):
+            response = self.client.get(
+                "/api/treeData/", {"limit": 12}, HTTP_ACCEPT="application/vnd.apache.parquet"
+            )
+            body = b"".join(response.streaming_content)
+        self.assertEqual(response.status_code, 200)
+        parquet = pq.ParquetFile(io.BytesIO(body))
+        self.assertEqual(parquet.metadata.num_rows, 12)
+        self.assertEqual(parquet.metadata.num_row_groups, 2)
+        timestamps = parquet.read().column("Timestamp").to_pylist()
+        self.assertEqual(timestamps[0], datetime(2024, 5, 1, tzinfo=timezone.utc))
+
+    def test_csv_export_is_gzipped(self):
+        response = self.client.get("/api/treeData/", {"format": "csv", "fields": "Dendro"})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["Content-Encoding"], "gzip")
+        frame = pd.read_csv(io.BytesIO(gzip.decompress(b"".join(response.streaming_content))))
+        self.assertEqual(list(frame.columns), ["id", "Timestamp", "Dendro"])
+        self.assertEqual(len(frame), 25)
+        self.assertEqual(frame["Timestamp"][0], "2024-05-01T00:00:00+00:00")
+
+    def test_export_errors_are_json(self):
+        response = self.client.get("/api/treeData/", {"format": "csv", "fields": "password"})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response["Content-Type"], "application/json")
+        self.assertIn("password", response.json()["error"])
+
+
+class TreeDataAggregateTestCase(TransactionTestCase):
+    def setUp(self):
+        tree_engine.reset_engine()
+        self.user = User.objects.create_user(username="charts", password="testpass123")
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        start = datetime(2024, 5, 1, tzinfo=timezone.utc)
+        # Two hours of 10-minute readings: Temperature 0..11, Sapflow missing at :00
+        TreeReading.objects.bulk_create(
+            TreeReading(
+                timestamp=start + timedelta(minutes=10 * i),
+                temperature=float(i),
+                sapflow=None if i % 6 == 0 else float(i),
+            )
+            for i in range(12)
+        )
+        call_command("rebuild_tree_data_rollups", stdout=io.StringIO())
+
+    def tearDown(self):
+        tree_engine.reset_engine()
+
+    def test_hourly_bucket_stats(self):
+        response = self.client.get("/api/treeData/aggregate/", {
+            "bucket": "1h", "fields": "Temperature,Sapflow",
+        })
+        self.assertEqual(response.status_code, 200, response.content)
+        body = response.json()
+        self.assertEqual(body["bucket_seconds"], 3600)
+        self.assertEqual(body["timestamps"], ["2024-05-01T00:00:00Z", "2024-05-01T01:00:00Z"])
+        temperature = body["series"]["Temperature"]
+        self.assertEqual(temperature["count"], [6, 6])
+        self.assertEqual(temperature["min"], [0.0, 6.0])
+        self.assertEqual(temperature["max"], [5.0, 11.0])
+        self.assertEqual(temperature["mean"], [2.5, 8.5])
+        self.assertEqual(body["series"]["Sapflow"]["count"], [5, 5])
+
+    def test_points_bound_the_bucket_count(self):
+        response = self.client.get("/api/treeData/aggregate/", {
+            "points": 4, "fields": "Temperature", "start": "2024-05-01", "end": "2024-05-01T02:00:00",
+        })
+        body = response.json()
+        self.assertEqual(body["bucket_seconds"], 1800)
+        self.assertEqual(len(body["timestamps"]), 4)
+
+    def test_lttb_keeps_endpoints_and_extremes(self):
+        TreeReading.objects.filter(temperature=7.0).update(temperature=100.0)
+        response = self.client.get("/api/treeData/aggregate/", {
+            "mode": "lttb", "points": 4, "fields": "Temperature",
+        })
+        series = response.json()["series"]["Temperature"]
+        self.assertEqual(len(series["values"]), 4)
+        self.assertEqual(series["values"][0], 0.0)
+        self.assertEqual(series["values"][-1], 11.0)
+        self.assertIn(100.0, series["values"])
+        self.assertEqual(series["timestamps"][0], "2024-05-01T00:00:00Z")
+
+    def test_coarse_buckets_are_served_from_rollups(self):
+        # Raw rows the rollups do not know about yet stay invisible to hourly buckets
+        TreeReading.objects.create(
+            source="logger-b", timestamp=datetime(2024, 5, 1, 1, 30, tzinfo=timezone.utc), temperature=50.0
+        )
+        params = {"bucket": "1h", "fields": "Temperature"}
+        hourly = self.client.get("/api/treeData/aggregate/", params).json()
+        self.assertEqual(hourly["series"]["Temperature"]["max"], [5.0, 11.0])
+        raw = self.client.get("/api/treeData/aggregate/", {**params, "bucket": "30m"}).json()
+        self.assertEqual(raw["series"]["Temperature"]["max"][-1], 50.0)
+        call_command("rebuild_tree_data_rollups", stdout=io.StringIO())
+        hourly = self.client.get("/api/treeData/aggregate/", params).json()
+        self.assertEqual(hourly["series"]["Temperature"]["max"], [5.0, 50.0])
+        daily = self.client.get("/api/treeData/aggregate/", {**params, "bucket": "1d"}).json()
+        self.assertEqual(daily["series"]["Temperature"]["count"], [13])
+
+    def test_tree_filter_reads_raw_rows(self):
+        TreeReading.objects.create(
+            source="logger-b", tree="oak-1", timestamp=datetime(2024, 5, 1, 1, 30, tzinfo=timezone.utc),
+            temperature=50.0,
+        )
+        # Rollups are not kept per tree, so this is answered from tree_data
+        body = self.client.get("/api/treeData/aggregate/", {
+            "bucket": "1h", "fields": "Temperature", "tree": "oak-1",
+        }).json()
+        self.assertEqual(body["timestamps"], ["2024-05-01T01:00:00Z"])
+        self.assertEqual(body["series"]["Temperature"]["max"], [50.0])
+
+
+class TreeDataAsyncTestCase(TransactionTestCase):
+    def setUp(self):
+        tree_engine.reset_engine()
+        tree_cache.get_cache().clear()
+        self.user = User.objects.create_user(username="dashboard", password="testpass123")
+        self.token = Token.objects.create(user=self.user)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.async_client = AsyncClient()
+        start = datetime(2024, 5, 1, tzinfo=timezone.utc)
+        TreeReading.objects.bulk_create(
+            TreeReading(
+                source=f"logger-{i % 2}",
+                timestamp=start + timedelta(minutes=10 * (i // 2)),
+                temperature=float(i),
+                sapflow=float(i),
+            )
+            for i in range(25)
+        )
+        call_command("rebuild_tree_data_rollups", stdout=io.StringIO())
+
+    def tearDown(self):
+        tree_engine.reset_engine()
+
+    async def get_async(self, path, params):
+        response = await self.async_client.get(
+            path, params, headers={"Authorization": f"Token {self.token.key}"}
+        )
+        if response.streaming:
+            body = b"".join([chunk async for chunk in response.streaming_content])
+        else:
+            body = response.content
+        return response, body
+
+    async def test_pages_match_the_sync_endpoint(self):
+        params = {"limit": 10, "fields": "Temperature"}
+        try:
+            first, body = await self.get_async("/api/async/treeData/", params)
+            self.assertEqual(first.status_code, 200)
+            self.assertEqual(first["X-Cache"], "MISS")
+            page = json.loads(body)
+            second, body = await self.get_async("/api/async/treeData/", {**params, "cursor": page["next"]})
+            self.assertEqual(json.loads(body)["results"][0]["id"] - page["results"][-1]["id"], 1)
+        finally:
+            await async_engine.dispose_engine()
+        # Same body (and cache entry) as the sync view
+        await tree_cache.get_cache().aclear()
+        sync_body = await sync_to_async(lambda: streamed_json(self.client.get("/api/treeData/", params)))()
+        self.assertEqual(page, sync_body)
+
+    async def test_aggregate_matches_the_sync_endpoint(self):
+        params = {"bucket": "1h", "fields": "Temperature,Sapflow"}
+        try:
+            response, body = await self.get_async("/api/async/treeData/aggregate/", params)
+            too_small, _ = await self.get_async(
+                "/api/async/treeData/aggregate/", {"bucket": "1s", "start": "2000-01-01"}
+            )
+        finally:
+            await async_engine.dispose_engine()
+        self.assertEqual(response.status_code, 200, body)
+        sync_response = await sync_to_async(self.client.get)("/api/treeData/aggregate/", params)
+        self.assertEqual(json.loads(body), sync_response.json())
+        self.assertEqual(too_small.status_code, 400)
+
+    async def test_requires_authentication(self):
+        response = await AsyncClient().get("/api/async/treeData/")
+        self.assertEqual(response.status_code, 401)
+        self.assertIn("error", json.loads(response.content))
+        response = await AsyncClient().get(
+            "/api/async/treeData/", headers={"Authorization": "Token nope"}
+        )
+        self.assertEqual(response.status_code, 401)
+
+
+@override_settings(TREE_DATA_ASYNC_UPLOADS=False, TREE_DATA_EVENTS_BACKEND="local")
+class TreeDataEventsTestCase(TransactionTestCase):
+    def setUp(self):
+        tree_engine.reset_engine()
+        self.user = User.objects.create_user(username="watcher", password="testpass123")
+        self.token = Token.objects.create(user=self.user)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def tearDown(self):
+        tree_engine.reset_engine()
+
+    async def open_stream(self, params):
+        response = await AsyncClient().get(
+            "/api/async/treeData/events/", params, headers={"Authorization": f"Token {self.token.key}"}
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["Content-Type"], "text/event-stream")
+        return response.streaming_content.__aiter__()
+
+    async def next_event(self, stream):
+        """Name and data of the next event, skipping keepalives."""
+        while True:
+            chunk = (await asyncio.wait_for(stream.__anext__(), 5)).decode()
+            if chunk.startswith("event: "):
+                name, data = chunk.splitlines()[:2]
+                return name[len("event: "):], json.loads(data[len("data: "):])
+
+    def upload(self, data, source, tree=""):
+        return self.client.post(
+            f"/api/upload-csv/?source={source}&tree={tree}",
+            data=data,
+            content_type="text/csv",
+            HTTP_CONTENT_DISPOSITION='attachment; filename="logger.csv"',
+        )
+
+    @override_settings(TREE_DATA_EVENTS_MAX_ROWS=4)
+    async def test_committed_uploads_are_pushed(self):
+        try:
+            notices = await self.open_stream({"source": "logger-a"})
+            readings = await self.open_stream({"fields": "Temperature"})
+            await sync_to_async(self.upload)(make_logger_csv(3), "logger-b")
+            await sync_to_async(self.upload)(make_logger_csv(5, start=datetime(2024, 6, 1)), "logger-a", "oak-1")
+            # Nothing new: no event
+            await sync_to_async(self.upload)(make_logger_csv(5, start=datetime(2024, 6, 1)), "logger-a", "oak-1")
+            # The same logger, moved to another tree, over the same hours
+            await sync_to_async(self.upload)(
+                make_logger_csv(2, start=datetime(2024, 6, 1), missing_every=2), "logger-a", "oak-2"
+            )
+
+            name, event = await self.next_event(notices)
+            self.assertEqual(name, "upload")
+            self.assertEqual(
+                {key: event[key] for key in ("source", "tree", "rows", "rows_new", "first_timestamp", "last_timestamp")},
+                {
+                    "source": "logger-a",
+                    "tree": "oak-1",
+                    "rows": 5,
+                    "rows_new": 5,
+                    "first_timestamp": "2024-06-01T00:00:00Z",
+                    "last_timestamp": "2024-06-01T00:40:00Z",
+                },
+            )
+            self.assertNotIn("results", event)
+
+            _, first = await self.next_event(readings)
+            self.assertEqual(first["source"], "logger-b")
+            self.assertFalse(first["truncated"])
+            self.assertEqual([row["Temperature"] for row in first["results"]], [20.0, 21.0, 22.0])
+            self.assertEqual(set(first["results"][0]), {"id", "Timestamp", "Temperature"})
+            _, second = await self.next_event(readings)
+            self.assertEqual(second["source"], "logger-a")
+            self.assertTrue(second["truncated"])
+            # Only oak-1's readings, not those oak-2 got at the same times
+            self.assertEqual([row["Temperature"] for row in second["results"]], [20.0, 21.0, 22.0, 23.0])
+            _, third = await self.next_event(readings)
+            self.assertEqual(third["tree"], "oak-2")
+            self.assertEqual(len(third["results"]), 2)
+            with self.assertRaises(asyncio.TimeoutError):
+                await asyncio.wait_for(self.next_event(readings), 0.5)
+        finally:
+            await async_engine.dispose_engine()
+
+    @override_settings(TREE_DATA_EVENTS_MAX_SECONDS=0.2, TREE_DATA_EVENTS_KEEPALIVE=0.05)
+    async def test_streams_keep_alive_then_end(self):
+        try:
+            chunks = [chunk async for chunk in await self.open_stream({})]
+        finally:
+            await async_engine.dispose_engine()
+        self.assertEqual(chunks[0], b"retry: 3000\n\n")
+        self.assertIn(b": keepalive\n\n", chunks)
+        self.assertEqual(events.get_broadcaster().subscriptions, set())
+        bad = await AsyncClient().get(
+            "/api/async/treeData/events/", {"fields": "Nope"}, headers={"Authorization": f"Token {self.token.key}"}
+        )
+        self.assertEqual(bad.status_code, 400)
+        # Under WSGI the stream would tie up a worker thread
+        wsgi = await sync_to_async(self.client.get)(
+            "/api/async/treeData/events/", HTTP_AUTHORIZATION=f"Token {self.token.key}"
+        )
+        self.assertEqual(wsgi.status_code, 501)
+
+
+class BenchmarkTestCase(TransactionTestCase):
+    def tearDown(self):
+        tree_engine.reset_engine()
+
+    def test_generated_files_parse_with_gaps_and_missing_values(self):
+        data = generate_logger_csv(500, gap_rate=0.1, missing_rate=0.05, seed=3)
+        self.assertEqual(data, generate_logger_csv(500, gap_rate=0.1, missing_rate=0.05, seed=3))
+        frame = pd.concat(read_logger_chunks(io.BytesIO(data), 200))
+        self.assertEqual(len(frame), 500)
+        self.assertTrue(frame["Dendro"].isna().any())
+        steps = frame["Timestamp"].diff().dropna().unique()
+        self.assertGreater(len(steps), 1)
+
+    def test_run_benchmarks_reports_every_scenario(self):
+        results = benchmark.run_benchmarks(rows=600, files=1, requests=3)
+        self.assertEqual(
+            set(results["results"]),
+            {"upload", "treeData_page", "treeData_page_cached", "treeData_aggregate"},
+        )
+        upload = results["results"]["upload"]
+        self.assertEqual(upload["rows"], 600)
+        self.assertGreater(upload["rows_per_second"], 0)
+        self.assertEqual(TreeReading.objects.count(), 600)
+        lines, regressions = benchmark.compare(results, results, 0.2)
+        self.assertEqual(regressions, [])
+        self.assertEqual(len(lines), 4)
+
+
+class ServerTimingTestCase(TransactionTestCase):
+    def setUp(self):
+        tree_engine.reset_engine()
+        tree_cache.get_cache().clear()
+        metrics.reset()
+        self.metrics_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.metrics_dir, ignore_errors=True)
+        settings_override = override_settings(
+            TREE_DATA_METRICS_DIR=self.metrics_dir, TREE_DATA_ASYNC_UPLOADS=False
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.admin = User.objects.create_user(username="ops", password="testpass123")
+        UserProfile.objects.create(user=self.admin, role="admin")
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    def tearDown(self):
+        tree_engine.reset_engine()
+
+    def phases(self, response):
+        return {entry.split(";")[0] for entry in response["Server-Timing"].split(", ")}
+
+    def test_phases_in_header_and_metrics(self):
+        response = self.client.post(
+            "/api/upload-csv/",
+            data=make_logger_csv(20),
+            content_type="text/csv",
+            HTTP_CONTENT_DISPOSITION='attachment; filename="logger.csv"',
+        )
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertTrue({"parse", "clean", "db", "total"} <= self.phases(response))
+
+        response = self.client.get("/api/treeData/", {"limit": 5})
+        self.assertIn("total", self.phases(response))
+        self.assertEqual(len(streamed_json(response)["results"]), 5)
+
+        # Another worker of this server, as it would have written its
+        # histograms, and one left by a server that has since stopped
+        other = [["TreeData", "total", [1] + [0] * len(metrics.BUCKETS) + [0.004]]]
+        stopped = subprocess.Popen(["true"])
+        stopped.wait()
+        for name, server in (("999999-a", os.getppid()), ("999999-b", stopped.pid)):
+            with open(os.path.join(self.metrics_dir, f"{name}.json"), "w") as f:
+                json.dump({"pid": 999999, "server": server, "histograms": other}, f)
+
+        body = self.client.get("/api/metrics/").content.decode()
+        self.assertIn('urbantree_request_phase_seconds_count{view="UploadCSVFile",phase="parse"} 1', body)
+        # The streamed body's encoding is counted once the stream is done
+        self.assertIn('urbantree_request_phase_seconds_count{view="TreeData",phase="encode"} 1', body)
+        self.assertIn('urbantree_request_phase_seconds_count{view="TreeData",phase="total"} 2', body)
+        self.assertIn('urbantree_request_phase_seconds_bucket{view="TreeData",phase="total",le="+Inf"} 2', body)
+        self.assertFalse(os.path.exists(os.path.join(self.metrics_dir, "999999-b.json")))
+
+    def test_histograms_are_written_in_the_background(self):
+        metrics.observe("TreeData", "total", 0.02)
+        deadline = time.monotonic() + 5 * metrics.METRICS_WRITE_INTERVAL
+        written = []
+        while not written and time.monotonic() < deadline:
+            time.sleep(0.05)
+            written = [name for name in os.listdir(self.metrics_dir) if name.endswith(".json")]
+        [name] = written
+        with open(os.path.join(self.metrics_dir, name)) as f:
+            entry = json.load(f)
+        self.assertEqual(entry["pid"], os.getpid())
+        self.assertEqual(entry["histograms"][0][:2], ["TreeData", "total"])
+
+    def test_metrics_are_admin_only(self):
+        viewer = User.objects.create_user(username="student", password="testpass123")
+        UserProfile.objects.create(user=viewer, role="viewer")
+        client = APIClient()
+        client.force_authenticate(viewer)
+        self.assertEqual(client.get("/api/metrics/").status_code, 403)
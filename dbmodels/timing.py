@@ -0,0 +1,96 @@
+"""
+Per-request phase timing.
+
+ServerTimingMiddleware (middleware.py) gives each request a Timings object.
+Code on the request path marks its phases with ``with phase("parse"):``, and
+database time is added from Django's execute_wrapper and the tree data
+engine's cursor events. Outside a request every hook is a no-op.
+
+Phases with the same name do not double count when nested, so a bulk write
+timed as "db" as a whole is not added again for each statement inside it.
+"""
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from sqlalchemy import event
+
+_current = ContextVar("dbmodels_timings", default=None)
+
+
+class Timings:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.durations = {}
+        self._open = {}
+
+    def begin(self, name):
+        depth, started = self._open.get(name, (0, None))
+        self._open[name] = (depth + 1, started if depth else time.perf_counter())
+
+    def end(self, name):
+        depth, started = self._open.pop(name, (0, None))
+        if depth > 1:
+            self._open[name] = (depth - 1, started)
+        elif depth == 1:
+            self.durations[name] = self.durations.get(name, 0.0) + time.perf_counter() - started
+
+    def elapsed(self):
+        return time.perf_counter() - self.started
+
+    def header(self):
+        """Server-Timing value: every phase so far, then the total, in ms."""
+        entries = [f"{name};dur={seconds * 1000:.1f}" for name, seconds in self.durations.items()]
+        entries.append(f"total;dur={self.elapsed() * 1000:.1f}")
+        return ", ".join(entries)
+
+
+def activate(timings):
+    return _current.set(timings)
+
+
+def deactivate(token):
+    _current.reset(token)
+
+
+def current():
+    return _current.get()
+
+
+def begin(name):
+    timings = _current.get()
+    if timings is not None:
+        timings.begin(name)
+
+
+def end(name):
+    timings = _current.get()
+    if timings is not None:
+        timings.end(name)
+
+
+@contextmanager
+def phase(name):
+    """Add the time spent in the block to the current request's ``name``."""
+    timings = _current.get()
+    if timings is None:
+        yield
+        return
+    timings.begin(name)
+    try:
+        yield
+    finally:
+        timings.end(name)
+
+
+def db_wrapper(execute, sql, params, many, context):
+    """connection.execute_wrapper() hook timing Django ORM queries as "db"."""
+    with phase("db"):
+        return execute(sql, params, many, context)
+
+
+def install_engine_hooks(engine):
+    """Time the tree data engine's statements as "db"."""
+    event.listen(engine, "before_cursor_execute", lambda *args: begin("db"))
+    event.listen(engine, "after_cursor_execute", lambda *args: end("db"))
+    event.listen(engine, "handle_error", lambda *args: end("db"))
@@ -2,7 +2,13 @@ from django.urls import path, include
 from rest_framework.routers import DefaultRouter
 from . import views
 from .UploadCSVFile import UploadCSVFile
+from .UploadCSVBatch import UploadCSVBatch
+from .UploadJobStatus import UploadJobStatus
 from .TreeData import TreeData
+from .TreeDataAggregate import TreeDataAggregate
+from .TreeDataStats import TreeDataStats
+from .TreeDataAsync import TreeDataAggregateAsync, TreeDataAsync
+from .TreeDataEvents import TreeDataEvents
 
 router = DefaultRouter()
 router.register(r'users', views.UserViewSet, basename='user')
@@ -27,5 +33,15 @@ urlpatterns = [
     # path('profile/me/', views.CurrentUserProfileView.as_view(), name='current-profile'),
     path('profile/update-role/<int:user_id>/', views.UpdateUserRoleView.as_view(), name='update-role'),
     path('upload-csv/', UploadCSVFile.as_view(), name='upload_csv'),
-    path('treeData/', TreeData.as_view(), name='get_treeData')
+    path('upload-csv/batch/', UploadCSVBatch.as_view(), name='upload_csv_batch'),
+    path('upload-jobs/<int:job_id>/', UploadJobStatus.as_view(), name='upload_job_status'),
+    path('treeData/', TreeData.as_view(), name='get_treeData'),
+    path('treeData/aggregate/', TreeDataAggregate.as_view(), name='aggregate_treeData'),
+    path('treeData/stats/', TreeDataStats.as_view(), name='stats_treeData'),
+    # Same reads on the asyncio engine, for ASGI deployments (see README)
+    path('async/treeData/', TreeDataAsync.as_view(), name='get_treeData_async'),
+    path('async/treeData/aggregate/', TreeDataAggregateAsync.as_view(), name='aggregate_treeData_async'),
+    path('async/treeData/events/', TreeDataEvents.as_view(), name='events_treeData_async'),
+    path('db-pool/', views.DatabasePoolStatusView.as_view(), name='db-pool-status'),
+    path('metrics/', views.MetricsView.as_view(), name='metrics'),
 ]
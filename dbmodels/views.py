@@ -1,13 +1,19 @@
 from django.contrib.auth.models import User
+from django.http import HttpResponse
 from django.contrib.auth import authenticate, login, logout
 from django.utils import timezone
-from rest_framework import viewsets, status, permissions
+from rest_framework import viewsets, status, permissions, serializers
 from rest_framework.response import Response
 from rest_framework.views import APIView
 from django.views.decorators.csrf import ensure_csrf_cookie
 from django.utils.decorators import method_decorator
 from django.middleware.csrf import get_token
-from .models import UserProfile
+from .models import UserProfile, USER_ROLES
+from . import activity
+from . import engine as tree_engine
+from . import metrics
+from .authentication import invalidate_token, invalidate_user
+from .pagination import ListingCursorPagination
 from rest_framework.authtoken.models import Token  # Import is crucial
 from .serializers import (
     UserSerializer,
@@ -44,11 +50,38 @@ class CsrfTokenView(APIView):
         return Response({"csrfToken": token, "detail": "CSRF token generated"})
 
 
+def filter_listing(queryset, params, role_lookup, username_lookup):
+    """Apply the ``?role=`` and ``?username_prefix=`` listing filters."""
+    role = params.get("role")
+    if role:
+        if role not in dict(USER_ROLES):
+            raise serializers.ValidationError(
+                {"error": f"'role' must be one of: {', '.join(dict(USER_ROLES))}"}
+            )
+        queryset = queryset.filter(**{role_lookup: role})
+    prefix = params.get("username_prefix")
+    if prefix:
+        queryset = queryset.filter(**{f"{username_lookup}__startswith": prefix})
+    return queryset
+
+
 class UserViewSet(viewsets.ModelViewSet):
-    """ViewSet for viewing and editing User instances."""
+    """
+    ViewSet for viewing and editing User instances.
 
-    queryset = User.objects.all()
+    Listings are cursor-paginated and take ``role``, ``username_prefix`` and
+    ``fields`` (see SelectableFieldsMixin).
+    """
+
+    queryset = User.objects.order_by("id")
     serializer_class = UserSerializer
+    pagination_class = ListingCursorPagination
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.action == "list":
+            queryset = filter_listing(queryset, self.request.query_params, "userprofile__role", "username")
+        return queryset
 
     def get_permissions(self):
         if self.action in ["create", "update", "partial_update", "destroy"]:
@@ -57,14 +90,35 @@ class UserViewSet(viewsets.ModelViewSet):
             permission_classes = [permissions.IsAuthenticated]
         return [permission() for permission in permission_classes]
 
+    # Cached token lookups carry the user; drop them when it changes
+    def perform_update(self, serializer):
+        super().perform_update(serializer)
+        invalidate_user(serializer.instance)
+
+    def perform_destroy(self, instance):
+        super().perform_destroy(instance)
+        invalidate_user(instance)
+
 
 class UserProfileViewSet(viewsets.ModelViewSet):
-    """ViewSet for viewing and editing UserProfile instances."""
+    """
+    ViewSet for viewing and editing UserProfile instances.
+
+    Listed like UserViewSet; the user is joined in so a page costs the same
+    number of queries however many profiles it holds.
+    """
 
-    queryset = UserProfile.objects.all()
+    queryset = UserProfile.objects.select_related("user").order_by("id")
     serializer_class = UserProfileSerializer
+    pagination_class = ListingCursorPagination
     permission_classes = [permissions.IsAuthenticated]
 
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.action == "list":
+            queryset = filter_listing(queryset, self.request.query_params, "role", "user__username")
+        return queryset
+
     def get_permissions(self):
         if self.action in ["update", "partial_update", "destroy"]:
             permission_classes = [IsAdminUser]
@@ -72,6 +126,15 @@ class UserProfileViewSet(viewsets.ModelViewSet):
             permission_classes = [permissions.IsAuthenticated]
         return [permission() for permission in permission_classes]
 
+    # Cached token lookups carry the profile (and so the role)
+    def perform_update(self, serializer):
+        super().perform_update(serializer)
+        invalidate_user(serializer.instance.user)
+
+    def perform_destroy(self, instance):
+        super().perform_destroy(instance)
+        invalidate_user(instance.user)
+
 
 class RegisterView(APIView):
     """Register a new user and create their profile."""
@@ -132,13 +195,13 @@ class LoginView(APIView):
                 # 2. GET OR CREATE AUTH TOKEN (The Fix for Cross-Site Auth)
                 token, created = Token.objects.get_or_create(user=user)
 
-                # 3. Update Last Login Time
+                # 3. Update Last Login Time (written behind, see activity.py)
                 try:
                     profile = UserProfile.objects.get(user=user)
-                    profile.last_login_time = timezone.now()
-                    profile.save()
                 except UserProfile.DoesNotExist:
                     profile = UserProfile.objects.create(user=user, role="viewer")
+                profile.last_login_time = timezone.now()
+                activity.buffer.record(profile.id, "last_login_time", profile.last_login_time)
 
                 # 4. Return Token + User Data
                 return Response(
@@ -164,14 +227,16 @@ class LogoutView(APIView):
 
     def post(self, request):
         try:
-            # 1. Update Logout Time
-            profile = UserProfile.objects.get(user=request.user)
-            profile.last_logout_time = timezone.now()
-            profile.save()
+            # 1. Update Logout Time (written behind, see activity.py)
+            profile = request.user.userprofile
+            activity.buffer.record(profile.id, "last_logout_time", timezone.now())
 
             # 2. Delete the Token (Invalidates the API Key)
             # This ensures the stolen token cannot be used again
-            request.user.auth_token.delete()
+            # before the cached lookups go, so none can be refilled from it
+            token = request.user.auth_token
+            token.delete()
+            invalidate_token(token.key)
 
             # 3. Standard Logout
             logout(request)
@@ -217,6 +282,8 @@ class UpdateUserRoleView(APIView):
                 profile = UserProfile.objects.get(user=user)
                 profile.role = serializer.validated_data["role"]
                 profile.save()
+                # The user's cached token still has the old role
+                invalidate_user(user)
 
                 return Response(
                     {
@@ -235,3 +302,24 @@ class UpdateUserRoleView(APIView):
                     {"error": "Profile not found"}, status=status.HTTP_404_NOT_FOUND
                 )
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+
+class DatabasePoolStatusView(APIView):
+    """Report the tree data connection pool's occupancy and wait statistics."""
+
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        return Response(tree_engine.pool_status(), status=status.HTTP_200_OK)
+
+
+class MetricsView(APIView):
+    """
+    Request latency histograms per view and phase, for Prometheus (scrape
+    with an admin token: ``authorization: {type: Token, credentials: ...}``).
+    """
+
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        return HttpResponse(metrics.render(), content_type="text/plain; version=0.0.4; charset=utf-8")
@@ -1,3 +1,8 @@
+"""
+ASGI entry point. The /api/async/ views only pay off when served from here,
+and the upload event stream (/api/async/treeData/events/) is only served
+from here: WSGI workers answer it with 501.
+"""
 import os
 from django.core.asgi import get_asgi_application
 
@@ -35,6 +35,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # First, so its total covers the other middleware too
+    "dbmodels.middleware.ServerTimingMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "whitenoise.middleware.WhiteNoiseMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
@@ -74,6 +76,109 @@ DATABASES = {
     )
 }
 
+# Shared SQLAlchemy engine used by the sensor-data views (dbmodels/engine.py).
+# URL defaults to the Django "default" database above; one pool per worker.
+TREE_DATA_ENGINE = {
+    "URL": os.getenv("TREE_DATA_DATABASE_URL"),
+    "POOL_SIZE": int(os.getenv("TREE_DATA_POOL_SIZE", "5")),
+    "MAX_OVERFLOW": int(os.getenv("TREE_DATA_MAX_OVERFLOW", "5")),
+    "POOL_TIMEOUT": int(os.getenv("TREE_DATA_POOL_TIMEOUT", "30")),
+    "POOL_PRE_PING": True,
+    "POOL_RECYCLE": int(os.getenv("TREE_DATA_POOL_RECYCLE", "300")),
+}
+
+# Rows per chunk when ingesting logger CSV uploads (bounds worker memory)
+TREE_DATA_UPLOAD_CHUNK_ROWS = int(os.getenv("TREE_DATA_UPLOAD_CHUNK_ROWS", "50000"))
+
+# Bulk loader for uploads: "auto" (COPY on PostgreSQL, executemany
+# elsewhere), "copy" or "insert" (see dbmodels/bulkload.py)
+TREE_DATA_BULK_WRITER = os.getenv("TREE_DATA_BULK_WRITER", "auto")
+
+# CSV parser for uploads: "auto" (pyarrow when installed), "pyarrow" or
+# "pandas" (see dbmodels/ingest.py)
+TREE_DATA_CSV_ENGINE = os.getenv("TREE_DATA_CSV_ENGINE", "auto")
+
+# Queue uploads as UploadJob rows for `manage.py process_upload_jobs` and
+# answer 202 at once; "false" loads them inside the request as before
+TREE_DATA_ASYNC_UPLOADS = os.getenv("TREE_DATA_ASYNC_UPLOADS", "true").lower() in ("1", "true", "yes")
+
+# Worker processes used by process_upload_jobs (one per CPU unless set), and
+# seconds without a heartbeat after which a running job is taken to have lost
+# its worker
+TREE_DATA_UPLOAD_WORKERS = int(os.getenv("TREE_DATA_UPLOAD_WORKERS") or os.cpu_count() or 1)
+TREE_DATA_UPLOAD_JOB_STALE_SECONDS = int(os.getenv("TREE_DATA_UPLOAD_JOB_STALE_SECONDS", "600"))
+
+# The most uncompressed data one /upload-csv/batch/ may carry (staged to
+# temporary files, not held in memory)
+TREE_DATA_BATCH_MAX_BYTES = int(os.getenv("TREE_DATA_BATCH_MAX_BYTES", str(1024 ** 3)))
+
+# Upload notifications for /async/treeData/events/ (see dbmodels/events.py):
+# "auto" (LISTEN/NOTIFY on PostgreSQL, in-process elsewhere), "postgres" or
+# "local". Streams send a keepalive comment every KEEPALIVE seconds and end
+# after MAX_SECONDS (clients reconnect); MAX_ROWS caps rows sent per event.
+TREE_DATA_EVENTS_BACKEND = os.getenv("TREE_DATA_EVENTS_BACKEND", "auto")
+TREE_DATA_EVENTS_KEEPALIVE = int(os.getenv("TREE_DATA_EVENTS_KEEPALIVE", "15"))
+TREE_DATA_EVENTS_MAX_SECONDS = int(os.getenv("TREE_DATA_EVENTS_MAX_SECONDS", "300"))
+TREE_DATA_EVENTS_MAX_ROWS = int(os.getenv("TREE_DATA_EVENTS_MAX_ROWS", "1000"))
+
+# Queued upload files are kept here until loaded (default file storage)
+MEDIA_ROOT = os.getenv("MEDIA_ROOT", os.path.join(BASE_DIR, "media"))
+MEDIA_URL = "media/"
+
+# Result cache for /treeData/ (see dbmodels/cache.py). Entries are keyed on
+# the data generation row, which every process rereads at most every
+# GENERATION_TTL seconds, so an upload from any process invalidates them all.
+# Local memory is per process: point TREE_DATA_CACHE_BACKEND/LOCATION at a
+# shared backend (e.g. django.core.cache.backends.redis.RedisCache) to share
+# the entries themselves.
+TREE_DATA_CACHE_BACKEND = os.getenv(
+    "TREE_DATA_CACHE_BACKEND", "django.core.cache.backends.locmem.LocMemCache"
+)
+CACHES = {
+    "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"},
+    "tree_data": {
+        "BACKEND": TREE_DATA_CACHE_BACKEND,
+        "LOCATION": os.getenv("TREE_DATA_CACHE_LOCATION", "tree-data"),
+        "TIMEOUT": int(os.getenv("TREE_DATA_CACHE_TIMEOUT", "60")),
+    },
+}
+if TREE_DATA_CACHE_BACKEND.endswith("LocMemCache"):
+    # Entry count x TREE_DATA_CACHE_MAX_BYTES bounds the cache's memory
+    CACHES["tree_data"]["OPTIONS"] = {
+        "MAX_ENTRIES": int(os.getenv("TREE_DATA_CACHE_MAX_ENTRIES", "64"))
+    }
+
+# Token -> user/role lookups for CachedTokenAuthentication. Logout and role
+# changes bump the auth_token_generation row the entries are keyed on; each
+# worker rereads it at most every AUTH_CACHE_GENERATION_TTL seconds.
+AUTH_CACHE_GENERATION_TTL = float(os.getenv("AUTH_CACHE_GENERATION_TTL", "1"))
+AUTH_CACHE_BACKEND = os.getenv(
+    "AUTH_CACHE_BACKEND", "django.core.cache.backends.locmem.LocMemCache"
+)
+CACHES["auth"] = {
+    "BACKEND": AUTH_CACHE_BACKEND,
+    "LOCATION": os.getenv("AUTH_CACHE_LOCATION", "auth-tokens"),
+    "TIMEOUT": int(os.getenv("AUTH_CACHE_TIMEOUT", "60")),
+}
+if AUTH_CACHE_BACKEND.endswith("LocMemCache"):
+    CACHES["auth"]["OPTIONS"] = {
+        "MAX_ENTRIES": int(os.getenv("AUTH_CACHE_MAX_ENTRIES", "1000"))
+    }
+
+# Login/logout times are buffered per worker and written in bulk after this
+# many seconds or pending profiles, whichever comes first (dbmodels/activity.py)
+ACTIVITY_FLUSH_INTERVAL = float(os.getenv("ACTIVITY_FLUSH_INTERVAL", "5"))
+ACTIVITY_FLUSH_SIZE = int(os.getenv("ACTIVITY_FLUSH_SIZE", "100"))
+
+# Per-request phase timings: Server-Timing response header (set to "false" to
+# hide it from clients) and where each process leaves its /metrics/ histograms
+SERVER_TIMING = os.getenv("SERVER_TIMING", "true").lower() in ("1", "true", "yes")
+TREE_DATA_METRICS_DIR = os.getenv("TREE_DATA_METRICS_DIR")
+
+# Largest response body kept in the tree data cache, in bytes
+TREE_DATA_CACHE_MAX_BYTES = int(os.getenv("TREE_DATA_CACHE_MAX_BYTES", str(1024 * 1024)))
+TREE_DATA_CACHE_GENERATION_TTL = float(os.getenv("TREE_DATA_CACHE_GENERATION_TTL", "1"))
+
 # DATABASES = {
 #     'default': {
 #         'ENGINE': 'django.db.backends.postgresql_psycopg2',
@@ -109,8 +214,8 @@ DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 # REST Framework
 REST_FRAMEWORK = {
     "DEFAULT_AUTHENTICATION_CLASSES": [
-        # Add TokenAuthentication FIRST
-        'rest_framework.authentication.TokenAuthentication',
+        # Add TokenAuthentication FIRST (cached: see dbmodels/authentication.py)
+        'dbmodels.authentication.CachedTokenAuthentication',
         "rest_framework.authentication.SessionAuthentication",
     ],
     "DEFAULT_PERMISSION_CLASSES": [